@@ -1,24 +1,70 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
-from .config import Config
+import os
+from .config import PROFILES, engine_options, with_driver
+from .routing import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 migrate = Migrate()
 
-def create_app():
+def _timed_pool(options):
+    if "pool_size" in options:
+        # same QueuePool, plus the checkout wait time in /metrics and Server-Timing
+        from .metrics import TimedQueuePool
+        options.setdefault("poolclass", TimedQueuePool)
+    return options
+
+
+def create_app(config=None):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    from .serializers import FastJSONProvider
+    app.json = FastJSONProvider(app)
+    app.config.from_object(PROFILES[os.getenv("APP_PROFILE", "dev")])
+    # overrides on top of the profile, e.g. the benchmark's own database
+    if config:
+        app.config.update(config)
+    # the debugger runs arbitrary code for whoever sees the error page
+    if app.config["PRODUCTION"] and app.debug:
+        raise RuntimeError("debug mode (FLASK_DEBUG) is not allowed with APP_PROFILE=prod")
+    app.config["SQLALCHEMY_DATABASE_URI"] = with_driver(app.config["SQLALCHEMY_DATABASE_URI"], app.config["DB_DRIVER"])
+    if "SQLALCHEMY_ENGINE_OPTIONS" not in app.config:
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config)
+    _timed_pool(app.config["SQLALCHEMY_ENGINE_OPTIONS"])
+    # read replicas become the binds replica_0, replica_1...; see routing.py
+    binds = app.config.setdefault("SQLALCHEMY_BINDS", {})
+    for i, uri in enumerate(app.config["DATABASE_REPLICA_URIS"]):
+        uri = with_driver(uri, app.config["DB_DRIVER"])
+        binds[f"replica_{i}"] = {"url": uri, **_timed_pool(engine_options({**app.config, "SQLALCHEMY_DATABASE_URI": uri}))}
 
     db.init_app(app)
     migrate.init_app(app, db)
 
     # Import models so they register with SQLAlchemy
     from . import models  
+    from .search import init_search
+    init_search(app)
+    from .sqltrace import init_sqltrace
+    init_sqltrace(app)
+    from .metrics import init_metrics
+    init_metrics(app)
+    from .routing import init_routing
+    init_routing(app)
+    from .events import init_events
+    init_events(app)
+    from .overdue import init_overdue
+    init_overdue(app)
+    from .photos import init_photos
+    init_photos(app)
+    from .compress import init_compression
+    init_compression(app)
     from .auth import auth
     app.register_blueprint(auth)
     # Register routes
     from .views import view
     app.register_blueprint(view)
 
+    from .commands import register_commands
+    register_commands(app)
+
     return app
@@ -0,0 +1,235 @@
+import asyncio
+import random
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from .config import engine_options
+from .events import AsyncSubscriber, _format
+from .metrics import registry
+from .models import Employee, Tool
+from .routing import STICKY_COOKIE
+from .search import LikeSearch, ranked, start_refresher
+
+# async DBAPI per backend when ASYNC_DB_DRIVER is "auto"
+ASYNC_DRIVERS = {"mysql": "aiomysql", "sqlite": "aiosqlite"}
+
+
+def async_url(uri, driver="auto"):
+    url = make_url(uri)
+    backend = url.get_backend_name()
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend] if driver == 'auto' else driver}")
+
+
+def _pool_options(config, uri):
+    # the sync pool settings; driver connect_args don't carry over to the async DBAPIs
+    options = engine_options({**config, "SQLALCHEMY_DATABASE_URI": uri})
+    return {k: v for k, v in options.items() if k.startswith("pool_") or k == "max_overflow"}
+
+
+class AsyncAPI:
+    # ASGI front for the lookups the scanner terminals fire on every keystroke:
+    # they run on an async engine, so a worker keeps serving while MySQL answers.
+    # Every other path goes to the Flask app, run in a thread pool by asgiref
+    def __init__(self, flask_app):
+        from asgiref.wsgi import WsgiToAsgi
+
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.routes = {
+            "/find-tools": ("view.find_tools", self.find_tools),
+            "/find-employees": ("view.find_employees", self.find_employees),
+        }
+        self.primary = None
+        self.replicas = []
+
+    # ---- lifecycle ----------------------------------------------------------
+    def start(self):
+        # engines belong to the event loop that uses them: created at startup, not import
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        config = self.flask_app.config
+        driver = config.get("ASYNC_DB_DRIVER", "auto")
+        uri = config["SQLALCHEMY_DATABASE_URI"]
+        self.primary = create_async_engine(async_url(uri, driver), **_pool_options(config, uri))
+        self.replicas = [
+            create_async_engine(async_url(u, driver), **_pool_options(config, u))
+            for u in config.get("DATABASE_REPLICA_URIS", [])
+        ]
+        # the autocomplete may be all a terminal ever asks, and it skips Flask's before_request
+        start_refresher(self.flask_app)
+
+    async def stop(self):
+        for engine in [self.primary, *self.replicas]:
+            if engine is not None:
+                await engine.dispose()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    self.start()
+                except Exception as e:
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.stop()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # ---- dispatch -------------------------------------------------------------
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] == "http" and scope.get("path") == "/api/events" and scope["method"] == "GET":
+            return await self.events(scope, receive, send)
+        route = self.routes.get(scope.get("path")) if scope["type"] == "http" else None
+        if route is None or scope["method"] not in ("GET", "HEAD"):
+            return await self.wsgi(scope, receive, send)
+
+        endpoint, handler = route
+        start = time.perf_counter()
+        if self.primary is None:
+            # server without lifespan support
+            self.start()
+        params = {k: v[0] for k, v in parse_qs(scope.get("query_string", b"").decode()).items()}
+        try:
+            status, data = 200, await handler(self._engine(scope), params)
+        except Exception:
+            self.flask_app.logger.exception("async %s failed", scope["path"])
+            status, data = 500, {"success": False, "message": "Internal server error"}
+
+        body = self._json(data)
+        await send({"type": "http.response.start", "status": status, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ]})
+        await send({"type": "http.response.body", "body": body if scope["method"] == "GET" else b""})
+
+        registry.inc("magasin_http_requests_total", (endpoint, scope["method"], str(status)))
+        if status >= 500:
+            registry.inc("magasin_http_request_errors_total", (endpoint,))
+        registry.observe("magasin_http_request_duration_seconds", (endpoint,), time.perf_counter() - start)
+
+    def _json(self, data):
+        # same bytes as Flask's jsonify: compact unless debugging
+        provider = self.flask_app.json
+        if (provider.compact is None and self.flask_app.debug) or provider.compact is False:
+            text = provider.dumps(data, indent=2)
+        else:
+            text = provider.dumps(data, separators=(",", ":"))
+        return (text + "\n").encode()
+
+    def _engine(self, scope):
+        # same rule as routing.py: replicas unless this client wrote a moment ago
+        if not self.replicas:
+            return self.primary
+        cookie = SimpleCookie()
+        for name, value in scope.get("headers", []):
+            if name == b"cookie":
+                cookie.load(value.decode("latin-1"))
+        try:
+            if STICKY_COOKIE in cookie and float(cookie[STICKY_COOKIE].value) > time.time():
+                return self.primary
+        except ValueError:
+            pass
+        return random.choice(self.replicas)
+
+    # ---- /api/events -----------------------------------------------------------
+    async def events(self, scope, receive, send):
+        # the dashboard stream as a coroutine: an open tab costs a queue, not a
+        # thread, so there is no EVENTS_MAX_STREAMS limit here
+        broker = self.flask_app.extensions["events"]
+        keepalive = self.flask_app.config.get("EVENTS_KEEPALIVE", 15)
+        headers = dict(scope.get("headers", []))
+        params = {k: v[0] for k, v in parse_qs(scope.get("query_string", b"").decode()).items()}
+        last_id = headers.get(b"last-event-id", b"").decode() or params.get("last_id")
+        q = AsyncSubscriber(asyncio.get_running_loop(), broker.queue_size)
+        broker.subscribe(last_id, q)
+
+        async def disconnected():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        gone = asyncio.ensure_future(disconnected())
+        item = None
+        try:
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"text/event-stream; charset=utf-8"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ]})
+            await send({"type": "http.response.body", "body": b"retry: 3000\n\n", "more_body": True})
+            while True:
+                if q.overflowed:
+                    q.overflowed = False
+                    chunk = _format(None, "reset", {})
+                else:
+                    item = item or asyncio.ensure_future(q.queue.get())
+                    await asyncio.wait({item, gone}, timeout=keepalive, return_when=asyncio.FIRST_COMPLETED)
+                    if gone.done():
+                        break
+                    if item.done():
+                        chunk, item = _format(*item.result()), None
+                    else:
+                        # comment line: keeps proxies from closing an idle stream
+                        chunk = ": keepalive\n\n"
+                await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+        finally:
+            for task in (gone, item):
+                if task is not None:
+                    task.cancel()
+            broker.unsubscribe(q)
+
+    # ---- views ----------------------------------------------------------------
+    async def search(self, conn, kind, q):
+        index = self.flask_app.extensions["search_index"]
+        limit = self.flask_app.config["SEARCH_RESULT_LIMIT"]
+        ql = q.strip().lower()
+        if hasattr(index, "candidates"):
+            return ranked(ql, (await conn.execute(index.candidates(kind, ql, limit))).all(), limit)
+        # trigram: in memory, kept current by its background thread; the database until it is built
+        if not index.ready:
+            return ranked(ql, (await conn.execute(LikeSearch().candidates(kind, ql, limit))).all(), limit)
+        return index.search(kind, q, limit)
+
+    async def find_tools(self, engine, params):
+        q = params.get("q", "")
+        if not q:
+            return []
+        async with engine.connect() as conn:
+            ids = await self.search(conn, "tool", q)
+            rows = await conn.execute(
+                select(Tool.id, Tool.name, Tool.loc_row, Tool.loc_col, Tool.loc_shelf, Tool.status)
+                .where(Tool.id.in_(ids))
+            )
+            tools = {row.id: row for row in rows}
+        return [
+            {
+                "id": t.id,
+                "name": t.name,
+                "loc_row": t.loc_row,
+                "loc_col": t.loc_col,
+                "loc_shelf": t.loc_shelf,
+                "status": t.status,
+            }
+            for t in (tools[i] for i in ids if i in tools)
+        ]
+
+    async def find_employees(self, engine, params):
+        q = params.get("q", "")
+        if not q:
+            return []
+        async with engine.connect() as conn:
+            ids = await self.search(conn, "employee", q)
+            rows = await conn.execute(
+                select(Employee.id, Employee.name, Employee.department).where(Employee.id.in_(ids))
+            )
+            employees = {row.id: row for row in rows}
+        return [
+            {"id": e.id, "name": e.name, "department": e.department}
+            for e in (employees[i] for i in ids if i in employees)
+        ]
@@ -0,0 +1,285 @@
+import json
+import os
+import shutil
+import statistics
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from .models import Employee, Movement, Tool, db
+
+# name: generator sizes; movements is the one that matters for the hot paths
+SCALES = {
+    "1k": {"tools": 200, "employees": 20, "movements": 1_000},
+    "100k": {"tools": 5_000, "employees": 200, "movements": 100_000},
+    "1m": {"tools": 20_000, "employees": 500, "movements": 1_000_000},
+}
+ITERATIONS = 20
+# full-table endpoints: a handful of runs is enough and keeps the 1m scale usable
+HEAVY_ITERATIONS = 2
+# a p50 must grow by this factor and by this many ms before --check fails
+TIME_TOLERANCE = 1.5
+TIME_FLOOR_MS = 5.0
+
+
+def prepare_database(scale, data_dir):
+    # seeded once per scale and kept as a template; each run works on a copy
+    # so the write endpoints start from the same state every time
+    from . import create_app
+    from .seed import generate
+
+    os.makedirs(data_dir, exist_ok=True)
+    template = os.path.join(data_dir, f"bench_{scale}.db")
+    if not os.path.exists(template):
+        partial = template + ".partial"
+        if os.path.exists(partial):
+            os.remove(partial)
+        app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.abspath(partial)})
+        with app.app_context():
+            db.create_all()
+            generate(echo=lambda *a: None, **SCALES[scale])
+            db.engine.dispose()
+        os.replace(partial, template)
+    work = os.path.join(data_dir, f"bench_{scale}.run.db")
+    shutil.copyfile(template, work)
+    return "sqlite:///" + os.path.abspath(work)
+
+
+def _scenarios():
+    # (name, heavy, request factory); a factory gets the iteration number and
+    # returns (method, path, test client kwargs). Pools of ids are read once
+    available = [i for (i,) in db.session.query(Tool.id).filter(Tool.status == "Disponible").limit(500)]
+    checked_out = [i for (i,) in db.session.query(Movement.id).filter(Movement.status == "Checked Out").limit(500)]
+    employee = db.session.query(Employee.id).first()[0]
+    word = db.session.query(Tool.name).first()[0].split()[0]
+    stamp = datetime.utcnow().strftime("%H%M%S%f")
+    future = (datetime.utcnow() + timedelta(days=7)).strftime("%Y-%m-%d")
+    borrowed, repaired = iter(available[::3]), iter(available[1::3])
+    sent = []
+
+    def send(i):
+        tool_id = next(repaired)
+        sent.append(tool_id)
+        return "POST", f"/maintenance/send/{tool_id}", {"json": {"expected_return": future}}
+
+    def back(i):
+        tool_id = sent.pop(0)
+        return "POST", f"/maintenance/return/{tool_id}", {
+            "json": {"status": "Disponible", "loc_row": 1, "loc_col": 1, "loc_shelf": 1}}
+
+    scanned = available[2::3][:10]
+
+    def scan(i):
+        # a kiosk scanning the same 10 tools out and back in, one batch per request
+        if i % 2 == 0:
+            return "POST", "/api/borrows/batch", {"json": {
+                "tool_ids": scanned, "employee_id": employee, "expected_return": future}}
+        return "POST", "/api/returns/batch", {"json": {"tool_ids": scanned}}
+
+    def import_tools(i):
+        rows = "".join(f"BI{stamp}{i:03d}{n:03d},Bench import {n},1,1,1,1\n" for n in range(100))
+        return "POST", "/api/import/tools", {
+            "data": "id,name,category_id,loc_row,loc_col,loc_shelf\n" + rows, "content_type": "text/csv"}
+
+    get = lambda path: lambda i: ("GET", path, {})
+    return [
+        ("dashboard", False, get("/dashboard")),
+        ("inventory", False, get("/inventory")),
+        ("tools", False, get("/tools")),
+        ("cart", False, get("/cart")),
+        ("movements", False, get("/movements")),
+        ("maintenance", False, get("/maintenance")),
+        ("report", False, get("/report")),
+        ("borrow_form", False, get("/borrows/new")),
+        ("add_tool_form", False, get("/add-tool")),
+        ("api_tools", False, get("/api/tools")),
+        ("api_tools_status", False, get("/api/tools?status=Emprunté")),
+        ("api_tools_employee", False, get(f"/api/tools?employee_id={employee}")),
+        ("api_tools_total", False, get("/api/tools?with_total=1")),
+        ("api_movements", False, get("/api/movements")),
+        ("api_movements_filtered", False, get("/api/movements?status=Checked%20Out&sort=asc")),
+        ("api_overdue", False, get("/api/overdue")),
+        ("api_stats", False, get("/api/stats")),
+        ("api_recent_borrows", False, get("/api/recent-borrows")),
+        ("api_categories", False, get("/api/categories")),
+        ("api_getcategories", False, get("/_api_/getcategories")),
+        ("api_employees", False, get("/api/employees")),
+        ("api_maintenance_tools", False, get("/api/maintenance-tools")),
+        ("find_tools", False, get(f"/find-tools?q={word}")),
+        ("find_employees", False, get("/find-employees?q=a")),
+        ("stream_movements", True, get("/api/movements?format=ndjson")),
+        ("stream_overdue", True, get("/api/overdue?format=ndjson")),
+        ("export_csv", True, get("/api/movements/export")),
+        ("export_xlsx", True, get("/api/movements/export?format=xlsx")),
+        ("borrow", False, lambda i: ("POST", "/borrows/new", {"data": {
+            "tool_id": next(borrowed), "employee_id": employee, "expected_return": future}})),
+        ("return", False, lambda i: ("POST", f"/tools/return/{checked_out.pop()}", {"data": {"status": "Disponible"}})),
+        ("maintenance_send", False, send),
+        ("maintenance_return", False, back),
+        ("kiosk_scan_10", False, scan),
+        ("add_tool", False, lambda i: ("POST", "/add-tool", {"data": {
+            "id": f"BT{stamp}{i:04d}", "name": "Bench tool", "category_id": 1, "loc_row": 1,
+            "loc_col": 1, "loc_shelf": 1, "status": "Disponible"}})),
+        ("add_employee", False, lambda i: ("POST", "/employees/add", {"data": {
+            "employee_id": 900_000_000 + i, "employee_name": "Bench Employee", "employee_department": "IT"}})),
+        ("add_category", False, lambda i: ("POST", "/api/categories", {"data": {"name": f"Bench {stamp} {i}"}})),
+        ("import_tools_100", False, import_tools),
+    ]
+
+
+def run_benchmarks(app, iterations=ITERATIONS, only=None, echo=print):
+    # {name: {"p50_ms", "p95_ms", "queries", "peak_kb", "status"}} for every scenario
+    client = app.test_client()
+    results = {}
+    with app.app_context():
+        queries = [0]
+        thread = threading.get_ident()
+
+        def count(*args):
+            # background threads (overdue scanner) are not part of the request
+            if threading.get_ident() == thread:
+                queries[0] += 1
+
+        event.listen(db.engine, "before_cursor_execute", count)
+        try:
+            scenarios = _scenarios()
+            db.session.remove()
+            for name, heavy, make in scenarios:
+                if only and name not in only:
+                    continue
+                n = min(iterations, HEAVY_ITERATIONS) if heavy else iterations
+                timings, counts, status = [], [], None
+                # one extra untimed call under tracemalloc for the memory peak
+                for i in range(n + 1):
+                    method, path, kwargs = make(i)
+                    if i == n:
+                        tracemalloc.start()
+                    queries[0] = 0
+                    start = time.perf_counter()
+                    resp = client.open(path, method=method, **kwargs)
+                    resp.get_data()
+                    elapsed = (time.perf_counter() - start) * 1000
+                    if i == n:
+                        peak = tracemalloc.get_traced_memory()[1]
+                        tracemalloc.stop()
+                    else:
+                        timings.append(elapsed)
+                        counts.append(queries[0])
+                    status = resp.status_code
+                timings.sort()
+                results[name] = {
+                    "p50_ms": round(statistics.median(timings), 2),
+                    "p95_ms": round(timings[min(len(timings) - 1, int(0.95 * len(timings)))], 2),
+                    "queries": max(counts),
+                    "peak_kb": round(peak / 1024),
+                    "status": status,
+                }
+                echo(name, results[name])
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count)
+    return results
+
+
+def compare(baseline, current):
+    # regressions as readable lines: more queries, a slower p50 or an error status
+    problems = []
+    for name, now in current.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if now["status"] >= 400 > before["status"]:
+            problems.append(f"{name}: HTTP {now['status']} (was {before['status']})")
+        if now["queries"] > before["queries"]:
+            problems.append(f"{name}: {now['queries']} queries (was {before['queries']})")
+        if (now["p50_ms"] > before["p50_ms"] * TIME_TOLERANCE
+                and now["p50_ms"] - before["p50_ms"] > TIME_FLOOR_MS):
+            problems.append(f"{name}: p50 {now['p50_ms']}ms (was {before['p50_ms']}ms)")
+    return problems
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+# ---- serialization -----------------------------------------------------------
+def _orm_movement_full(mov):
+    # the per-object serializer /api/movements used before serializers.py, kept
+    # as the reference point of serialization_bench
+    return {
+        "id": mov.id,
+        "tool_id": mov.tool_id,
+        "tool_name": mov.tool.name if mov.tool else None,
+        "tool_photo": mov.tool.photo if mov.tool and mov.tool.photo else None,
+        "employee_id": mov.employee_id,
+        "employee_name": mov.employee.name if mov.employee else None,
+        "date_emprunt": mov.date_emprunt.isoformat() if mov.date_emprunt else None,
+        "return_date": mov.return_date.isoformat() if mov.return_date else None,
+        "expected_return": mov.expected_return.isoformat() if mov.expected_return else None,
+        "status": mov.status
+    }
+
+
+def _fastest(fn, repeat):
+    # (best ms, last result); the session is emptied so every run loads from scratch
+    best, result = None, None
+    for _ in range(repeat):
+        db.session.close()
+        start = time.perf_counter()
+        result = fn()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def serialization_bench(app, rows=10_000, repeat=5):
+    # ms per stage for `rows` movements of /api/movements, three ways:
+    #   orm        ORM objects + relationships, dict per object, Flask's stdlib encoder
+    #   projection column tuples (serializers.py) + app.json (orjson when installed)
+    #   stdlib     the same projection encoded by the stdlib fallback
+    # plus the gzip/brotli cost and size of the encoded body
+    import gzip
+    from flask.json.provider import DefaultJSONProvider
+    from sqlalchemy.orm import contains_eager
+    from werkzeug.datastructures import MultiDict
+    from .compress import brotli
+    from .serializers import MOVEMENT_FULL, FastJSONProvider
+    from .views import movements_query
+
+    order = (Movement.date_emprunt.desc(), Movement.id.desc())
+    query = movements_query(MultiDict()).order_by(*order).limit(rows)
+    stdlib = DefaultJSONProvider(app)
+    results = {}
+
+    fetch, objects = _fastest(
+        lambda: query.options(contains_eager(Movement.tool), contains_eager(Movement.employee)).all(), repeat)
+    build, items = _fastest(lambda: [_orm_movement_full(m) for m in objects], repeat)
+    encode, _ = _fastest(lambda: stdlib.dumps(items, separators=(",", ":")), repeat)
+    results["orm"] = {"rows": len(objects), "fetch": fetch, "build": build, "encode": encode}
+
+    fetch, tuples = _fastest(lambda: MOVEMENT_FULL.apply(query).all(), repeat)
+    build, items = _fastest(lambda: MOVEMENT_FULL.items(tuples), repeat)
+    encode, body = _fastest(lambda: app.json.dumps(items).encode(), repeat)
+    results["projection"] = {"rows": len(tuples), "fetch": fetch, "build": build, "encode": encode}
+    encode, _ = _fastest(lambda: json.dumps(items, default=FastJSONProvider.default, separators=(",", ":"),
+                                            sort_keys=True), repeat)
+    results["stdlib"] = {**results["projection"], "encode": encode}
+
+    level, quality = app.config["COMPRESS_GZIP_LEVEL"], app.config["COMPRESS_BROTLI_QUALITY"]
+    compression = {"raw": (0.0, len(body))}
+    ms, packed = _fastest(lambda: gzip.compress(body, compresslevel=level, mtime=0), repeat)
+    compression["gzip"] = (ms, len(packed))
+    if brotli is not None:
+        ms, packed = _fastest(lambda: brotli.compress(body, quality=quality), repeat)
+        compression["br"] = (ms, len(packed))
+    return results, compression
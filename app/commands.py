@@ -0,0 +1,290 @@
+import click
+from flask.cli import with_appcontext
+
+
+@click.command("explain-hot-queries")
+@click.option("--verbose", is_flag=True, help="Print every plan, not only the failures.")
+@with_appcontext
+def explain_hot_queries_command(verbose):
+    """EXPLAIN the hot view queries; exit 1 if one falls back to a full scan."""
+    from .explain import explain_hot_queries
+
+    failed = False
+    for name, (plan, scans) in explain_hot_queries().items():
+        status = "FULL SCAN" if scans else "ok"
+        click.echo(f"{name:28} {status}")
+        if scans or verbose:
+            for line in plan:
+                click.echo(f"    {line}")
+        failed = failed or bool(scans)
+    if failed:
+        raise click.exceptions.Exit(1)
+
+
+@click.command("reconcile-current-movements")
+@with_appcontext
+def reconcile_current_movements_command():
+    """Rebuild tools.current_movement_id / current_employee_id from movements."""
+    from .loaders import rebuild_current_movements
+    from .stats import invalidate_stats
+
+    count = rebuild_current_movements()
+    invalidate_stats()
+    click.echo(f"{count} tools have a current movement")
+
+
+@click.command("bench-export")
+@click.option("--format", "fmt", type=click.Choice(["csv", "xlsx"]), default="csv")
+@click.option("--query", "query_string", default="", help="Filters, e.g. 'status=Returned&sort=asc'.")
+@with_appcontext
+def bench_export_command(fmt, query_string):
+    """Time /api/movements/export end to end and report rows per second."""
+    import time
+    from flask import current_app
+    from werkzeug.datastructures import MultiDict
+    from urllib.parse import parse_qsl
+    from .views import movements_query
+
+    rows = movements_query(MultiDict(parse_qsl(query_string))).count()
+    client = current_app.test_client()
+    start = time.perf_counter()
+    response = client.get(f"/api/movements/export?format={fmt}&{query_string}", buffered=False)
+    if response.status_code != 200:
+        raise click.ClickException(f"export failed with HTTP {response.status_code}")
+    size = sum(len(chunk) for chunk in response.iter_encoded())
+    response.close()
+    elapsed = time.perf_counter() - start
+
+    click.echo(f"{fmt}: {rows} rows, {size / 1e6:.1f} MB in {elapsed:.2f}s, {rows / elapsed:,.0f} rows/s")
+
+
+@click.command("import")
+@click.argument("kind", type=click.Choice(["tools", "employees", "movements"]))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]), help="Default: from the file extension.")
+@click.option("--chunk-size", default=1000, show_default=True, help="Rows per transaction.")
+@click.option("--dry-run", is_flag=True, help="Validate only, write nothing.")
+@with_appcontext
+def import_command(kind, path, fmt, chunk_size, dry_run):
+    """Bulk upsert tools, employees or movements from a CSV or NDJSON file."""
+    from .importer import detect_format, import_rows, read_rows, text_stream
+
+    with open(path, "rb") as f:
+        report = import_rows(kind, read_rows(text_stream(f), fmt or detect_format(path)),
+                             chunk_size=chunk_size, dry_run=dry_run)
+    for err in report["errors"]:
+        click.echo(f"line {err['line']}: {err['message']}", err=True)
+    if report["failed"] > len(report["errors"]):
+        click.echo(f"... {report['failed'] - len(report['errors'])} more errors", err=True)
+    verb = "valid" if dry_run else "imported"
+    click.echo(f"{report['rows']} rows, {report['imported']} {verb}, {report['failed']} failed")
+    if not report["success"]:
+        raise click.exceptions.Exit(1)
+
+
+@click.command("seed")
+@click.option("--tools", default=200, show_default=True)
+@click.option("--employees", default=20, show_default=True)
+@click.option("--movements", default=100, show_default=True, help="Approximate total, spread over the tools.")
+@click.option("--workers", default=1, show_default=True, help="Processes generating rows while the main one inserts.")
+@click.option("--seed", "seed_value", default=0, show_default=True, help="Random seed, same seed same data.")
+@with_appcontext
+def seed_command(tools, employees, movements, workers, seed_value):
+    """Append a synthetic warehouse (employees, tools, movement history) to the database."""
+    import time
+    from .seed import generate
+
+    start = time.perf_counter()
+    n_tools, n_movements = generate(tools=tools, employees=employees, movements=movements,
+                                    workers=workers, seed=seed_value, echo=click.echo)
+    elapsed = time.perf_counter() - start
+    click.echo(f"{n_tools} tools, {n_movements} movements in {elapsed:.1f}s "
+               f"({n_movements / elapsed:,.0f} movements/s)")
+
+
+@click.command("load-test")
+@click.option("--url", help="Base URL of a running server; default is the in-process test client.")
+@click.option("--requests", "requests_per_path", default=50, show_default=True, help="Requests per endpoint.")
+@click.option("--concurrency", default=4, show_default=True)
+@click.option("--path", "paths", multiple=True, help="Only these paths (with query string); repeatable.")
+@with_appcontext
+def load_test_command(url, requests_per_path, concurrency, paths):
+    """Hit the main endpoints and print latency percentiles (ms) per endpoint."""
+    from flask import current_app
+    from .loadtest import endpoints, percentile, run
+
+    results, throughput = run(current_app._get_current_object(), list(paths) or endpoints(), requests_per_path,
+                              concurrency, url)
+    click.echo(f"{'endpoint':45} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8} {'err':>4}")
+    for path, (latencies, errors) in results.items():
+        p50, p90, p99 = (percentile(latencies, p) for p in (50, 90, 99))
+        click.echo(f"{path[:45]:45} {p50:8.1f} {p90:8.1f} {p99:8.1f} {latencies[-1]:8.1f} {errors:4}")
+    click.echo(f"{throughput:,.0f} requests/s at concurrency {concurrency}")
+
+
+@click.command("stress-checkout")
+@click.option("--threads", default=16, show_default=True, help="Terminals scanning at the same time.")
+@click.option("--tools", "n_tools", default=4, show_default=True, help="Tools they all fight over.")
+@click.option("--operations", default=100, show_default=True, help="Borrow/return/maintenance/kiosk requests per thread.")
+@with_appcontext
+def stress_checkout_command(threads, n_tools, operations):
+    """Race many threads over a few tools and check no tool was handed out twice (writes to the database)."""
+    from flask import current_app
+    from sqlalchemy import func
+    from .models import Movement, db
+    from .stress import OPERATIONS, check, first_employee, pick_tools, run
+
+    tool_ids = pick_tools(n_tools)
+    employee_id = first_employee()
+    if not tool_ids or employee_id is None:
+        raise click.ClickException("needs available tools and an employee (flask seed)")
+    first_movement = (db.session.query(func.max(Movement.id)).scalar() or 0) + 1
+    db.session.remove()
+
+    outcomes, elapsed = run(current_app._get_current_object(), tool_ids, employee_id, threads, operations)
+    click.echo(f"{'operation':12} {'ok':>6} {'conflict':>9} {'nothing':>8} {'error':>6}")
+    for op in OPERATIONS:
+        click.echo(f"{op:12} {outcomes[op, 'ok']:6} {outcomes[op, 'conflict']:9} "
+                   f"{outcomes[op, 'nothing']:8} {outcomes[op, 'error']:6}")
+    click.echo(f"{threads * operations / elapsed:,.0f} requests/s, {threads} threads on {len(tool_ids)} tools")
+    problems = check(tool_ids, first_movement, outcomes)
+    for line in problems:
+        click.echo(f"BROKEN {line}", err=True)
+    if problems:
+        raise click.exceptions.Exit(1)
+    click.echo("ok: no tool handed out twice")
+
+
+@click.command("bench")
+@click.option("--scale", "scales", multiple=True, type=click.Choice(["1k", "100k", "1m"]),
+              help="Seeded SQLite scale(s) to run; repeatable. Default: 1k.")
+@click.option("--uri", help="Benchmark this already seeded database instead (the write endpoints modify it).")
+@click.option("--iterations", default=20, show_default=True)
+@click.option("--only", multiple=True, help="Run only these scenarios; repeatable.")
+@click.option("--data-dir", default="instance/bench", show_default=True, help="Where seeded SQLite templates are kept.")
+@click.option("--baseline", "baseline_path", default="benchmarks/baseline.json", show_default=True)
+@click.option("--save", is_flag=True, help="Write the results into the baseline file.")
+@click.option("--check", is_flag=True, help="Exit 1 if a scenario got slower or issues more queries than the baseline.")
+def bench_command(scales, uri, iterations, only, data_dir, baseline_path, save, check):
+    """Latency, query count and peak memory for every view, per database scale."""
+    from . import create_app
+    from .bench import compare, load_baseline, prepare_database, run_benchmarks, save_baseline
+    from .pagination import clear_counts
+    from .stats import invalidate_stats
+
+    targets = {"uri": uri} if uri else {s: None for s in scales or ("1k",)}
+    baseline = load_baseline(baseline_path)
+    problems = []
+    for scale, database in targets.items():
+        if database is None:
+            click.echo(f"preparing {scale} database...")
+            database = prepare_database(scale, data_dir)
+        # stats/count caches are per process, not per app: start each scale cold
+        invalidate_stats()
+        clear_counts()
+        app = create_app({"SQLALCHEMY_DATABASE_URI": database})
+        click.echo(f"[{scale}] {'scenario':24} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8} {'peak KB':>8} {'status':>6}")
+
+        def echo(name, r):
+            click.echo(f"[{scale}] {name:24} {r['p50_ms']:9.2f} {r['p95_ms']:9.2f} {r['queries']:8} "
+                       f"{r['peak_kb']:8} {r['status']:6}")
+
+        results = run_benchmarks(app, iterations, set(only), echo)
+        for line in compare(baseline.get(scale, {}), results):
+            problems.append(f"[{scale}] {line}")
+        if save:
+            baseline[scale] = {**baseline.get(scale, {}), **results}
+    if save:
+        save_baseline(baseline_path, baseline)
+        click.echo(f"baseline written to {baseline_path}")
+    for line in problems:
+        click.echo(f"REGRESSION {line}", err=True)
+    if check and problems:
+        raise click.exceptions.Exit(1)
+
+
+@click.command("bench-serialize")
+@click.option("--rows", default=10_000, show_default=True, help="Movements per run (the newest ones).")
+@click.option("--repeat", default=5, show_default=True, help="Runs per stage; the fastest one counts.")
+@with_appcontext
+def bench_serialize_command(rows, repeat):
+    """Cost of turning movements into /api/movements JSON: ORM objects vs column projection."""
+    from flask import current_app
+    from .bench import serialization_bench
+
+    results, compression = serialization_bench(current_app._get_current_object(), rows, repeat)
+    click.echo(f"{'ms per 10k rows':16} {'fetch':>8} {'build':>8} {'encode':>8} {'total':>8}")
+    for name, r in results.items():
+        scale = 10_000 / max(r["rows"], 1)
+        stages = [r["fetch"] * scale, r["build"] * scale, r["encode"] * scale]
+        click.echo(f"{name:16} " + " ".join(f"{ms:8.1f}" for ms in stages + [sum(stages)]))
+    raw = compression["raw"][1]
+    for name, (ms, size) in compression.items():
+        click.echo(f"{name:16} {size / 1024:8.0f} KB  {size / raw:5.0%}  {ms:6.1f} ms")
+
+
+@click.command("sync-replicas")
+@with_appcontext
+def sync_replicas_command():
+    """Copy the primary SQLite file over each SQLite replica (local stand-in for replication)."""
+    import sqlite3
+    from flask import current_app
+    from .models import db
+    from .routing import replica_bind_keys
+
+    keys = replica_bind_keys(current_app)
+    if not keys:
+        raise click.ClickException("no DATABASE_REPLICA_URIS configured")
+    primary = db.engine.url
+    if primary.get_backend_name() != "sqlite":
+        raise click.ClickException("only SQLite files can be synced; MySQL replicas use MySQL replication")
+    db.session.remove()
+    source = sqlite3.connect(primary.database)
+    try:
+        for key in keys:
+            engine = db.engines[key]
+            if engine.url.get_backend_name() != "sqlite":
+                raise click.ClickException(f"{key} is not a SQLite database")
+            engine.dispose()
+            target = sqlite3.connect(engine.url.database)
+            source.backup(target)
+            target.close()
+            click.echo(f"{key}: {engine.url.database} synced")
+    finally:
+        source.close()
+
+
+@click.command("thumbnails")
+@with_appcontext
+def thumbnails_command():
+    """Make the missing thumbnails of every stored photo (after a restore or a new size)."""
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+    from flask import current_app
+    from .photos import PHOTO_NAME, make_thumbnails
+
+    directory = current_app.config["PHOTO_DIR"]
+    digests = set()
+    for _, _, names in os.walk(directory):
+        for name in names:
+            match = PHOTO_NAME.match(name)
+            if match and match.group(2) is None:
+                digests.add(match.group(1))
+    app = current_app._get_current_object()
+    with ThreadPoolExecutor(current_app.config["PHOTO_WORKERS"]) as pool:
+        list(pool.map(lambda digest: make_thumbnails(app, directory, digest), digests))
+    click.echo(f"{len(digests)} photos checked in {directory}")
+
+
+def register_commands(app):
+    app.cli.add_command(explain_hot_queries_command)
+    app.cli.add_command(reconcile_current_movements_command)
+    app.cli.add_command(bench_export_command)
+    app.cli.add_command(import_command)
+    app.cli.add_command(seed_command)
+    app.cli.add_command(load_test_command)
+    app.cli.add_command(stress_checkout_command)
+    app.cli.add_command(bench_command)
+    app.cli.add_command(bench_serialize_command)
+    app.cli.add_command(sync_replicas_command)
+    app.cli.add_command(thumbnails_command)
@@ -0,0 +1,55 @@
+import gzip
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# content-codings compress_response may pick
+ENCODINGS = ("br", "gzip")
+COMPRESSIBLE = ("application/json", "text/html", "text/csv", "text/css", "application/javascript", "text/javascript")
+
+
+def _encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress_response(response, config):
+    # buffered bodies only: streams (/api/events, ndjson/csv exports) must reach
+    # the client chunk by chunk, and files go out as they are
+    if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+            or "Content-Encoding" in response.headers or response.mimetype not in COMPRESSIBLE):
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = _encoding()
+    if encoding is None or response.content_length is None or response.content_length < config["COMPRESS_MIN_SIZE"]:
+        return response
+
+    body = response.get_data()
+    if encoding == "br":
+        body = brotli.compress(body, quality=config["COMPRESS_BROTLI_QUALITY"])
+    else:
+        body = gzip.compress(body, compresslevel=config["COMPRESS_GZIP_LEVEL"], mtime=0)
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    # other bytes, so another strong ETag: the content-coding is appended to it
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(encoded_etag(etag, encoding), weak=weak)
+    return response
+
+
+def encoded_etag(etag, encoding):
+    return f"{etag}-{encoding}"
+
+
+def init_compression(app):
+    if not app.config.get("COMPRESS", True):
+        return
+    app.after_request(lambda response: compress_response(response, app.config))
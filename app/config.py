@@ -1,9 +1,201 @@
+import importlib.util
 import os
 from sensitives_info import SQLALCHEMY_DATABASE_URI_local
 
 
+def _flag(name, default):
+    return os.getenv(name, "1" if default else "0") == "1"
+
+
+def with_driver(uri, driver):
+    # MySQL DBAPI: "pymysql" (pure Python, always installed), "mysqldb" (mysqlclient, C),
+    # or "auto" for mysqlclient when it is installed
+    if not uri.startswith("mysql"):
+        return uri
+    if driver == "auto":
+        driver = "mysqldb" if importlib.util.find_spec("MySQLdb") else "pymysql"
+    return f"mysql+{driver}://" + uri.split("://", 1)[1]
+
+
+def engine_options(config):
+    # SQLALCHEMY_ENGINE_OPTIONS from the DB_* settings of the active profile,
+    # built in create_app once the final URI is known
+    uri = config["SQLALCHEMY_DATABASE_URI"]
+    options = {"pool_pre_ping": config["DB_POOL_PRE_PING"], "pool_recycle": config["DB_POOL_RECYCLE"]}
+    if uri.startswith("sqlite") and (uri in ("sqlite://", "sqlite:///") or ":memory:" in uri):
+        # in-memory SQLite runs on a single static connection, nothing to size
+        return {}
+    options.update(
+        pool_size=config["DB_POOL_SIZE"],
+        max_overflow=config["DB_MAX_OVERFLOW"],
+        pool_timeout=config["DB_POOL_TIMEOUT"],
+    )
+    if uri.startswith("mysql"):
+        connect_args = {"connect_timeout": config["DB_CONNECT_TIMEOUT"]}
+        if config["DB_READ_TIMEOUT"]:
+            connect_args["read_timeout"] = config["DB_READ_TIMEOUT"]
+            connect_args["write_timeout"] = config["DB_READ_TIMEOUT"]
+        if config["DB_STATEMENT_TIMEOUT_MS"]:
+            # MySQL aborts SELECTs running longer than this; writes are not affected
+            connect_args["init_command"] = f"SET SESSION max_execution_time={int(config['DB_STATEMENT_TIMEOUT_MS'])}"
+        options["connect_args"] = connect_args
+    elif uri.startswith("sqlite"):
+        # seconds a writer waits on SQLite's database lock before "database is locked"
+        options["connect_args"] = {"timeout": config["DB_CONNECT_TIMEOUT"]}
+    return options
+
+
 class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URI", SQLALCHEMY_DATABASE_URI_local)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SECRET_KEY = "secret-key"
+    # set by the prod profile: debug mode and the dev server are refused
+    PRODUCTION = False
+
+    # seconds the dashboard/inventory counters are reused between requests
+    STATS_CACHE_TTL = int(os.getenv("STATS_CACHE_TTL", 5))
+    # seconds an optional list total (?with_total=1) is reused
+    COUNT_CACHE_TTL = int(os.getenv("COUNT_CACHE_TTL", 60))
+    # seconds browsers may reuse /api/categories and /api/employees before revalidating
+    # (other JSON APIs always revalidate with their ETag)
+    STATIC_LIST_MAX_AGE = int(os.getenv("STATIC_LIST_MAX_AGE", 60))
+
+    # tool/employee lookup: "auto" (fulltext on MySQL, trigram elsewhere), "fulltext", "trigram" or "like"
+    SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto")
+    # seconds between the trigram index's background checks of the "search" table
+    # version; other workers' tool/employee renames are then replayed from
+    # search_changes ("flask db upgrade"). 0 leaves the index unbuilt: plain LIKE queries
+    SEARCH_INDEX_MAX_AGE = int(os.getenv("SEARCH_INDEX_MAX_AGE", 2))
+    # autocomplete result cap for /find-tools and /find-employees
+    SEARCH_RESULT_LIMIT = int(os.getenv("SEARCH_RESULT_LIMIT", 20))
+
+    # per-request SQL count/time (Server-Timing header, N+1 and slow-query warnings in the log)
+    SQL_TRACE = os.getenv("SQL_TRACE", "1") == "1"
+    # log statements slower than this many ms; 0 turns the slow-query log off
+    SQL_SLOW_QUERY_MS = int(os.getenv("SQL_SLOW_QUERY_MS", 200))
+    # warn when one statement shape runs this many times in a single request (N+1)
+    SQL_REPEAT_WARN = int(os.getenv("SQL_REPEAT_WARN", 10))
+    # expose the per-endpoint SQL summary at /_metrics (always on in debug mode)
+    SQL_METRICS_ENDPOINT = os.getenv("SQL_METRICS_ENDPOINT", "0") == "1"
+
+    # Prometheus text format at /metrics: request counts, latency histograms, pool gauges
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+    # when set, /metrics answers only "Authorization: Bearer <token>" (the scraper's bearer_token)
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+    # shared directory for multi-process servers (Gunicorn): each worker writes its
+    # counters there and /metrics sums them; unset for a single process
+    METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR") or os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    # seconds between a worker's snapshot writes to METRICS_MULTIPROC_DIR
+    METRICS_FLUSH_INTERVAL = int(os.getenv("METRICS_FLUSH_INTERVAL", 5))
+
+    # ---- database engine / pool; the profiles below change the defaults, the
+    # DB_* environment variables override any profile
+    DB_DRIVER = os.getenv("DB_DRIVER", "pymysql")
+    # DBAPI of the async lookups in asgi.py: "auto" (aiomysql / aiosqlite) or e.g. "asyncmy"
+    ASYNC_DB_DRIVER = os.getenv("ASYNC_DB_DRIVER", "auto")
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 5))
+    # seconds a request waits for a free connection before failing
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+    # reconnect connections older than this many seconds, below MySQL's wait_timeout
+    # so the server never drops one we still hold ("MySQL server has gone away")
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    # test each connection with a ping on checkout
+    DB_POOL_PRE_PING = _flag("DB_POOL_PRE_PING", True)
+    DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", 10))
+    # socket read/write timeout in seconds, 0 for none (MySQL)
+    DB_READ_TIMEOUT = int(os.getenv("DB_READ_TIMEOUT", 0))
+    # per-SELECT limit in ms through max_execution_time, 0 for none (MySQL)
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 0))
+    # comma-separated read replica URIs; read_only views query one of them at random
+    DATABASE_REPLICA_URIS = [u.strip() for u in os.getenv("DATABASE_REPLICA_URIS", "").split(",") if u.strip()]
+    # seconds a client keeps reading from the primary after it wrote (replication lag)
+    REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", 5))
+    # rows per server-side cursor fetch in the streamed exports (yield_per)
+    STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 1000))
+    # largest /api/movements/export?format=xlsx; the workbook is built before it is sent
+    # (~5k rows/s), so keep it well inside the server timeout. Bigger exports: CSV. 0 for no limit
+    XLSX_MAX_ROWS = int(os.getenv("XLSX_MAX_ROWS", 150000))
+    # checkout/return/maintenance transactions run again this many times after a
+    # deadlock, lock wait timeout or busy SQLite file (see transitions.py)
+    TRANSITION_RETRIES = int(os.getenv("TRANSITION_RETRIES", 3))
+    # first backoff before a retry, in ms; doubles each time, with random jitter
+    TRANSITION_RETRY_BACKOFF_MS = int(os.getenv("TRANSITION_RETRY_BACKOFF_MS", 20))
+    # tools per kiosk scan at /api/borrows/batch and /api/returns/batch
+    KIOSK_BATCH_MAX = int(os.getenv("KIOSK_BATCH_MAX", 100))
+
+    # overdue loans served from an in-process index of open loans instead of a range scan
+    OVERDUE_INDEX = os.getenv("OVERDUE_INDEX", "1") == "1"
+    # seconds before the index is rebuilt to pick up other workers' loans and imports
+    OVERDUE_INDEX_MAX_AGE = int(os.getenv("OVERDUE_INDEX_MAX_AGE", 60))
+    # background scanner period: rebuilds the index and sends "overdue" events; 0 turns it off
+    OVERDUE_SCAN_INTERVAL = int(os.getenv("OVERDUE_SCAN_INTERVAL", 30))
+
+    # live updates at /api/events: "local" (one process) or "redis" (several workers/servers)
+    EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "local")
+    EVENTS_REDIS_URL = os.getenv("EVENTS_REDIS_URL", "redis://localhost:6379/0")
+    # seconds to connect to / answer from Redis before a publish is given up
+    EVENTS_REDIS_TIMEOUT = float(os.getenv("EVENTS_REDIS_TIMEOUT", 1))
+    EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "magasin-events")
+    # seconds between keepalive comments on an idle stream
+    EVENTS_KEEPALIVE = int(os.getenv("EVENTS_KEEPALIVE", 15))
+    # events buffered per open stream before a slow client is told to reload
+    EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", 100))
+    # open streams per process before new tabs are told to poll (each holds a
+    # worker thread under gunicorn); 0 for no limit. asgi.py streams without threads
+    EVENTS_MAX_STREAMS = int(os.getenv("EVENTS_MAX_STREAMS", 0))
+
+    # uploaded tool photos and their thumbnails, named by content hash (shared by every worker)
+    PHOTO_DIR = os.getenv("PHOTO_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "photos"))
+    # threads per process making thumbnails in the background
+    PHOTO_WORKERS = int(os.getenv("PHOTO_WORKERS", 2))
+    PHOTO_MAX_BYTES = int(os.getenv("PHOTO_MAX_BYTES", 10 * 1024 * 1024))
+
+    # gzip (or brotli, when installed) JSON/HTML bodies; turn off if nginx already does it
+    COMPRESS = _flag("COMPRESS", True)
+    # bodies smaller than this many bytes are sent as they are
+    COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", 1024))
+    COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", 5))
+    COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", 4))
+
+
+class DevConfig(Config):
+    pass
+
+
+class ProdConfig(Config):
+    # several Gunicorn workers with threads: keep a bigger warm pool, fail fast when
+    # it is exhausted, and never let one report query hold a connection for minutes
+    PRODUCTION = True
+    DB_DRIVER = os.getenv("DB_DRIVER", "auto")
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 10))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 280))
+    DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", 5))
+    DB_READ_TIMEOUT = int(os.getenv("DB_READ_TIMEOUT", 60))
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 30000))
+    SQL_SLOW_QUERY_MS = int(os.getenv("SQL_SLOW_QUERY_MS", 500))
+    STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 2000))
+    # at most half of a gthread worker's threads (gunicorn.conf.py) stuck in dashboard streams
+    EVENTS_MAX_STREAMS = int(os.getenv("EVENTS_MAX_STREAMS", max(1, int(os.getenv("GUNICORN_THREADS", 8)) // 2)))
+    # the local broker only reaches the tabs of the worker that published the event
+    EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "redis")
+    # /metrics lists every endpoint's traffic and the pool state: opt in, ideally with METRICS_TOKEN
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+
+
+class BenchConfig(Config):
+    # measure the queries, not the pool: enough connections for the load test's
+    # threads, no per-checkout ping, no recycling
+    DB_DRIVER = os.getenv("DB_DRIVER", "auto")
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 20))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 0))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", -1))
+    DB_POOL_PRE_PING = _flag("DB_POOL_PRE_PING", False)
+    SQL_SLOW_QUERY_MS = int(os.getenv("SQL_SLOW_QUERY_MS", 0))
+    SQL_REPEAT_WARN = int(os.getenv("SQL_REPEAT_WARN", 0))
+
 
+# selected with APP_PROFILE
+PROFILES = {"dev": DevConfig, "prod": ProdConfig, "bench": BenchConfig}
@@ -0,0 +1,247 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from flask import Response, current_app, has_app_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .models import db
+from .serializers import FastJSONProvider
+
+# events kept for clients reconnecting with Last-Event-ID
+REPLAY_SIZE = 200
+# seconds events are dropped after a failed Redis publish
+PUBLISH_PAUSE = 5
+# longest wait between two reconnections of the Redis listener
+LISTEN_MAX_BACKOFF = 30
+
+
+class LocalBroker:
+    # in-process pub/sub: one bounded queue per open /api/events stream. A slow
+    # client loses events instead of growing memory; it refetches on "reset"
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.recent = deque(maxlen=REPLAY_SIZE)
+        self.ids = itertools.count(1)
+
+    def publish(self, kind, data):
+        self.deliver(kind, data)
+
+    def deliver(self, kind, data):
+        with self.lock:
+            item = (f"{int(time.time() * 1000)}-{next(self.ids)}", kind, data)
+            self.recent.append(item)
+            subscribers = list(self.subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(item)
+            except queue.Full:
+                q.overflowed = True
+
+    def subscribe(self, last_id=None, q=None):
+        # q: anything with put_nowait raising queue.Full (AsyncSubscriber for asgi.py)
+        if q is None:
+            q = queue.Queue(self.queue_size)
+        q.overflowed = False
+        with self.lock:
+            self.subscribers.add(q)
+            ids = [item[0] for item in self.recent]
+            if last_id in ids:
+                for item in list(self.recent)[ids.index(last_id) + 1:][-self.queue_size:]:
+                    q.put_nowait(item)
+            elif last_id:
+                # the gap is bigger than the replay buffer (or another process): start over
+                q.overflowed = True
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.subscribers.discard(q)
+
+
+class AsyncSubscriber:
+    # a subscriber queue for an event loop (the ASGI /api/events): the broker
+    # delivers from any thread, the items land in an asyncio.Queue on the loop
+    def __init__(self, loop, queue_size=100):
+        self.loop = loop
+        self.queue = asyncio.Queue(queue_size)
+        self.overflowed = False
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    def put_nowait(self, item):
+        self.loop.call_soon_threadsafe(self._put, item)
+
+
+class RedisBroker(LocalBroker):
+    # every process publishes to one Redis channel and a listener thread per
+    # process fans the messages out to that process's local subscribers
+    def __init__(self, url, channel, queue_size=100, timeout=1, logger=None):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("EVENTS_BACKEND=redis needs the redis package (pip3 install redis)")
+        super().__init__(queue_size)
+        self.channel = channel
+        self.logger = logger or logging.getLogger(__name__)
+        # publishing runs after a write commits: a Redis outage costs it one timeout, not a hang
+        self.client = redis.Redis.from_url(url, socket_connect_timeout=timeout, socket_timeout=timeout)
+        # the listener blocks on reads by design; health checks notice a dead connection
+        self.listen_client = redis.Redis.from_url(
+            url, socket_connect_timeout=timeout, socket_keepalive=True, health_check_interval=30)
+        self.listener = None
+        self.down_until = 0
+
+    def publish(self, kind, data):
+        # after a failure, events are dropped for a few seconds instead of every
+        # write waiting on the timeout again; the dashboards just miss a refresh
+        if time.monotonic() < self.down_until:
+            return
+        try:
+            self.client.publish(self.channel, json.dumps({"kind": kind, "data": data}, default=FastJSONProvider.default))
+        except Exception:
+            self.down_until = time.monotonic() + PUBLISH_PAUSE
+            self.logger.exception("redis publish failed, events dropped for %ss", PUBLISH_PAUSE)
+
+    def subscribe(self, last_id=None, q=None):
+        with self.lock:
+            if self.listener is None:
+                # started lazily so Gunicorn forks don't inherit a dead thread
+                self.listener = threading.Thread(target=self._listen, name="events-redis", daemon=True)
+                self.listener.start()
+        return super().subscribe(last_id, q)
+
+    def _listen(self):
+        backoff = 1
+        while True:
+            connected_at = time.monotonic()
+            try:
+                pubsub = self.listen_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    try:
+                        payload = json.loads(message["data"])
+                        kind, data = payload["kind"], payload["data"]
+                    except (ValueError, KeyError, TypeError):
+                        self.logger.warning("ignored malformed event on %s: %r", self.channel, message["data"][:200])
+                        continue
+                    self.deliver(kind, data)
+            except Exception:
+                if time.monotonic() - connected_at > LISTEN_MAX_BACKOFF:
+                    # it was up for a while: a fresh outage, start the backoff over
+                    backoff = 1
+                self.logger.exception("redis event listener failed, retrying in %ss", backoff)
+                time.sleep(backoff * (0.5 + random.random() / 2))
+                backoff = min(backoff * 2, LISTEN_MAX_BACKOFF)
+
+
+def init_events(app):
+    size = app.config.get("EVENTS_QUEUE_SIZE", 100)
+    if app.config.get("EVENTS_BACKEND", "local") == "redis":
+        broker = RedisBroker(app.config["EVENTS_REDIS_URL"], app.config.get("EVENTS_CHANNEL", "magasin-events"), size,
+                             timeout=app.config.get("EVENTS_REDIS_TIMEOUT", 1), logger=app.logger)
+    elif app.config.get("PRODUCTION") and os.getenv("WEB_CONCURRENCY", "") != "1":
+        # gunicorn.conf.py starts several workers unless WEB_CONCURRENCY=1
+        raise RuntimeError("EVENTS_BACKEND=local with several workers: set EVENTS_BACKEND=redis, or WEB_CONCURRENCY=1")
+    else:
+        broker = LocalBroker(size)
+    app.extensions["events"] = broker
+    app.extensions["events_streams"] = {"open": 0, "lock": threading.Lock()}
+    app.add_url_rule("/api/events", "events", events_stream)
+    return broker
+
+
+# ---- publishing ------------------------------------------------------------
+# events wait in session.info until the transaction commits, so a rolled back
+# borrow is never announced
+def emit(kind, **data):
+    db.session.info.setdefault("events", []).append((kind, data))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_events(session):
+    pending = session.info.pop("events", None)
+    if not pending or not has_app_context():
+        return
+    broker = current_app.extensions.get("events")
+    if broker is None:
+        return
+    for kind, data in pending:
+        try:
+            broker.publish(kind, data)
+        except Exception:
+            current_app.logger.exception("could not publish %s event", kind)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_events(session):
+    session.info.pop("events", None)
+
+
+# ---- /api/events -------------------------------------------------------------
+def _format(event_id, kind, data):
+    head = f"id: {event_id}\n" if event_id else ""
+    return f"{head}event: {kind}\ndata: {json.dumps(data, default=FastJSONProvider.default)}\n\n"
+
+
+def _release_stream(app):
+    state = app.extensions["events_streams"]
+    with state["lock"]:
+        state["open"] -= 1
+
+
+def events_stream():
+    # no database work and no request context kept, but an open tab holds a worker
+    # thread: past EVENTS_MAX_STREAMS per process the tab is told to poll instead
+    # (asgi.py serves this path without a thread, see AsyncAPI.events)
+    app = current_app._get_current_object()
+    broker = app.extensions["events"]
+    keepalive = app.config.get("EVENTS_KEEPALIVE", 15)
+    limit = app.config.get("EVENTS_MAX_STREAMS", 0)
+    state = app.extensions["events_streams"]
+    with state["lock"]:
+        if limit and state["open"] >= limit:
+            response = jsonify({"success": False, "message": "Too many open event streams, poll instead"})
+            response.status_code = 503
+            response.headers["Retry-After"] = "60"
+            return response
+        state["open"] += 1
+    last_id = request.headers.get("Last-Event-ID") or request.args.get("last_id")
+    q = broker.subscribe(last_id)
+
+    def generate():
+        yield "retry: 3000\n\n"
+        while True:
+            if q.overflowed:
+                q.overflowed = False
+                yield _format(None, "reset", {})
+            try:
+                yield _format(*q.get(timeout=keepalive))
+            except queue.Empty:
+                # comment line: keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+
+    response = Response(generate(), mimetype="text/event-stream")
+    response.headers["Cache-Control"] = "no-cache"
+    # nginx would otherwise buffer the stream
+    response.headers["X-Accel-Buffering"] = "no"
+
+    def close():
+        broker.unsubscribe(q)
+        _release_stream(app)
+
+    # runs when the server closes the response, even if the stream never started
+    response.call_on_close(close)
+    return response
@@ -0,0 +1,67 @@
+from datetime import datetime
+from sqlalchemy import func, text
+from .models import Tool, Movement, db
+from .pagination import _seek
+from .serializers import TOOL_FULL
+
+# tables big enough that a full scan on a hot path is a bug
+WATCHED_TABLES = ("tools", "movements")
+
+
+def hot_queries():
+    # the query shapes views.py runs on every page load, first and next page
+    now = datetime.utcnow()
+    return {
+        "overdue": db.session.query(Movement)
+            .filter(Movement.status == 'Checked Out', Movement.expected_return < now)
+            .order_by(Movement.expected_return.asc(), Movement.id.asc()).limit(51),
+        "checked_out_by_date": db.session.query(Movement)
+            .filter(Movement.status == 'Checked Out')
+            .order_by(Movement.date_emprunt.desc()),
+        "movements_page": db.session.query(Movement)
+            .order_by(Movement.date_emprunt.desc(), Movement.id.desc()).limit(51),
+        "movements_page_next": db.session.query(Movement)
+            .filter(_seek(Movement.date_emprunt, Movement.id, now, 1000, descending=True))
+            .order_by(Movement.date_emprunt.desc(), Movement.id.desc()).limit(51),
+        "tools_page": TOOL_FULL.apply(db.session.query(Tool))
+            .order_by(Tool.date_ajout.desc(), Tool.id.desc()).limit(13),
+        "tools_page_next": TOOL_FULL.apply(db.session.query(Tool))
+            .filter(_seek(Tool.date_ajout, Tool.id, now, "TL0100", descending=True))
+            .order_by(Tool.date_ajout.desc(), Tool.id.desc()).limit(13),
+        "tools_by_name": TOOL_FULL.apply(db.session.query(Tool))
+            .order_by(Tool.name.asc(), Tool.id.asc()).limit(49),
+        "tools_by_employee": TOOL_FULL.apply(db.session.query(Tool))
+            .filter(Tool.current_employee_id == 1),
+        "stats": db.session.query(Tool.status, func.count(Tool.id)).group_by(Tool.status),
+        "recent_borrows": db.session.query(Movement).join(Movement.tool).outerjoin(Movement.employee)
+            .order_by(Movement.date_emprunt.desc()).limit(20),
+    }
+
+
+def _compile(query):
+    return str(query.statement.compile(db.engine, compile_kwargs={"literal_binds": True}))
+
+
+def _full_scans(sql):
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite":
+        rows = db.session.execute(text("EXPLAIN QUERY PLAN " + sql)).all()
+        plan = [r[-1] for r in rows]
+        scans = [
+            line for line in plan
+            if line.startswith("SCAN ")
+            and line.split()[1] in WATCHED_TABLES
+            and " USING " not in line
+        ]
+    elif dialect == "mysql":
+        result = db.session.execute(text("EXPLAIN " + sql)).mappings().all()
+        plan = [dict(r) for r in result]
+        scans = [r for r in plan if r.get("table") in WATCHED_TABLES and r.get("type") == "ALL"]
+    else:
+        raise RuntimeError(f"EXPLAIN check not supported on {dialect}")
+    return plan, scans
+
+
+def explain_hot_queries():
+    # {name: (plan, full_scans)}; empty full_scans means the query is index-served
+    return {name: _full_scans(_compile(q)) for name, q in hot_queries().items()}
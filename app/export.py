@@ -0,0 +1,115 @@
+import csv
+import io
+import tempfile
+from datetime import datetime
+from flask import Response, current_app, jsonify, send_file, stream_with_context
+from sqlalchemy import func
+from .models import Employee, Movement, Tool, db
+from .streaming import YIELD_PER, unbounded
+
+# rows per worksheet, header included: Excel's limit
+XLSX_SHEET_ROWS = 1_048_576
+
+# (header, column) for one ledger row; exports select these columns directly
+# instead of loading Movement/Tool/Employee objects
+MOVEMENT_COLUMNS = (
+    ("id", Movement.id),
+    ("tool_id", Movement.tool_id),
+    ("tool_name", Tool.name),
+    ("employee_id", Movement.employee_id),
+    ("employee_name", Employee.name),
+    ("status", Movement.status),
+    ("date_emprunt", Movement.date_emprunt),
+    ("expected_return", Movement.expected_return),
+    ("return_date", Movement.return_date),
+)
+
+
+def _csv_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@"):
+        # keep spreadsheet apps from evaluating free-text names as formulas
+        return "'" + value
+    return value
+
+
+def _filename(prefix, ext):
+    return f"{prefix}_{datetime.utcnow():%Y%m%d_%H%M%S}.{ext}"
+
+
+def _rows(query, columns, batch_size):
+    return unbounded(query.with_entities(*(col for _, col in columns))).yield_per(batch_size)
+
+
+def csv_response(query, columns, prefix, batch_size=None):
+    batch_size = batch_size or current_app.config.get("STREAM_BATCH_SIZE", YIELD_PER)
+    rows = _rows(query, columns, batch_size)
+
+    def generate():
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow([name for name, _ in columns])
+        for n, row in enumerate(rows, 1):
+            writer.writerow([_csv_cell(value) for value in row])
+            if n % batch_size == 0:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
+
+    response = Response(stream_with_context(generate()), mimetype="text/csv")
+    response.headers["Content-Disposition"] = f"attachment; filename={_filename(prefix, 'csv')}"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+def _too_many(query, column, limit):
+    # counts at most limit + 1 rows, so a multi-million row ledger costs no full COUNT
+    capped = query.with_entities(column).order_by(None).limit(limit + 1).subquery()
+    return db.session.query(func.count()).select_from(capped).scalar() > limit
+
+
+def xlsx_response(query, columns, prefix, batch_size=None):
+    batch_size = batch_size or current_app.config.get("STREAM_BATCH_SIZE", YIELD_PER)
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        return jsonify({"success": False, "message": "XLSX export needs openpyxl (pip install openpyxl)"}), 501
+
+    # the workbook is complete before the first byte goes out (a few thousand rows/s),
+    # so past XLSX_MAX_ROWS the worker would hit the server timeout: CSV streams instead
+    limit = current_app.config.get("XLSX_MAX_ROWS", 0)
+    if limit and _too_many(query, columns[0][1], limit):
+        return jsonify({
+            "success": False,
+            "message": f"XLSX export is limited to {limit} rows, use format=csv or narrow the filters",
+        }), 400
+
+    # write-only mode streams rows to disk; only the finished zip is sent.
+    # A sheet holds XLSX_SHEET_ROWS rows with its header, then the next one starts
+    wb = Workbook(write_only=True)
+    header = [name for name, _ in columns]
+    sheets, ws, used = 0, None, XLSX_SHEET_ROWS
+    for row in _rows(query, columns, batch_size):
+        if used == XLSX_SHEET_ROWS:
+            sheets += 1
+            ws = wb.create_sheet("movements" if sheets == 1 else f"movements {sheets}")
+            ws.append(header)
+            used = 1
+        ws.append(list(row))
+        used += 1
+    if ws is None:
+        wb.create_sheet("movements").append(header)
+
+    out = tempfile.TemporaryFile()
+    wb.save(out)
+    out.seek(0)
+    return send_file(
+        out,
+        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        as_attachment=True,
+        download_name=_filename(prefix, "xlsx"),
+    )
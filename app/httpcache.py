@@ -0,0 +1,147 @@
+import hashlib
+from datetime import datetime
+from functools import wraps
+from flask import current_app, has_app_context, make_response, request
+from sqlalchemy import event, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from .compress import ENCODINGS, encoded_etag
+from .models import Category, Employee, Movement, TableVersion, Tool, db
+
+VERSIONED = {Tool: "tools", Movement: "movements", Category: "categories", Employee: "employees"}
+VERSIONED_TABLES = set(VERSIONED.values())
+# the Movement listeners in views.py write tools.current_* / last_checked_out
+# straight through the connection, so a movement write is a tools write too
+IMPLIED = {"movements": {"tools"}}
+
+
+class VersionBumpFailed(RuntimeError):
+    # not an OperationalError: run_transition must not run committed work again
+    pass
+
+
+def _bump(connection, tables):
+    # one statement: the version rows are locked together, in primary key order
+    t = TableVersion.__table__
+    now = datetime.utcnow()
+    names = sorted(tables)
+    result = connection.execute(
+        t.update().where(t.c.name.in_(names)).values(version=t.c.version + 1, updated_at=now)
+    )
+    if result.rowcount < len(names):
+        existing = {name for (name,) in connection.execute(select(t.c.name).where(t.c.name.in_(names)))}
+        for name in names:
+            if name not in existing:
+                connection.execute(t.insert().values(name=name, version=1, updated_at=now))
+
+
+def _with_implied(tables):
+    tables = set(tables)
+    for name in list(tables):
+        tables |= IMPLIED.get(name, set())
+    return tables
+
+
+def _queue(session, tables):
+    session.info.setdefault("version_bumps", set()).update(_with_implied(tables))
+
+
+@event.listens_for(Session, "after_flush")
+def _record_flushed(session, flush_context):
+    # new/dirty/deleted still hold the pre-flush state here
+    tables = {
+        VERSIONED[type(obj)]
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if type(obj) in VERSIONED
+    }
+    if tables:
+        _queue(session, tables)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_bulk(orm_execute_state):
+    # Core INSERT/UPDATE/DELETE run through the session (import, seed, reconcile)
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    table = getattr(orm_execute_state.statement, "table", None)
+    name = getattr(table, "name", None)
+    if name in VERSIONED_TABLES:
+        _queue(orm_execute_state.session, {name})
+
+
+@event.listens_for(Session, "after_commit")
+def _committed(session):
+    pending = session.info.pop("version_bumps", None)
+    if pending:
+        session.info["committed_bumps"] = pending
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _bump_committed(session, transaction):
+    # in a short transaction of its own once the data is committed (and the
+    # session's connection is back in the pool), so no checkout or return ever
+    # holds the version rows while it runs. A reader landing in between gets the
+    # new rows under the old ETag and simply revalidates once more; the other
+    # order would let it cache stale data
+    if transaction.parent is not None:
+        return
+    tables = session.info.pop("committed_bumps", None)
+    if not tables or not has_app_context():
+        return
+    try:
+        # the version rows live on the primary, even after a read_only request
+        with db.engine.begin() as connection:
+            _bump(connection, tables)
+    except SQLAlchemyError as e:
+        # the data is committed but clients would keep getting 304s for the old
+        # version: fail the request rather than answer as if all went well
+        current_app.logger.exception("table version bump failed for %s", ", ".join(sorted(tables)))
+        raise VersionBumpFailed(f"committed, but the {', '.join(sorted(tables))} versions were not bumped") from e
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_version_bumps(session):
+    session.info.pop("version_bumps", None)
+
+
+def table_versions(tables):
+    # {name: (version, updated_at)}, one small primary-key read per request
+    rows = db.session.query(TableVersion).filter(TableVersion.name.in_(tables)).all()
+    return {row.name: (row.version, row.updated_at) for row in rows}
+
+
+def conditional(*tables, max_age=None):
+    # strong ETag from the versions of the tables the view reads plus its URL
+    # (query string included); a matching If-None-Match / If-Modified-Since gets a
+    # 304 before the view runs. max_age names a config key: seconds browsers may
+    # reuse the response without asking, otherwise they revalidate every time
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            versions = table_versions(tables)
+            key = request.full_path + "|" + ",".join(f"{t}:{versions.get(t, (0,))[0]}" for t in sorted(tables))
+            etag = hashlib.sha1(key.encode()).hexdigest()[:32]
+            stamps = [stamp for _, stamp in versions.values()]
+            last_modified = max(stamps).replace(microsecond=0) if stamps else None
+
+            matched = None
+            if request.if_none_match:
+                # one strong ETag per representation: compress.py appends the content-coding
+                candidates = [etag] + [encoded_etag(etag, encoding) for encoding in ENCODINGS]
+                matched = next((tag for tag in candidates if request.if_none_match.contains(tag)), None)
+                not_modified = matched is not None
+            else:
+                since = request.if_modified_since
+                not_modified = bool(since and last_modified and last_modified <= since.replace(tzinfo=None))
+
+            response = current_app.response_class(status=304) if not_modified else make_response(view(*args, **kwargs))
+            if response.status_code in (200, 304):
+                # a 304 carries the ETag of the representation the client holds
+                response.set_etag(matched or etag)
+                if last_modified:
+                    response.last_modified = last_modified
+                age = current_app.config.get(max_age) if max_age else 0
+                response.headers["Cache-Control"] = f"private, max-age={age}" if age else "no-cache"
+            return response
+        return wrapper
+    return decorator
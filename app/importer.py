@@ -0,0 +1,352 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from sqlalchemy import insert
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from .models import Category, Employee, Movement, Tool, db
+from .search import log_bulk_changes
+
+IMPORT_FORMATS = ("csv", "ndjson")
+# rows validated and written per transaction
+CHUNK_SIZE = 1000
+# the report keeps the first errors only, a bad 50k file should not echo 50k lines
+MAX_REPORTED_ERRORS = 500
+
+# kept from the first insert when a row is upserted again. A tool's status
+# belongs to the borrow/return/maintenance flows: re-importing the catalogue
+# must not mark a tool that is out on loan as available
+INSERT_ONLY = {"tools": ("date_ajout", "status"), "employees": (), "movements": ()}
+# file column -> table column, where they differ
+COLUMN_ALIASES = {"category": "category_id"}
+
+TOOL_STATUSES = ("Disponible", "Emprunté", "En réparation", "Cassé")
+MOVEMENT_STATUSES = ("Checked Out", "Returned", "En réparation")
+
+
+class RowError(ValueError):
+    pass
+
+
+def _text(row, key, required=False, column=None):
+    value = row.get(key)
+    value = "" if value is None else str(value).strip()
+    if not value:
+        if required:
+            raise RowError(f"{key} is required")
+        return None
+    if column is not None and column.type.length and len(value) > column.type.length:
+        raise RowError(f"{key} is longer than {column.type.length} characters")
+    return value
+
+
+def _int(row, key, required=False):
+    value = _text(row, key, required)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise RowError(f"{key} must be an integer")
+
+
+def _float(row, key):
+    value = _text(row, key)
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise RowError(f"{key} must be a number")
+
+
+def _datetime(row, key, required=False):
+    value = _text(row, key, required)
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise RowError(f"{key} must be an ISO date (YYYY-MM-DD[ HH:MM[:SS]])")
+
+
+def _date(row, key):
+    value = _datetime(row, key)
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _choice(row, key, choices, default):
+    value = _text(row, key) or default
+    if value not in choices:
+        raise RowError(f"{key} must be one of: {', '.join(choices)}")
+    return value
+
+
+# ---- per-kind row validation ---------------------------------------------
+# each returns the full column dict, so every row of a chunk has the same keys
+# and the chunk goes out as a single executemany
+
+def _tool_row(row, categories):
+    c = Tool.__table__.c
+    category_id = _int(row, "category_id")
+    if category_id is None:
+        name = _text(row, "category", required=True)
+        category_id = categories.get(name.lower())
+        if category_id is None:
+            raise RowError(f"unknown category {name!r}")
+    elif category_id not in categories.values():
+        raise RowError(f"unknown category_id {category_id}")
+    return {
+        "id": _text(row, "id", True, c.id),
+        "name": _text(row, "name", True, c.name),
+        "category_id": category_id,
+        "loc_row": _int(row, "loc_row", True),
+        "loc_col": _int(row, "loc_col", True),
+        "loc_shelf": _int(row, "loc_shelf", True),
+        "description": _text(row, "description", column=c.description),
+        "status": _choice(row, "status", TOOL_STATUSES, "Disponible"),
+        "price": _float(row, "price"),
+        "purchase_date": _date(row, "purchase_date") or date.today(),
+        "last_maintenance": _date(row, "last_maintenance"),
+        "photo": _text(row, "photo", column=c.photo),
+        "date_ajout": _datetime(row, "date_ajout") or datetime.utcnow(),
+    }
+
+
+def _employee_row(row, _):
+    c = Employee.__table__.c
+    return {
+        "id": _int(row, "id", True),
+        "name": _text(row, "name", True, c.name),
+        "department": _text(row, "department", column=c.department),
+    }
+
+
+def _movement_row(row, _):
+    status = _choice(row, "status", MOVEMENT_STATUSES, "Checked Out")
+    date_emprunt = _datetime(row, "date_emprunt", True)
+    expected_return = _datetime(row, "expected_return")
+    return_date = _datetime(row, "return_date")
+    if status == "Returned" and return_date is None:
+        raise RowError("return_date is required for a Returned movement")
+    if return_date is not None and return_date < date_emprunt:
+        raise RowError("return_date is before date_emprunt")
+    return {
+        "id": _int(row, "id"),
+        "tool_id": _text(row, "tool_id", True),
+        "employee_id": _int(row, "employee_id"),
+        "date_emprunt": date_emprunt,
+        "expected_return": expected_return,
+        "return_date": return_date,
+        "status": status,
+    }
+
+
+def _match_existing(rows):
+    # a movement without an id is keyed on (tool_id, date_emprunt): reuse the id
+    # of the stored one so importing the same file twice does not double the ledger
+    pending = [r for _, r in rows if r["id"] is None]
+    if not pending:
+        return
+    tool_ids = {r["tool_id"] for r in pending}
+    dates = {r["date_emprunt"] for r in pending}
+    found = {
+        (tool_id, date_emprunt): mid
+        for mid, tool_id, date_emprunt in db.session.query(Movement.id, Movement.tool_id, Movement.date_emprunt)
+        .filter(Movement.tool_id.in_(tool_ids), Movement.date_emprunt.in_(dates))
+    }
+    for r in pending:
+        r["id"] = found.get((r["tool_id"], r["date_emprunt"]))
+
+
+def _natural_key(kind, row):
+    if kind == "movements" and row["id"] is None:
+        return (row["tool_id"], row["date_emprunt"])
+    return row["id"]
+
+
+def _missing_refs(rows):
+    # movements point at tools/employees: one IN query per chunk, not per row
+    tool_ids = {r["tool_id"] for _, r in rows}
+    emp_ids = {r["employee_id"] for _, r in rows if r["employee_id"] is not None}
+    known_tools = {i for (i,) in db.session.query(Tool.id).filter(Tool.id.in_(tool_ids))} if tool_ids else set()
+    known_emps = {i for (i,) in db.session.query(Employee.id).filter(Employee.id.in_(emp_ids))} if emp_ids else set()
+    errors = {}
+    for line, r in rows:
+        if r["tool_id"] not in known_tools:
+            errors[line] = f"unknown tool_id {r['tool_id']!r}"
+        elif r["employee_id"] is not None and r["employee_id"] not in known_emps:
+            errors[line] = f"unknown employee_id {r['employee_id']}"
+    return errors
+
+
+IMPORT_KINDS = {
+    "tools": (Tool, _tool_row),
+    "employees": (Employee, _employee_row),
+    "movements": (Movement, _movement_row),
+}
+
+
+# ---- reading -------------------------------------------------------------
+def read_rows(stream, fmt):
+    # (line number, dict) pairs from a text stream; line numbers match the file
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == "ndjson":
+        for line, text in enumerate(stream, 1):
+            if not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except ValueError as e:
+                yield line, RowError(f"invalid JSON: {e}")
+                continue
+            yield line, row if isinstance(row, dict) else RowError("expected a JSON object")
+    else:
+        raise ValueError(f"format must be one of: {', '.join(IMPORT_FORMATS)}")
+
+
+def detect_format(filename, default="csv"):
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    if name.endswith(".csv"):
+        return "csv"
+    return default
+
+
+def text_stream(binary):
+    # utf-8-sig drops the BOM Excel puts in front of CSV exports
+    return io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+
+
+# ---- writing -------------------------------------------------------------
+def _given(raw):
+    # the table columns a file row has a value for; an existing row only gets those
+    return frozenset(
+        COLUMN_ALIASES.get(key, key) for key, value in raw.items()
+        if value is not None and str(value).strip()
+    )
+
+
+def _upsert(table, rows, given):
+    # insert, or overwrite the given non-key columns when the primary key exists
+    dialect = db.engine.dialect.name
+    keys = [c for c in rows[0] if c != "id" and c not in INSERT_ONLY[table.name] and c in given]
+    if dialect == "mysql":
+        stmt = mysql.insert(table)
+        stmt = stmt.on_duplicate_key_update({k: stmt.inserted[k] for k in keys} or {"id": stmt.inserted["id"]})
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(table)
+        if keys:
+            stmt = stmt.on_conflict_do_update(index_elements=["id"], set_={k: stmt.excluded[k] for k in keys})
+        else:
+            stmt = stmt.on_conflict_do_nothing(index_elements=["id"])
+    else:
+        raise RuntimeError(f"upsert not supported on {dialect}")
+    db.session.execute(stmt, rows)
+
+
+def _write(model, rows):
+    # rows are (row, given columns) pairs
+    table = model.__table__
+    by_given = {}
+    for r, given in rows:
+        if r["id"] is not None:
+            by_given.setdefault(given, []).append(r)
+    # one upsert per set of given columns: a CSV file is a single one
+    for given, group in by_given.items():
+        _upsert(table, group, given)
+    # movements without an id are new history lines: plain executemany insert
+    without_id = [{k: v for k, v in r.items() if k != "id"} for r, _ in rows if r["id"] is None]
+    if without_id:
+        db.session.execute(insert(table), without_id)
+    if model in (Tool, Employee):
+        # Core writes skip the mapper events; log the search index update by hand.
+        # A row without a name keeps the stored one: nothing to reindex
+        log_bulk_changes("tool" if model is Tool else "employee",
+                         [(r["id"], r["name"]) for r, given in rows if "name" in given])
+
+
+def import_rows(kind, rows, chunk_size=CHUNK_SIZE, dry_run=False):
+    # validate and upsert (line, row) pairs, one transaction per chunk.
+    # Rows that fail are reported by line and skipped, the rest still go in
+    from .loaders import rebuild_current_movements, sync_tool_status
+    from .stats import invalidate_stats
+
+    model, validate = IMPORT_KINDS[kind]
+    categories = {name.lower(): cid for cid, name in db.session.query(Category.id, Category.name)}
+    report = {"success": True, "kind": kind, "rows": 0, "imported": 0, "failed": 0, "errors": []}
+
+    def error(line, message):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"line": line, "message": message})
+
+    def flush(chunk):
+        if kind == "movements":
+            missing = _missing_refs(chunk)
+            for line, message in missing.items():
+                error(line, message)
+            chunk = [(line, r) for line, r in chunk if line not in missing]
+        if not chunk:
+            return
+        if dry_run:
+            report["imported"] += len(chunk)
+            return
+        try:
+            if kind == "movements":
+                _match_existing(chunk)
+            _write(model, [(r, given[line]) for line, r in chunk])
+            if kind == "movements":
+                # Core writes skip the listeners that check tools out and back in
+                sync_tool_status({r["tool_id"] for _, r in chunk})
+            db.session.commit()
+            report["imported"] += len(chunk)
+        except SQLAlchemyError as e:
+            # one bad row fails its whole transaction; report the chunk and go on
+            db.session.rollback()
+            message = str(getattr(e, "orig", e)).splitlines()[0]
+            for line, _ in chunk:
+                error(line, f"chunk rejected by the database: {message}")
+
+    chunk = []
+    seen = {}
+    # line -> columns the file gave a value for
+    given = {}
+    for line, raw in rows:
+        report["rows"] += 1
+        try:
+            if isinstance(raw, Exception):
+                raise raw
+            row = validate(raw, categories)
+        except RowError as e:
+            error(line, str(e))
+            continue
+        key = _natural_key(kind, row)
+        if key is not None and key in seen:
+            # a chunk must not touch the same key twice; flush what we have first
+            flush(chunk)
+            chunk, seen = [], {}
+            given.clear()
+        chunk.append((line, row))
+        given[line] = _given(raw)
+        if key is not None:
+            seen[key] = line
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk, seen = [], {}
+            given.clear()
+    flush(chunk)
+
+    if report["imported"] and not dry_run:
+        if kind == "movements":
+            # Core inserts skip the Movement listeners that keep tools.current_* up to date
+            rebuild_current_movements()
+        invalidate_stats()
+    report["errors"].sort(key=lambda e: e["line"])
+    report["success"] = report["failed"] == 0
+    return report
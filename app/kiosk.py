@@ -0,0 +1,142 @@
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func, insert, update
+from .events import emit
+from .importer import TOOL_STATUSES
+from .models import Employee, Movement, Tool, db
+from .transitions import Conflict, run_transition, transition_all
+
+
+class InvalidBatch(ValueError):
+    pass
+
+
+def scanned_ids(value):
+    # the scanned tool ids, in scan order, each once (a tool scanned twice is one item)
+    if not isinstance(value, list) or not value:
+        raise InvalidBatch("tool_ids : liste d'outils attendue")
+    limit = current_app.config["KIOSK_BATCH_MAX"]
+    if len(value) > limit:
+        raise InvalidBatch(f"Au plus {limit} outils par scan")
+    ids = [str(v).strip() for v in value if v is not None and str(v).strip()]
+    if not ids:
+        raise InvalidBatch("tool_ids : liste d'outils attendue")
+    return list(dict.fromkeys(ids))
+
+
+def returned_status(value):
+    # what the returned tools become: any tool status but 'Emprunté', which
+    # would leave them lent with no open loan
+    if value not in TOOL_STATUSES or value == 'Emprunté':
+        raise InvalidBatch(f"status : {' / '.join(s for s in TOOL_STATUSES if s != 'Emprunté')} attendu")
+    return value
+
+
+def _failed(tool_id, message):
+    return {"tool_id": tool_id, "success": False, "message": message}
+
+
+def _run_batch(work):
+    # a Conflict means another terminal claimed one of our rows between the read
+    # and the UPDATE: read again, its item now fails on its own, the rest go through
+    retries = current_app.config["TRANSITION_RETRIES"]
+    for attempt in range(retries + 1):
+        try:
+            return run_transition(work)
+        except Conflict:
+            if attempt == retries:
+                raise
+
+
+def _queue_overdue(changes):
+    # Core writes skip the Movement listeners of overdue.py
+    db.session.info.setdefault("overdue_changes", []).extend(changes)
+
+
+def borrow_batch(employee, tool_ids, expected_return):
+    # one transaction: one read of every tool, one conditional UPDATE claiming the
+    # available ones, one multi-row INSERT of their movements, one executemany
+    # pointing each tool at its movement. -> per-tool results in scan order
+    def work():
+        now = datetime.utcnow()
+        tools = {t.id: t for t in db.session.query(Tool.id, Tool.name, Tool.status).filter(Tool.id.in_(tool_ids))}
+        items, claim = {}, []
+        for tool_id in tool_ids:
+            tool = tools.get(tool_id)
+            if tool is None:
+                items[tool_id] = _failed(tool_id, "Outil inconnu")
+            elif tool.status != 'Disponible':
+                items[tool_id] = _failed(tool_id, f"Outil {tool.status.lower()}")
+            else:
+                claim.append(tool_id)
+        if not claim:
+            return [items[tool_id] for tool_id in tool_ids]
+
+        transition_all(Tool, claim, 'Disponible', status='Emprunté', last_checked_out=now,
+                       current_employee_id=employee.id)
+        db.session.execute(insert(Movement), [
+            {"tool_id": tool_id, "employee_id": employee.id, "date_emprunt": now,
+             "expected_return": expected_return, "status": 'Checked Out'}
+            for tool_id in claim
+        ])
+        # the claimed tools had no open loan: the one per tool now is ours
+        movements = dict(
+            db.session.query(Movement.tool_id, func.max(Movement.id))
+            .filter(Movement.tool_id.in_(claim), Movement.status == 'Checked Out')
+            .group_by(Movement.tool_id)
+        )
+        db.session.execute(update(Tool), [
+            {"id": tool_id, "current_movement_id": movement_id} for tool_id, movement_id in movements.items()
+        ])
+        _queue_overdue(("loan", movement_id, expected_return) for movement_id in movements.values())
+        for tool_id in claim:
+            items[tool_id] = {"tool_id": tool_id, "success": True, "movement_id": movements[tool_id]}
+            emit("borrow", tool_id=tool_id, tool_name=tools[tool_id].name, employee_id=employee.id,
+                 employee_name=employee.name, expected_return=expected_return.strftime('%Y-%m-%d'))
+        return [items[tool_id] for tool_id in tool_ids]
+
+    return _run_batch(work)
+
+
+def return_batch(tool_ids, employee=None, status='Disponible'):
+    # one transaction: one read of every tool with its current loan, one
+    # conditional UPDATE closing the open ones, one UPDATE of their tools.
+    # With an employee, only the loans they hold are closed
+    def work():
+        now = datetime.utcnow()
+        rows = {
+            r.tool_id: r for r in db.session.query(
+                Tool.id.label("tool_id"), Tool.name.label("tool_name"), Movement.id.label("movement_id"),
+                Movement.status.label("movement_status"), Movement.employee_id, Employee.name.label("holder"),
+            )
+            .outerjoin(Movement, Movement.id == Tool.current_movement_id)
+            .outerjoin(Employee, Employee.id == Movement.employee_id)
+            .filter(Tool.id.in_(tool_ids))
+        }
+        items, loans = {}, {}
+        for tool_id in tool_ids:
+            row = rows.get(tool_id)
+            if row is None:
+                items[tool_id] = _failed(tool_id, "Outil inconnu")
+            elif row.movement_status != 'Checked Out':
+                items[tool_id] = _failed(tool_id, "Outil pas emprunté")
+            elif employee is not None and row.employee_id != employee.id:
+                items[tool_id] = _failed(tool_id, f"Emprunté par {row.holder or 'un autre employé'}")
+            else:
+                loans[tool_id] = row.movement_id
+        if not loans:
+            return [items[tool_id] for tool_id in tool_ids]
+
+        transition_all(Movement, list(loans.values()), 'Checked Out', status='Returned', return_date=now)
+        db.session.execute(
+            update(Tool).where(Tool.id.in_(loans))
+            .values(status=status, last_checked_out=None, current_employee_id=None),
+            execution_options={"synchronize_session": False},
+        )
+        _queue_overdue(("loan", movement_id, None) for movement_id in loans.values())
+        for tool_id, movement_id in loans.items():
+            items[tool_id] = {"tool_id": tool_id, "success": True, "movement_id": movement_id}
+            emit("return", tool_id=tool_id, tool_name=rows[tool_id].tool_name, movement_id=movement_id, status=status)
+        return [items[tool_id] for tool_id in tool_ids]
+
+    return _run_batch(work)
@@ -0,0 +1,101 @@
+from sqlalchemy import bindparam, func
+from .models import Tool, Movement, db
+
+BATCH_SIZE = 1000
+
+
+def rebuild_current_movements(batch_size=BATCH_SIZE):
+    # recompute tools.current_movement_id / current_employee_id from history.
+    # ROW_NUMBER() over (tool_id ORDER BY date_emprunt DESC, id DESC) picks the
+    # same movement the after_insert listener keeps
+    ranked = (
+        db.session.query(
+            Movement.tool_id,
+            Movement.id,
+            Movement.employee_id,
+            Movement.status,
+            func.row_number().over(
+                partition_by=Movement.tool_id,
+                order_by=(Movement.date_emprunt.desc(), Movement.id.desc())
+            ).label("rn")
+        )
+        .subquery()
+    )
+    latest = (
+        db.session.query(ranked.c.tool_id, ranked.c.id, ranked.c.employee_id, ranked.c.status)
+        .filter(ranked.c.rn == 1)
+        .all()
+    )
+
+    tools = Tool.__table__
+    update = (
+        tools.update()
+        .where(tools.c.id == bindparam("b_tool_id"))
+        .values(current_movement_id=bindparam("b_movement_id"),
+                current_employee_id=bindparam("b_employee_id"))
+    )
+
+    db.session.execute(tools.update().values(current_movement_id=None, current_employee_id=None))
+    for i in range(0, len(latest), batch_size):
+        db.session.execute(update, [
+            {
+                "b_tool_id": tool_id,
+                "b_movement_id": movement_id,
+                "b_employee_id": employee_id if status == "Checked Out" else None,
+            }
+            for tool_id, movement_id, employee_id, status in latest[i:i + batch_size]
+        ])
+    db.session.commit()
+    return len(latest)
+
+
+def sync_tool_status(tool_ids, batch_size=BATCH_SIZE):
+    # bring tools.status / last_checked_out in line with each tool's latest
+    # movement, the way the Movement listeners do for a single checkout or
+    # return. Does not commit: callers run it in the transaction that wrote
+    # the movements
+    tool_ids = list(tool_ids)
+    tools = Tool.__table__
+    for i in range(0, len(tool_ids), batch_size):
+        ranked = (
+            db.session.query(
+                Movement.tool_id,
+                Movement.date_emprunt,
+                Movement.status,
+                func.row_number().over(
+                    partition_by=Movement.tool_id,
+                    order_by=(Movement.date_emprunt.desc(), Movement.id.desc())
+                ).label("rn")
+            )
+            .filter(Movement.tool_id.in_(tool_ids[i:i + batch_size]))
+            .subquery()
+        )
+        latest = (
+            db.session.query(ranked.c.tool_id, ranked.c.date_emprunt, ranked.c.status)
+            .filter(ranked.c.rn == 1)
+            .all()
+        )
+        out = [{"b_tool_id": t, "b_date": d} for t, d, status in latest if status == "Checked Out"]
+        repair = [{"b_tool_id": t} for t, _, status in latest if status == "En réparation"]
+        returned = [{"b_tool_id": t} for t, _, status in latest if status == "Returned"]
+        if out:
+            db.session.execute(
+                tools.update().where(tools.c.id == bindparam("b_tool_id"))
+                .values(status="Emprunté", last_checked_out=bindparam("b_date")),
+                out
+            )
+        if repair:
+            db.session.execute(
+                tools.update().where(tools.c.id == bindparam("b_tool_id"))
+                .values(status="En réparation"),
+                repair
+            )
+        if returned:
+            # only a tool the history had out comes back; a Cassé one stays Cassé
+            db.session.execute(
+                tools.update()
+                .where(tools.c.id == bindparam("b_tool_id"),
+                       tools.c.status.in_(("Emprunté", "En réparation")))
+                .values(status="Disponible", last_checked_out=None),
+                returned
+            )
@@ -0,0 +1,69 @@
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from .models import Employee, Tool, db
+
+
+def endpoints():
+    # the pages and API calls a warehouse clerk's browser makes all day
+    tool = db.session.query(Tool.id, Tool.name).order_by(Tool.date_ajout.desc()).first()
+    employee = db.session.query(Employee.id).first()
+    word = tool.name.split()[0] if tool else "a"
+    paths = [
+        "/dashboard",
+        "/api/stats",
+        "/api/tools",
+        "/api/tools?status=Emprunté",
+        "/api/movements",
+        "/api/movements?status=Checked%20Out",
+        "/api/overdue",
+        f"/find-tools?q={urllib.request.quote(word)}",
+        "/find-employees?q=a",
+    ]
+    if employee:
+        paths.append(f"/api/tools?employee_id={employee.id}")
+    return paths
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+def run(app, paths, requests_per_path=50, concurrency=4, base_url=None):
+    # ({path: (latencies in ms, error count)}, requests per second); against a
+    # running server when base_url is given, through the app's test client otherwise
+    if base_url:
+        def fetch(path):
+            try:
+                with urllib.request.urlopen(base_url.rstrip("/") + path) as resp:
+                    resp.read()
+                    return resp.status < 400
+            except urllib.error.URLError:
+                return False
+    else:
+        client = app.test_client()
+
+        def fetch(path):
+            resp = client.get(path)
+            resp.get_data()
+            return resp.status_code < 400
+
+    def timed(path):
+        start = time.perf_counter()
+        ok = fetch(path)
+        return path, (time.perf_counter() - start) * 1000, ok
+
+    jobs = [p for p in paths for _ in range(requests_per_path)]
+    results = {p: ([], 0) for p in paths}
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for path, ms, ok in pool.map(timed, jobs):
+            latencies, errors = results[path]
+            latencies.append(ms)
+            results[path] = (latencies, errors + (not ok))
+    elapsed = time.perf_counter() - start
+    return {p: (sorted(lat), err) for p, (lat, err) in results.items()}, len(jobs) / elapsed
@@ -0,0 +1,258 @@
+import glob
+import hmac
+import json
+import os
+import threading
+import time
+from flask import Response, abort, current_app, g, has_request_context, request
+from sqlalchemy.pool import QueuePool
+from .models import db
+
+# request latency buckets in seconds (Prometheus convention)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# waiting for a pooled connection should be ~0; anything in the upper buckets means
+# the pool is too small for the traffic
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+BUCKETS = {
+    "magasin_http_request_duration_seconds": LATENCY_BUCKETS,
+    "magasin_db_pool_wait_seconds": POOL_WAIT_BUCKETS,
+}
+
+HELP = {
+    "magasin_http_requests_total": ("counter", "Requests by endpoint, method and status."),
+    "magasin_http_request_errors_total": ("counter", "Requests answered with a 5xx status, by endpoint."),
+    "magasin_http_request_duration_seconds": ("histogram", "Request latency by endpoint."),
+    "magasin_db_pool_wait_seconds": ("histogram", "Time spent waiting for a pooled connection."),
+    "magasin_db_pool_size": ("gauge", "Configured connection pool size."),
+    "magasin_db_pool_checked_out": ("gauge", "Connections currently lent to requests."),
+    "magasin_db_pool_checked_in": ("gauge", "Idle connections kept in the pool."),
+    "magasin_db_pool_overflow": ("gauge", "Connections open beyond the pool size."),
+    "magasin_workers": ("gauge", "Worker processes reporting metrics."),
+}
+
+
+class Registry:
+    # one lock, held for a dict update per request: contention stays in the
+    # microseconds even with many threads
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        with self.lock:
+            buckets = BUCKETS[name]
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = [0] * len(buckets) + [0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    h[i] += 1
+                    break
+            h[-2] += value
+            h[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "counters": [[n, list(l), v] for (n, l), v in self.counters.items()],
+                "histograms": [[n, list(l), list(h)] for (n, l), h in self.histograms.items()],
+            }
+
+
+registry = Registry()
+
+
+def _pool_gauges():
+    pool = db.engine.pool
+    gauges = {}
+    for name, attr in (("magasin_db_pool_size", "size"), ("magasin_db_pool_checked_out", "checkedout"),
+                       ("magasin_db_pool_checked_in", "checkedin"), ("magasin_db_pool_overflow", "overflow")):
+        if hasattr(pool, attr):
+            gauges[name] = max(getattr(pool, attr)(), 0)
+    return gauges
+
+
+class TimedQueuePool(QueuePool):
+    # QueuePool that records how long each checkout waited for a connection
+    # (including opening a new one), the number to size DB_POOL_SIZE / DB_MAX_OVERFLOW from
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            registry.observe("magasin_db_pool_wait_seconds", (), waited)
+            if has_request_context():
+                g.pool_wait = g.get("pool_wait", 0.0) + waited
+
+
+# ---- request hooks ---------------------------------------------------------
+def _start_timer():
+    g.metrics_start = time.perf_counter()
+
+
+def _record(response):
+    start = g.pop("metrics_start", None)
+    if start is None:
+        return response
+    endpoint = request.endpoint or "unmatched"
+    registry.inc("magasin_http_requests_total", (endpoint, request.method, str(response.status_code)))
+    if response.status_code >= 500:
+        registry.inc("magasin_http_request_errors_total", (endpoint,))
+    registry.observe("magasin_http_request_duration_seconds", (endpoint,), time.perf_counter() - start)
+    _maybe_flush()
+    return response
+
+
+# ---- multi-process (Gunicorn) ------------------------------------------------
+# every worker dumps its own registry to METRICS_MULTIPROC_DIR/<pid>.json every
+# METRICS_FLUSH_INTERVAL seconds; whichever worker serves /metrics sums the files.
+# Counters of workers that exited are kept, their pool gauges are not
+
+_last_flush = [0.0]
+
+
+def _snapshot_path(directory, pid):
+    return os.path.join(directory, f"metrics_{pid}.json")
+
+
+def flush():
+    directory = current_app.config.get("METRICS_MULTIPROC_DIR")
+    if not directory:
+        return
+    data = registry.snapshot()
+    data["gauges"] = _pool_gauges()
+    path = _snapshot_path(directory, os.getpid())
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+    _last_flush[0] = time.monotonic()
+
+
+def _maybe_flush():
+    if not current_app.config.get("METRICS_MULTIPROC_DIR"):
+        return
+    if time.monotonic() - _last_flush[0] >= current_app.config.get("METRICS_FLUSH_INTERVAL", 5):
+        flush()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _collect():
+    # (counters, histograms, gauges) summed over every worker
+    directory = current_app.config.get("METRICS_MULTIPROC_DIR")
+    if not directory:
+        snap = registry.snapshot()
+        snaps = [(os.getpid(), {**snap, "gauges": _pool_gauges()})]
+    else:
+        flush()
+        snaps = []
+        for path in glob.glob(os.path.join(directory, "metrics_*.json")):
+            try:
+                with open(path) as f:
+                    snaps.append((int(os.path.basename(path)[8:-5]), json.load(f)))
+            except (OSError, ValueError):
+                continue
+
+    counters, histograms, gauges = {}, {}, {}
+    workers = 0
+    for pid, snap in snaps:
+        for name, labels, value in snap["counters"]:
+            key = (name, tuple(labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, h in snap["histograms"]:
+            key = (name, tuple(labels))
+            total = histograms.setdefault(key, [0] * len(h))
+            for i, v in enumerate(h):
+                total[i] += v
+        if pid == os.getpid() or _alive(pid):
+            workers += 1
+            for name, value in snap.get("gauges", {}).items():
+                gauges[name] = gauges.get(name, 0) + value
+    gauges["magasin_workers"] = workers
+    return counters, histograms, gauges
+
+
+# ---- exposition --------------------------------------------------------------
+LABEL_NAMES = {
+    "magasin_http_requests_total": ("endpoint", "method", "status"),
+    "magasin_http_request_errors_total": ("endpoint",),
+    "magasin_http_request_duration_seconds": ("endpoint",),
+}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(name, values, extra=None):
+    pairs = list(zip(LABEL_NAMES.get(name, ()), values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    counters, histograms, gauges = _collect()
+    lines = []
+    for name, (kind, text) in HELP.items():
+        lines.append(f"# HELP {name} {text}")
+        lines.append(f"# TYPE {name} {kind}")
+        if kind == "counter":
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{name}{_labels(name, labels)} {_number(value)}")
+        elif kind == "histogram":
+            for (n, labels), h in sorted(histograms.items()):
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS[name], h):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(name, labels, ('le', bound))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(name, labels, ('le', '+Inf'))} {h[-1]}")
+                lines.append(f"{name}_sum{_labels(name, labels)} {_number(h[-2])}")
+                lines.append(f"{name}_count{_labels(name, labels)} {h[-1]}")
+        elif name in gauges:
+            lines.append(f"{name} {_number(gauges[name])}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view():
+    token = current_app.config.get("METRICS_TOKEN")
+    if token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        abort(401)
+    return Response(render(), mimetype="text/plain; version=0.0.4")
+
+
+def init_metrics(app):
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+    directory = app.config.get("METRICS_MULTIPROC_DIR")
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    app.before_request(_start_timer)
+    app.after_request(_record)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
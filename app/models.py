@@ -16,6 +16,10 @@ class Users(db.Model):
 
 class Employee(db.Model):
     __tablename__ = "employees"
+    __table_args__ = (
+        # MySQL only: serves the "fulltext" search backend (see search.py)
+        db.Index("ft_employees_name", "name", mysql_prefix="FULLTEXT", mysql_with_parser="ngram").ddl_if(dialect="mysql"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     department = db.Column(db.String(50))
@@ -33,6 +37,18 @@ class Category(db.Model):
 
 class Tool(db.Model):
     __tablename__ = "tools"
+    __table_args__ = (
+        # MySQL only: serves the "fulltext" search backend (see search.py)
+        db.Index("ft_tools_name", "name", mysql_prefix="FULLTEXT", mysql_with_parser="ngram").ddl_if(dialect="mysql"),
+        # GROUP BY status + date_ajout growth in stats.py, covered by the index
+        db.Index("ix_tools_status_date_ajout", "status", "date_ajout"),
+        # /api/tools keyset order (date_ajout DESC, id DESC) and recent tools
+        db.Index("ix_tools_date_ajout", "date_ajout"),
+        # /api/tools?sort=name keyset order (name, id)
+        db.Index("ix_tools_name_id", "name", "id"),
+        # /api/tools?employee_id=
+        db.Index("ix_tools_current_employee_id", "current_employee_id"),
+    )
     id = db.Column(db.String(100), primary_key=True)
     name = db.Column(db.String(100), nullable=False)
 
@@ -54,6 +70,18 @@ class Tool(db.Model):
     status = db.Column(db.String(20), default='Disponible')#status = random.choice(['Disponible', 'En réparation', 'Cassé','Emprunté'])
     photo = db.Column(db.String(200))
 
+    # materialized by the Movement listeners in views.py: the tool's latest movement
+    # and, while that movement is checked out, who holds it.
+    # No FK on current_movement_id so tools <-> movements keep a single join path.
+    current_movement_id = db.Column(db.Integer, nullable=True)
+    current_employee_id = db.Column(db.Integer, db.ForeignKey('employees.id'), nullable=True)
+    current_movement = db.relationship(
+        'Movement',
+        primaryjoin='foreign(Tool.current_movement_id) == Movement.id',
+        viewonly=True
+    )
+    current_employee = db.relationship('Employee', foreign_keys=[current_employee_id], viewonly=True)
+
     movements = db.relationship('Movement', back_populates='tool')
 
     def __repr__(self):
@@ -61,6 +89,19 @@ class Tool(db.Model):
 
 class Movement(db.Model):
     __tablename__ = "movements"
+    __table_args__ = (
+        # overdue: status = 'Checked Out' AND expected_return < now ORDER BY expected_return
+        db.Index("ix_movements_status_expected_return", "status", "expected_return"),
+        # /tools and filtered /api/movements: status = ? ORDER BY date_emprunt
+        db.Index("ix_movements_status_date_emprunt", "status", "date_emprunt"),
+        # latest movement per tool (loaders.py): PARTITION BY tool_id ORDER BY date_emprunt DESC,
+        # read backwards; also covers the tool_id foreign key
+        db.Index("ix_movements_tool_id_date_emprunt", "tool_id", "date_emprunt"),
+        # unfiltered /api/movements and recent borrows: ORDER BY date_emprunt DESC
+        db.Index("ix_movements_date_emprunt", "date_emprunt"),
+        # /api/tools?employee_id=: employee_id = ? AND status = 'Checked Out'
+        db.Index("ix_movements_employee_id_status", "employee_id", "status"),
+    )
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
 
     tool_id = db.Column(db.String(100), db.ForeignKey('tools.id'), nullable=False)
@@ -78,3 +119,22 @@ class Movement(db.Model):
 
     status = db.Column(db.String(20), default='Checked Out')  
     #  "Checked Out", "Returned" 
+
+
+class TableVersion(db.Model):
+    # bumped right after every committed write to the table (see httpcache.py);
+    # drives the ETag / Last-Modified of the JSON APIs, shared by all workers
+    __tablename__ = "table_versions"
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class SearchChange(db.Model):
+    # one row per tool/employee whose id or name changed, written in the same
+    # transaction; every worker replays the new rows into its trigram index (search.py)
+    __tablename__ = "search_changes"
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    kind = db.Column(db.String(10), nullable=False)
+    key = db.Column(db.String(100), nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
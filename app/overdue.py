@@ -0,0 +1,255 @@
+import bisect
+import threading
+import time
+from datetime import datetime
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+from .models import Employee, Movement, TableVersion, Tool, db
+from .pagination import InvalidCursor, decode_cursor, encode_cursor
+from .serializers import OVERDUE
+
+# at most this many newly overdue loans per "overdue" event
+ALERT_BATCH = 50
+# a rebuild is only needed when one of these changed (see httpcache.py)
+SOURCE_TABLES = ("employees", "movements", "tools")
+
+
+def _row_query():
+    # everything an overdue item shows, as plain columns in the OVERDUE projection's order
+    return OVERDUE.apply(db.session.query(Movement).join(Movement.tool).outerjoin(Movement.employee))
+
+
+class OverdueIndex:
+    # open loans (status 'Checked Out') sorted by (expected_return, movement id):
+    # the overdue ones at any instant are a prefix found with one bisect, and each
+    # entry carries its display row so a page costs no query. Kept current from
+    # committed events in this process; other workers' writes and Core updates
+    # (import, reconcile) arrive with the rebuild, at most max_age seconds later
+    def __init__(self, max_age=60):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._keys = []
+        self._rows = {}
+        self._built_at = None
+        self._versions = None
+
+    def rebuild(self):
+        versions = _versions()
+        rows = _row_query().filter(Movement.status == 'Checked Out', Movement.expected_return.isnot(None)).all()
+        with self._lock:
+            self._rows = {row[0]: tuple(row) for row in rows}
+            self._keys = sorted((row[7], row[0]) for row in self._rows.values())
+            self._built_at = time.monotonic()
+            self._versions = versions
+
+    def stale(self):
+        return self._built_at is None or time.monotonic() - self._built_at > self.max_age
+
+    def refresh(self):
+        # rebuild only if someone wrote since the last one; otherwise restart the clock
+        if self._built_at is not None and _versions() == self._versions:
+            self._built_at = time.monotonic()
+        else:
+            self.rebuild()
+
+    def _ensure_fresh(self):
+        # normally the scanner thread keeps this fresh; this covers a disabled or late scanner
+        if self.stale():
+            self.refresh()
+
+    def _remove(self, movement_id):
+        row = self._rows.pop(movement_id, None)
+        if row is not None:
+            i = bisect.bisect_left(self._keys, (row[7], movement_id))
+            if i < len(self._keys) and self._keys[i] == (row[7], movement_id):
+                del self._keys[i]
+
+    def apply(self, changes):
+        # ("loan", movement id, expected_return or None) and ("tool"/"employee", id, None)
+        with self._lock:
+            if self._built_at is None:
+                return
+            for kind, key, due in changes:
+                if kind == "loan":
+                    self._remove(key)
+                    if due is not None:
+                        # display row filled in by the next read
+                        self._rows[key] = (key, None, None, None, None, None, None, due)
+                        bisect.insort(self._keys, (due, key))
+                else:
+                    # renamed tool/employee or new photo: reload the loans that show it
+                    column = 1 if kind == "tool" else 4
+                    for movement_id, row in self._rows.items():
+                        if row[column] == key:
+                            self._rows[movement_id] = (movement_id, None, None, None, None, None, None, row[7])
+
+    def _load(self, keys):
+        # rows for a slice of keys; the few added since the rebuild cost one query
+        missing = [movement_id for _, movement_id in keys if self._rows.get(movement_id, (None, None))[1] is None]
+        if missing:
+            found = {row[0]: tuple(row) for row in _row_query().filter(Movement.id.in_(missing))}
+            with self._lock:
+                for movement_id in missing:
+                    if movement_id in found and movement_id in self._rows:
+                        self._rows[movement_id] = found[movement_id]
+        return [self._rows[movement_id] for _, movement_id in keys if movement_id in self._rows]
+
+    def page(self, now, cursor=None, limit=50):
+        # ([rows], next cursor) in (expected_return, id) order, same cursor
+        # format as keyset_page so clients can't tell the difference
+        self._ensure_fresh()
+        with self._lock:
+            end = bisect.bisect_left(self._keys, (now,))
+            start = 0
+            if cursor:
+                try:
+                    start = bisect.bisect_right(self._keys, decode_cursor(cursor))
+                except TypeError:
+                    raise InvalidCursor(f"invalid cursor: {cursor!r}")
+            keys = self._keys[start:min(end, start + limit)]
+            more = start + limit < end
+        next_cursor = encode_cursor(*keys[-1]) if keys and more else None
+        return self._load(keys), next_cursor
+
+    def count(self, now):
+        self._ensure_fresh()
+        with self._lock:
+            return bisect.bisect_left(self._keys, (now,))
+
+    def overdue(self, now):
+        self._ensure_fresh()
+        with self._lock:
+            keys = self._keys[:bisect.bisect_left(self._keys, (now,))]
+        return self._load(keys)
+
+    def between(self, start, end):
+        # rows that became overdue in [start, end)
+        with self._lock:
+            keys = self._keys[bisect.bisect_left(self._keys, (start,)):bisect.bisect_left(self._keys, (end,))]
+        return self._load(keys)
+
+
+def _versions():
+    return dict(
+        db.session.query(TableVersion.name, TableVersion.version).filter(TableVersion.name.in_(SOURCE_TABLES))
+    )
+
+
+def get_overdue_index():
+    return current_app.extensions.get("overdue_index")
+
+
+def overdue_rows(now):
+    # every overdue loan as a row tuple, oldest first
+    index = get_overdue_index()
+    if index is not None:
+        return index.overdue(now)
+    return (
+        _row_query()
+        .filter(Movement.status == 'Checked Out', Movement.expected_return < now)
+        .order_by(Movement.expected_return, Movement.id)
+        .all()
+    )
+
+
+# ---- incremental updates ---------------------------------------------------
+def _queue(target, change):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("overdue_changes", []).append(change)
+
+
+def _record_loan(mapper, connection, target):
+    open_loan = target.status == 'Checked Out' and target.expected_return is not None
+    _queue(target, ("loan", target.id, target.expected_return if open_loan else None))
+
+
+def _record_closed(mapper, connection, target):
+    _queue(target, ("loan", target.id, None))
+
+
+def _record_display(kind, fields):
+    # only a new name or photo changes what an overdue item shows
+    def listener(mapper, connection, target):
+        state = inspect(target)
+        if any(state.attrs[field].history.has_changes() for field in fields):
+            _queue(target, (kind, target.id, None))
+    return listener
+
+
+event.listen(Movement, "after_insert", _record_loan)
+event.listen(Movement, "after_update", _record_loan)
+event.listen(Movement, "after_delete", _record_closed)
+event.listen(Tool, "after_update", _record_display("tool", ("name", "photo")))
+event.listen(Employee, "after_update", _record_display("employee", ("name",)))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_overdue_changes(session):
+    changes = session.info.pop("overdue_changes", None)
+    if not changes or not has_app_context():
+        return
+    index = current_app.extensions.get("overdue_index")
+    if index is not None:
+        index.apply(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_overdue_changes(session):
+    session.info.pop("overdue_changes", None)
+
+
+# ---- background scanner ----------------------------------------------------
+# one daemon thread per process, started by the first request (not at import,
+# so a preloading server forks before it exists). It keeps the index fresh off
+# the request path and pushes an "overdue" event to this process's /api/events
+# streams when loans pass their expected return date
+def _alert(app, index, since, now):
+    broker = app.extensions.get("events")
+    rows = index.between(since, now)
+    if broker is None or not rows:
+        return
+    for i in range(0, len(rows), ALERT_BATCH):
+        # deliver, not publish: every worker runs its own scanner
+        broker.deliver("overdue", {"items": OVERDUE.items(rows[i:i + ALERT_BATCH], now)})
+
+
+def _scan(app, index):
+    interval = app.config.get("OVERDUE_SCAN_INTERVAL", 30)
+    since = datetime.utcnow()
+    while True:
+        time.sleep(interval)
+        try:
+            with app.app_context():
+                index.refresh()
+                now = datetime.utcnow()
+                _alert(app, index, since, now)
+                since = now
+                db.session.remove()
+        except Exception:
+            app.logger.exception("overdue scan failed")
+
+
+def _start_scanner():
+    app = current_app._get_current_object()
+    state = app.extensions["overdue_scanner"]
+    if state["thread"] is not None:
+        return
+    with state["lock"]:
+        if state["thread"] is None:
+            state["thread"] = threading.Thread(
+                target=_scan, args=(app, app.extensions["overdue_index"]), name="overdue-scanner", daemon=True
+            )
+            state["thread"].start()
+
+
+def init_overdue(app):
+    if not app.config.get("OVERDUE_INDEX", True):
+        return None
+    index = OverdueIndex(max_age=app.config.get("OVERDUE_INDEX_MAX_AGE", 60))
+    app.extensions["overdue_index"] = index
+    if app.config.get("OVERDUE_SCAN_INTERVAL", 30) > 0:
+        app.extensions["overdue_scanner"] = {"thread": None, "lock": threading.Lock()}
+        app.before_request(_start_scanner)
+    return index
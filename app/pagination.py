@@ -0,0 +1,117 @@
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import DateTime, and_, or_, text
+from .models import db
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_CACHED_COUNTS = 1024
+
+_count_cache = {}
+_count_lock = threading.Lock()
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def encode_cursor(sort_value, row_id):
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, row_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token, datetimes=True):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        sort_value, row_id = json.loads(raw)
+        if sort_value is not None and datetimes:
+            sort_value = datetime.fromisoformat(sort_value)
+    except (ValueError, TypeError):
+        raise InvalidCursor(f"invalid cursor: {token!r}")
+    return sort_value, row_id
+
+
+def _seek(sort_col, id_col, sort_value, row_id, descending):
+    # rows after (sort_value, row_id) in the ORDER BY below. MySQL and SQLite sort
+    # NULL below every value: last when descending, first when ascending. A NULL
+    # never matches < > =, so a nullable column gets its own IS NULL branches
+    nullable = getattr(getattr(sort_col, "expression", sort_col), "nullable", True)
+    if sort_value is None:
+        if descending:
+            return and_(sort_col.is_(None), id_col < row_id)
+        return or_(and_(sort_col.is_(None), id_col > row_id), sort_col.isnot(None))
+    if descending:
+        seek = or_(sort_col < sort_value, and_(sort_col == sort_value, id_col < row_id))
+        return or_(seek, sort_col.is_(None)) if nullable else seek
+    return or_(sort_col > sort_value, and_(sort_col == sort_value, id_col > row_id))
+
+
+def keyset_page(query, sort_col, id_col, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=True):
+    # seek on (sort_col, id_col) instead of OFFSET so page N costs the same as page 1
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor, isinstance(sort_col.type, DateTime))
+        query = query.filter(_seek(sort_col, id_col, sort_value, row_id, descending))
+
+    if descending:
+        query = query.order_by(sort_col.desc(), id_col.desc())
+    else:
+        query = query.order_by(sort_col.asc(), id_col.asc())
+
+    # one extra row tells us whether there is a next page without a COUNT
+    rows = query.limit(limit + 1).all()
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, sort_col.key), getattr(last, id_col.key))
+    return items, next_cursor
+
+
+def _table_estimate(table_name):
+    # InnoDB keeps a row estimate for every table; good enough for unfiltered totals
+    return db.session.execute(
+        text("SELECT TABLE_ROWS FROM information_schema.TABLES "
+             "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :name"),
+        {"name": table_name}
+    ).scalar()
+
+
+def approximate_count(key, query, table_name=None):
+    # totals are cached for COUNT_CACHE_TTL seconds, so they can lag behind writes
+    ttl = current_app.config.get("COUNT_CACHE_TTL", 0)
+    now = time.monotonic()
+    with _count_lock:
+        hit = _count_cache.get(key)
+        if hit and now < hit[1]:
+            return hit[0]
+
+    total = None
+    if table_name and db.engine.dialect.name == "mysql":
+        total = _table_estimate(table_name)
+    if total is None:
+        total = query.order_by(None).count()
+
+    with _count_lock:
+        if len(_count_cache) >= MAX_CACHED_COUNTS:
+            _count_cache.clear()
+        _count_cache[key] = (total, now + ttl)
+    return total
+
+
+def clear_counts():
+    with _count_lock:
+        _count_cache.clear()
@@ -0,0 +1,190 @@
+import hashlib
+import io
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import abort, current_app, jsonify, request, send_from_directory
+
+# square box (pixels) per thumbnail size; the aspect ratio is kept.
+# sm: 40px list rows on a 2x screen, md: the 112-128px cards
+THUMBNAIL_SIZES = {"sm": 96, "md": 256}
+THUMBNAIL_FORMATS = {"jpg": ("JPEG", {"quality": 80, "optimize": True, "progressive": True}),
+                     "webp": ("WEBP", {"quality": 75, "method": 4})}
+PHOTO_URL = "/photos/"
+# <sha256>.<ext> for an upload as sent, <sha256>-<size>.<jpg|webp> for a thumbnail
+PHOTO_NAME = re.compile(r"^([0-9a-f]{64})(?:-([a-z]+))?\.(jpg|png|gif|webp)$")
+# Pillow format -> extension of the stored original
+UPLOAD_FORMATS = {"JPEG": "jpg", "MPO": "jpg", "PNG": "png", "GIF": "gif", "WEBP": "webp"}
+ONE_YEAR = 365 * 24 * 3600
+
+
+class InvalidPhoto(ValueError):
+    pass
+
+
+def thumbnail_url(photo, size="sm", fmt="jpg"):
+    # the thumbnail of a stored photo. Tools still pointing at an outside URL keep
+    # it as is for jpg (nothing to resize) and have no webp variant
+    if photo and photo.startswith(PHOTO_URL):
+        match = PHOTO_NAME.match(photo[len(PHOTO_URL):])
+        if match and match.group(2) is None:
+            return f"{PHOTO_URL}{match.group(1)}-{size}.{fmt}"
+    if fmt == "webp":
+        return None
+    return photo or None
+
+
+def _pillow():
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        raise RuntimeError("photo uploads need Pillow (pip3 install Pillow)")
+    return Image, ImageOps
+
+
+def _path(directory, name):
+    # two-level fan-out so no directory ends up with every photo
+    return os.path.join(directory, name[:2], name)
+
+
+def _write(path, data):
+    # readers (other workers, the static server) never see a half-written file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _original(directory, digest):
+    for ext in set(UPLOAD_FORMATS.values()):
+        path = _path(directory, f"{digest}.{ext}")
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(digest)
+
+
+def make_thumbnail(directory, digest, size, fmt):
+    Image, ImageOps = _pillow()
+    box = THUMBNAIL_SIZES[size]
+    pil_format, options = THUMBNAIL_FORMATS[fmt]
+    with Image.open(_original(directory, digest)) as image:
+        # JPEG: decode straight at a reduced scale instead of full size
+        image.draft("RGB", (box, box))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((box, box))
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            if fmt == "jpg":
+                background = Image.new("RGB", image.size, "white")
+                background.paste(image, mask=image.getchannel("A"))
+                image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, pil_format, **options)
+    path = _path(directory, f"{digest}-{size}.{fmt}")
+    _write(path, buffer.getvalue())
+    return path
+
+
+def make_thumbnails(app, directory, digest):
+    # every size and format not on disk yet; runs in the pool
+    for size in THUMBNAIL_SIZES:
+        for fmt in THUMBNAIL_FORMATS:
+            if not os.path.exists(_path(directory, f"{digest}-{size}.{fmt}")):
+                try:
+                    make_thumbnail(directory, digest, size, fmt)
+                except Exception:
+                    app.logger.exception("thumbnail %s-%s.%s failed", digest, size, fmt)
+
+
+def _pool(app):
+    # created by the first upload, so a preloading server forks before it exists.
+    # Threads are enough: Pillow releases the GIL while decoding, resizing and encoding
+    state = app.extensions["photos"]
+    with state["lock"]:
+        if state["pool"] is None:
+            state["pool"] = ThreadPoolExecutor(app.config["PHOTO_WORKERS"], thread_name_prefix="thumbnails")
+    return state["pool"]
+
+
+def store_photo(data):
+    # -> the photo URL to put in Tool.photo. The name is the content hash, so the
+    # same picture uploaded for ten tools is stored (and resized) once
+    Image, _ = _pillow()
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image.verify()
+            pil_format = image.format
+    except Exception:
+        raise InvalidPhoto("The file is not an image")
+    if pil_format not in UPLOAD_FORMATS:
+        raise InvalidPhoto(f"Unsupported image format {pil_format}")
+
+    app = current_app._get_current_object()
+    directory = app.config["PHOTO_DIR"]
+    digest = hashlib.sha256(data).hexdigest()
+    name = f"{digest}.{UPLOAD_FORMATS[pil_format]}"
+    if not os.path.exists(_path(directory, name)):
+        _write(_path(directory, name), data)
+    _pool(app).submit(make_thumbnails, app, directory, digest)
+    return PHOTO_URL + name
+
+
+def read_upload(file):
+    # bytes of an uploaded file, refusing anything over PHOTO_MAX_BYTES
+    limit = current_app.config["PHOTO_MAX_BYTES"]
+    data = file.read(limit + 1)
+    if len(data) > limit:
+        raise InvalidPhoto(f"Photo larger than {limit // (1024 * 1024)} MB")
+    return data
+
+
+# ---- routes ----------------------------------------------------------------
+def serve_photo(name):
+    match = PHOTO_NAME.match(name)
+    if match is None:
+        abort(404)
+    digest, size, fmt = match.groups()
+    directory = current_app.config["PHOTO_DIR"]
+    if size is not None:
+        if size not in THUMBNAIL_SIZES or fmt not in THUMBNAIL_FORMATS:
+            abort(404)
+        if not os.path.exists(_path(directory, name)):
+            # asked for before the pool got to it: make this one now
+            try:
+                make_thumbnail(directory, digest, size, fmt)
+            except FileNotFoundError:
+                abort(404)
+    response = send_from_directory(os.path.join(directory, digest[:2]), name, max_age=ONE_YEAR)
+    # the URL changes whenever the content does: browsers and proxies never need to ask again
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def upload_photo():
+    file = request.files.get("photo")
+    if file is None or not file.filename:
+        return jsonify({"success": False, "message": "No photo uploaded"}), 400
+    try:
+        url = store_photo(read_upload(file))
+    except InvalidPhoto as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    except RuntimeError as e:
+        return jsonify({"success": False, "message": str(e)}), 501
+    return jsonify({
+        "success": True,
+        "photo": url,
+        "thumbnail": thumbnail_url(url, "md"),
+        "thumbnail_webp": thumbnail_url(url, "md", "webp"),
+    })
+
+
+def init_photos(app):
+    app.extensions["photos"] = {"pool": None, "lock": threading.Lock()}
+    app.add_url_rule(PHOTO_URL + "<name>", "photo", serve_photo)
+    app.add_url_rule("/api/photos", "upload_photo", upload_photo, methods=["POST"])
+    app.add_template_filter(thumbnail_url, "thumbnail")
@@ -0,0 +1,78 @@
+import random
+import time
+from flask import current_app, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+# cookie set after a write: the client reads from the primary until it expires
+STICKY_COOKIE = "db_primary_until"
+
+
+def replica_bind_keys(app):
+    return [key for key in app.config.get("SQLALCHEMY_BINDS", {}) if key and key.startswith("replica_")]
+
+
+class RoutingSession(Session):
+    # reads go to a replica only when the request opted in (read_only views) and
+    # nothing in this session has been written yet; everything else, including
+    # flushes and SELECT ... FOR UPDATE, stays on the primary
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or not self.info.get("replica") or self.info.get("wrote") or self._flushing:
+            return engine
+        if engine is not self._db.engines.get(None):
+            return engine
+        if clause is not None and getattr(clause, "_for_update_arg", None) is not None:
+            return engine
+        return self._db.engines[self.info["replica"]]
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_written(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(RoutingSession, "do_orm_execute")
+def _mark_bulk_write(orm_execute_state):
+    # Core/bulk INSERT, UPDATE and DELETE through the session skip the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+
+def read_only(view):
+    # views that only read may be served from a replica
+    view.read_only = True
+    return view
+
+
+def _choose_bind():
+    keys = replica_bind_keys(current_app)
+    if not keys or request.method not in ("GET", "HEAD"):
+        return
+    view = current_app.view_functions.get(request.endpoint)
+    if not getattr(view, "read_only", False):
+        return
+    # read-your-writes: this client wrote a moment ago, replicas may not have it yet
+    try:
+        if float(request.cookies.get(STICKY_COOKIE, 0)) > time.time():
+            return
+    except ValueError:
+        pass
+    from .models import db
+    db.session.info["replica"] = random.choice(keys)
+
+
+def _stick_after_write(response):
+    from .models import db
+    if db.session.info.get("wrote"):
+        seconds = current_app.config.get("REPLICA_STICKY_SECONDS", 5)
+        response.set_cookie(STICKY_COOKIE, f"{time.time() + seconds:.3f}", max_age=seconds, httponly=True,
+                            samesite="Lax")
+    return response
+
+
+def init_routing(app):
+    if not replica_bind_keys(app):
+        return
+    app.before_request(_choose_bind)
+    app.after_request(_stick_after_write)
@@ -0,0 +1,404 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy import String, cast, event, false, func, insert, inspect, or_, select
+from sqlalchemy.orm import Session, object_session
+from .httpcache import _queue, table_versions
+from .models import SearchChange, Tool, Employee, db
+
+# above this many matches a filter is unselective anyway; let the DB scan
+FILTER_MAX_IDS = 1000
+# digits of the largest integer id (signed INT)
+MAX_ID_DIGITS = 10
+# table_versions row bumped after a commit that logged search_changes (see httpcache.py)
+SEARCH_VERSION = "search"
+# a search_changes id still missing after this long was rolled back
+SETTLE_SECONDS = 600
+# search_changes rows are pruned after this long
+CHANGES_KEEP = timedelta(days=1)
+
+
+def _rank(q, key, name):
+    # lower is better: exact id, id prefix, name prefix, word prefix, substring
+    key, name = key.lower(), (name or "").lower()
+    if key == q:
+        bucket = 0
+    elif key.startswith(q):
+        bucket = 1
+    elif name.startswith(q):
+        bucket = 2
+    elif any(word.startswith(q) for word in name.split()):
+        bucket = 3
+    else:
+        bucket = 4
+    return (bucket, key, name) if bucket < 2 else (bucket, name, key)
+
+
+class _Kind:
+    def __init__(self, model, id_col, name_col):
+        self.model = model
+        self.id_col = id_col
+        self.name_col = name_col
+
+    @property
+    def id_text(self):
+        return cast(self.id_col, String) if self.model is Employee else self.id_col
+
+    def load_id(self, key):
+        return int(key) if self.model is Employee else key
+
+    def id_prefix(self, q):
+        # ids starting with q, in a form the primary key can range-scan: a LIKE
+        # on the string ids, for the integer ids one BETWEEN per extra digit
+        # (q "12": 12, 120-129, 1200-1299...) instead of a LIKE on CAST(id)
+        if self.model is not Employee:
+            prefix = q.replace("/", "//").replace("%", "/%").replace("_", "/_") + "%"
+            return self.id_col.like(prefix, escape="/")
+        if not q.isdigit() or (q[0] == "0" and q != "0"):
+            return false()
+        n = int(q)
+        return or_(*(
+            self.id_col.between(n * 10 ** extra, (n + 1) * 10 ** extra - 1)
+            for extra in range(MAX_ID_DIGITS - len(q) + 1)
+        ))
+
+    def like(self, q):
+        # the historical '%q%' filter
+        return or_(self.name_col.ilike(f"%{q}%"), self.id_text.ilike(f"%{q}%"))
+
+
+KINDS = {
+    "tool": _Kind(Tool, Tool.id, Tool.name),
+    "employee": _Kind(Employee, Employee.id, Employee.name),
+}
+
+
+def ranked(q, rows, limit):
+    # ids of (id, name) rows, best prefix matches first
+    rows = sorted(rows, key=lambda r: _rank(q, str(r[0]), r[1]))
+    return [r[0] for r in rows[:limit]]
+
+
+class LikeSearch:
+    # no index: plain leading-wildcard LIKE, as before
+    name = "like"
+
+    def candidates(self, kind, q, limit=20):
+        # SELECT id, name worth ranking; a plain statement so the async API can run it too
+        k = KINDS[kind]
+        return select(k.id_col, k.name_col).where(k.like(q))
+
+    def search(self, kind, q, limit=20):
+        ql = q.strip().lower()
+        return ranked(ql, db.session.execute(self.candidates(kind, ql, limit)).all(), limit)
+
+    def filter(self, kind, q):
+        return KINDS[kind].like(q.strip().lower())
+
+
+class FullTextSearch(LikeSearch):
+    # MySQL FULLTEXT ... WITH PARSER ngram on name, PK prefix range on id
+    name = "fulltext"
+    min_token = 2  # server default ngram_token_size
+
+    def _criterion(self, kind, q):
+        k = KINDS[kind]
+        by_id = k.id_prefix(q)
+        if len(q) < self.min_token:
+            # literal 'q%' pattern so the optimizer can range-scan the index
+            prefix = q.replace("/", "//").replace("%", "/%").replace("_", "/_") + "%"
+            return or_(by_id, k.name_col.like(prefix, escape="/"))
+        phrase = '"' + q.replace('"', " ") + '"'
+        return or_(by_id, k.name_col.match(phrase))
+
+    def candidates(self, kind, q, limit=20):
+        # over-fetch a little so prefix ranking can reorder the candidates
+        k = KINDS[kind]
+        return select(k.id_col, k.name_col).where(self._criterion(kind, q)).limit(limit * 5)
+
+    def filter(self, kind, q):
+        return self._criterion(kind, q.strip().lower())
+
+
+class TrigramSearch:
+    # in-process trigram postings. This process's commits are applied as they
+    # happen; every id/name change is also logged to search_changes, and a
+    # background thread replays the new rows every max_age seconds once the
+    # "search" table version moved, so other workers' renames arrive as a delta.
+    # Until the first build has finished, lookups go to the database (LikeSearch)
+    name = "trigram"
+
+    def __init__(self, max_age=2):
+        self.max_age = max_age
+        self.ready = False
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._postings = {}
+        self._fallback = LikeSearch()
+        self._version = None
+        # search_changes rows up to _floor are applied; missing ids above it
+        # (transaction still open when read) are retried for SETTLE_SECONDS
+        self._floor = 0
+        self._pending = {}
+
+    @staticmethod
+    def _grams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def _add(self, kind, key, name):
+        entry = (kind, key)
+        self._remove(kind, key)
+        self._entries[entry] = (key.lower(), (name or "").lower(), name)
+        for field in self._entries[entry][:2]:
+            for gram in self._grams(field):
+                self._postings.setdefault(gram, set()).add(entry)
+
+    def _remove(self, kind, key):
+        entry = (kind, key)
+        old = self._entries.pop(entry, None)
+        if old is None:
+            return
+        for field in old[:2]:
+            for gram in self._grams(field):
+                bucket = self._postings.get(gram)
+                if bucket is not None:
+                    bucket.discard(entry)
+                    if not bucket:
+                        del self._postings[gram]
+
+    def build(self):
+        # the one full load per process, in the background thread. Rows logged
+        # in the SETTLE_SECONDS before it are replayed after it, so a write still
+        # in flight now is not lost
+        start = datetime.utcnow()
+        version = _search_version()
+        floor = db.session.query(func.max(SearchChange.id)).filter(
+            SearchChange.created_at < start - timedelta(seconds=SETTLE_SECONDS)).scalar()
+        if floor is None:
+            floor = (db.session.query(func.min(SearchChange.id)).scalar() or 1) - 1
+        rows = [
+            (kind, str(key), name)
+            for kind, k in KINDS.items()
+            for key, name in db.session.query(k.id_col, k.name_col)
+        ]
+        with self._lock:
+            self._entries, self._postings = {}, {}
+            for kind, key, name in rows:
+                self._add(kind, key, name)
+            self._version, self._floor, self._pending = version, floor, {}
+            self.ready = True
+        # a worker that is up has long replayed these
+        db.session.query(SearchChange).filter(SearchChange.created_at < start - CHANGES_KEEP).delete(
+            synchronize_session=False)
+        db.session.commit()
+
+    def apply(self, changes):
+        with self._lock:
+            if not self.ready:
+                return
+            for op, kind, key, name in changes:
+                if op == "delete":
+                    self._remove(kind, key)
+                else:
+                    self._add(kind, key, name)
+
+    def refresh(self):
+        # -> changes replayed. One primary-key read of the "search" version when
+        # nobody added, renamed or deleted a tool or employee
+        if not self.ready:
+            self.build()
+            return 0
+        version = _search_version()
+        if version == self._version:
+            return 0
+        self._version = version
+        start = min(self._pending) - 1 if self._pending else self._floor
+        logged = db.session.query(SearchChange.id, SearchChange.kind, SearchChange.key).filter(
+            SearchChange.id > start).order_by(SearchChange.id).all()
+
+        now = time.monotonic()
+        seen = {row.id for row in logged}
+        fresh = [row for row in logged if row.id > self._floor or row.id in self._pending]
+        top = max(seen, default=self._floor)
+        for missing in range(self._floor + 1, top + 1):
+            if missing not in seen:
+                self._pending.setdefault(missing, now)
+        self._pending = {i: t for i, t in self._pending.items() if i not in seen and now - t < SETTLE_SECONDS}
+        self._floor = max(self._floor, top)
+
+        keys = {}
+        for row in fresh:
+            keys.setdefault(row.kind, set()).add(row.key)
+        changes = []
+        for kind, kind_keys in keys.items():
+            k = KINDS[kind]
+            kind_keys = sorted(kind_keys)
+            for i in range(0, len(kind_keys), FILTER_MAX_IDS):
+                chunk = kind_keys[i:i + FILTER_MAX_IDS]
+                names = {str(key): name for key, name in db.session.query(k.id_col, k.name_col)
+                         .filter(k.id_col.in_([k.load_id(key) for key in chunk]))}
+                changes += [
+                    ("upsert", kind, key, names[key]) if key in names else ("delete", kind, key, None)
+                    for key in chunk
+                ]
+        self.apply(changes)
+        return len(changes)
+
+    def _matches(self, kind, q):
+        with self._lock:
+            if len(q) >= 3:
+                postings = sorted((self._postings.get(g, set()) for g in self._grams(q)), key=len)
+                candidates = set.intersection(*postings)
+            else:
+                candidates = self._entries.keys()
+            # (key, lowered name) copied under the lock: a commit may drop the entry right after
+            found = []
+            for entry in candidates:
+                if entry[0] != kind:
+                    continue
+                key, name, _ = self._entries[entry]
+                if q in key or q in name:
+                    found.append((entry[1], name))
+            return found
+
+    def search(self, kind, q, limit=20):
+        if not self.ready:
+            return self._fallback.search(kind, q, limit)
+        ql = q.strip().lower()
+        found = sorted(self._matches(kind, ql), key=lambda m: _rank(ql, m[0], m[1]))
+        k = KINDS[kind]
+        return [k.load_id(key) for key, _ in found[:limit]]
+
+    def filter(self, kind, q):
+        if not self.ready:
+            return self._fallback.filter(kind, q)
+        k = KINDS[kind]
+        ql = q.strip().lower()
+        found = self._matches(kind, ql)
+        if len(found) > FILTER_MAX_IDS:
+            return k.like(ql)
+        return k.id_col.in_([k.load_id(key) for key, _ in found])
+
+
+BACKENDS = {
+    "like": LikeSearch,
+    "fulltext": FullTextSearch,
+    "trigram": TrigramSearch,
+}
+
+
+def init_search(app):
+    backend = app.config.get("SEARCH_BACKEND", "auto")
+    if backend == "auto":
+        backend = "fulltext" if app.config["SQLALCHEMY_DATABASE_URI"].startswith("mysql") else "trigram"
+    if backend == "trigram":
+        index = TrigramSearch(max_age=app.config.get("SEARCH_INDEX_MAX_AGE", 2))
+        if index.max_age > 0:
+            app.extensions["search_refresher"] = {"thread": None, "lock": threading.Lock()}
+            app.before_request(_start_refresher)
+    else:
+        index = BACKENDS[backend]()
+    app.extensions["search_index"] = index
+    return index
+
+
+def get_search():
+    return current_app.extensions["search_index"]
+
+
+def _search_version():
+    return table_versions((SEARCH_VERSION,)).get(SEARCH_VERSION)
+
+
+# ---- background refresher for the trigram backend ---------------------------
+# one daemon thread per process, started by the first request (or asgi.py's
+# startup), never at import: a preloading server forks before it exists
+def _refresh(app, index):
+    while True:
+        try:
+            with app.app_context():
+                try:
+                    index.refresh()
+                finally:
+                    db.session.remove()
+        except Exception:
+            app.logger.exception("search index refresh failed")
+        time.sleep(index.max_age)
+
+
+def start_refresher(app):
+    state = app.extensions.get("search_refresher")
+    if state is None or state["thread"] is not None:
+        return
+    with state["lock"]:
+        if state["thread"] is None:
+            state["thread"] = threading.Thread(
+                target=_refresh, args=(app, app.extensions["search_index"]), name="search-refresher", daemon=True
+            )
+            state["thread"].start()
+
+
+def _start_refresher():
+    start_refresher(current_app._get_current_object())
+
+
+# ---- change log for the trigram backend -------------------------------------
+def _tracking():
+    return has_app_context() and isinstance(current_app.extensions.get("search_index"), TrigramSearch)
+
+
+def _log(connection, session, kind, keys):
+    # in the writing transaction; the "search" version is bumped after the commit
+    now = datetime.utcnow()
+    connection.execute(insert(SearchChange.__table__), [
+        {"kind": kind, "key": str(key), "created_at": now} for key in keys
+    ])
+    _queue(session, {SEARCH_VERSION})
+
+
+def log_bulk_changes(kind, rows):
+    # for Core writers (the importer), which fire no mapper events: (key, name) pairs
+    if not rows or not _tracking():
+        return
+    db.session.info.setdefault("search_changes", []).extend(("upsert", kind, str(key), name) for key, name in rows)
+    _log(db.session.connection(), db.session, kind, [key for key, _ in rows])
+
+
+def _record(op):
+    def listener(mapper, connection, target):
+        session = object_session(target)
+        if session is None or not _tracking():
+            return
+        kind = "tool" if isinstance(target, Tool) else "employee"
+        changes = [(op, kind, str(target.id), target.name)]
+        if op == "update":
+            state = inspect(target)
+            if not (state.attrs.name.history.has_changes() or state.attrs.id.history.has_changes()):
+                # status, location, current loan...: nothing the index holds
+                return
+            changes += [("delete", kind, str(old), None) for old in state.attrs.id.history.deleted]
+        session.info.setdefault("search_changes", []).extend(changes)
+        _log(connection, session, kind, [key for _, _, key, _ in changes])
+    return listener
+
+
+for _model in (Tool, Employee):
+    event.listen(_model, "after_insert", _record("insert"))
+    event.listen(_model, "after_update", _record("update"))
+    event.listen(_model, "after_delete", _record("delete"))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_search_changes(session):
+    changes = session.info.pop("search_changes", None)
+    if not changes or not has_app_context():
+        return
+    index = current_app.extensions.get("search_index")
+    if isinstance(index, TrigramSearch):
+        index.apply(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_search_changes(session):
+    session.info.pop("search_changes", None)
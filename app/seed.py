@@ -0,0 +1,168 @@
+import random
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import func, insert
+from .models import Category, Employee, Movement, Tool, Users, db
+
+BATCH_SIZE = 5000
+# tools generated per worker task (each task also produces their movements)
+TOOLS_PER_TASK = 2000
+
+DEPARTMENTS = ["Maintenance", "Logistics", "Administration", "IT", "Production", "Quality"]
+CATEGORIES = ["Hand Tools", "Power Tools", "Safety Equipment", "Measuring Instruments", "Electrical"]
+TOOL_WORDS = ["Wrench", "Hammer", "Drill", "Screwdriver", "Pliers", "Saw", "Grinder", "Caliper",
+              "Multimeter", "Torque", "Socket", "Chisel", "Clamp", "Level", "Helmet", "Soldering"]
+FIRST_NAMES = ["Amine", "Sara", "Karim", "Lina", "Yacine", "Nadia", "Omar", "Imane", "Mehdi", "Rania",
+               "Samir", "Leila", "Walid", "Yasmine", "Hichem", "Meriem", "Anis", "Sofia"]
+LAST_NAMES = ["Benali", "Haddad", "Mansouri", "Cherif", "Bouzid", "Saidi", "Khelifi", "Belkacem",
+              "Rahmani", "Toumi", "Amrani", "Ziani", "Djebbar", "Larbi"]
+
+# share of tools whose latest movement is still open, and of those how many are in repair;
+# a quarter of the open borrows are past their expected return
+OPEN_SHARE = 0.25
+REPAIR_SHARE = 0.15
+OVERDUE_SHARE = 0.25
+# tools with no movement left, split between available and broken
+BROKEN_SHARE = 0.03
+
+
+def _tool_chunk(args):
+    # runs in a worker process: tools [start, stop) and all their movements.
+    # Each tool's history is sequential, only its last movement may be open,
+    # and the tool status follows that last movement
+    start, stop, avg_movements, n_employees, category_ids, seed, now = args
+    rng = random.Random(seed)
+    tools, movements = [], []
+    for i in range(start, stop):
+        tool_id = f"TL{i + 1:06d}"
+        added = now - timedelta(days=rng.uniform(30, 6 * 365))
+        count = int(rng.expovariate(1 / avg_movements)) if avg_movements else 0
+        # spread the history over the tool's lifetime, one borrow per slot
+        slot = (now - added) / (count + 1)
+        last = None
+        for m in range(count):
+            t = added + slot * (m + rng.uniform(0.05, 0.3))
+            employee_id = rng.randint(1, n_employees)
+            expected = t + timedelta(days=rng.randint(1, 14))
+            if m == count - 1 and rng.random() < OPEN_SHARE:
+                # still open: borrowed recently, but never before the previous return
+                t = max(now - timedelta(days=rng.uniform(0.1, 30)), added + slot * m)
+                returned = None
+                if rng.random() < REPAIR_SHARE:
+                    status, employee_id = "En réparation", None
+                elif rng.random() < OVERDUE_SHARE:
+                    status = "Checked Out"
+                    expected = t + (now - t) * rng.uniform(0.2, 0.9)
+                else:
+                    status = "Checked Out"
+                    expected = now + timedelta(days=rng.randint(1, 14))
+            else:
+                status = "Returned"
+                returned = t + slot * rng.uniform(0.1, 0.6)
+            movements.append((tool_id, employee_id, t, expected, returned, status))
+            last = status
+        if last == "Checked Out":
+            status = "Emprunté"
+        elif last == "En réparation":
+            status = "En réparation"
+        else:
+            status = "Cassé" if rng.random() < BROKEN_SHARE else "Disponible"
+        purchase = added - timedelta(days=rng.randint(0, 365))
+        tools.append({
+            "id": tool_id,
+            "name": f"{rng.choice(TOOL_WORDS)} {rng.choice(TOOL_WORDS).lower()} {i + 1}",
+            "category_id": rng.choice(category_ids),
+            "loc_row": rng.randint(1, 10),
+            "loc_col": rng.randint(1, 10),
+            "loc_shelf": rng.randint(1, 5),
+            "description": None,
+            "date_ajout": added,
+            "purchase_date": purchase.date(),
+            "last_maintenance": (purchase + timedelta(days=rng.randint(30, 500))).date(),
+            "price": round(rng.uniform(10, 1000), 2),
+            "status": status,
+            "photo": None,
+        })
+    return tools, movements
+
+
+def _insert(table, rows, batch_size):
+    for i in range(0, len(rows), batch_size):
+        db.session.execute(insert(table), rows[i:i + batch_size])
+
+
+def generate(tools=200, employees=20, movements=100, workers=1, seed=0,
+             batch_size=BATCH_SIZE, echo=print):
+    # append a synthetic warehouse to the current database through the app engine.
+    # movements is the target total; each tool gets a random share of it
+    from .loaders import rebuild_current_movements
+    from .stats import invalidate_stats
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+
+    if not db.session.query(Users.id).first():
+        _insert(Users.__table__, [
+            {"name": "Admin User", "email": "admin@example.com", "password": "admin123", "department": "Administration"},
+            {"name": "Regular User", "email": "user@example.com", "password": "user123", "department": "Maintenance"},
+        ], batch_size)
+    existing = {name for (name,) in db.session.query(Category.name)}
+    _insert(Category.__table__, [
+        {"name": name, "description": "Generated by flask seed"}
+        for name in CATEGORIES if name not in existing
+    ], batch_size)
+    category_ids = [cid for (cid,) in db.session.query(Category.id)]
+
+    first_employee = (db.session.query(func.max(Employee.id)).scalar() or 0) + 1
+    _insert(Employee.__table__, [
+        {"id": first_employee + i,
+         "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+         "department": rng.choice(DEPARTMENTS)}
+        for i in range(employees)
+    ], batch_size)
+    db.session.commit()
+    n_employees = first_employee + employees - 1
+    echo(f"employees: {employees}")
+
+    first_tool = db.session.query(func.count(Tool.id)).scalar()
+    avg = movements / tools if tools else 0
+    tasks = [
+        (first_tool + s, first_tool + min(s + TOOLS_PER_TASK, tools), avg, n_employees, category_ids, seed + s, now)
+        for s in range(0, tools, TOOLS_PER_TASK)
+    ]
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        chunks = pool.map(_tool_chunk, tasks)
+    else:
+        pool = None
+        chunks = map(_tool_chunk, tasks)
+
+    movement_cols = ("tool_id", "employee_id", "date_emprunt", "expected_return", "return_date", "status")
+    n_tools = n_movements = 0
+    try:
+        # generation runs ahead in the pool while this process inserts
+        for tool_rows, movement_rows in chunks:
+            _insert(Tool.__table__, tool_rows, batch_size)
+            _insert(Movement.__table__, [dict(zip(movement_cols, m)) for m in movement_rows], batch_size)
+            db.session.commit()
+            n_tools += len(tool_rows)
+            n_movements += len(movement_rows)
+            echo(f"tools: {n_tools}/{tools}, movements: {n_movements}")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    # Core inserts skip the Movement listeners: derive tools.current_* and
+    # last_checked_out in one pass each
+    rebuild_current_movements()
+    last_out = (
+        db.session.query(func.max(Movement.date_emprunt))
+        .filter(Movement.tool_id == Tool.id)
+        .scalar_subquery()
+    )
+    db.session.query(Tool).filter(Tool.last_checked_out.is_(None)).update(
+        {Tool.last_checked_out: last_out}, synchronize_session=False
+    )
+    db.session.commit()
+    invalidate_stats()
+    return n_tools, n_movements
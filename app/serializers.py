@@ -0,0 +1,181 @@
+from datetime import date, datetime
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy.orm import aliased
+from .models import Category, Employee, Movement, Tool
+from .photos import thumbnail_url
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    # app.json: orjson when it is installed (several times faster on long lists),
+    # the stdlib otherwise. Same output either way: sorted keys, compact, and
+    # dates/datetimes as ISO 8601 so the projections can hand them over untouched
+    @staticmethod
+    def default(o):
+        if isinstance(o, (date, datetime)):
+            return o.isoformat()
+        return DefaultJSONProvider.default(o)
+
+    def _options(self, indent):
+        option = orjson.OPT_SORT_KEYS if self.sort_keys else 0
+        return option | orjson.OPT_INDENT_2 if indent else option
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs.get("cls"):
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options(kwargs.get("indent"))).decode()
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._options(indent) | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+class Projection:
+    # the columns one API item needs, selected as a flat row (no ORM objects, no
+    # relationship loads) and turned into the item dict by position. joins adds
+    # the outer joins the columns need; finish(item, *context) fixes up the few
+    # derived fields
+    def __init__(self, fields, joins=None, finish=None):
+        self.fields = fields
+        self.keys = tuple(key for key, _ in fields)
+        self.joins = joins
+        self.finish = finish
+
+    def columns(self):
+        # labelled with the item keys, so keyset_page finds its sort column on the row
+        return [column.label(key) for key, column in self.fields]
+
+    def apply(self, query):
+        if self.joins is not None:
+            query = self.joins(query)
+        return query.with_entities(*self.columns())
+
+    def item(self, row, *context):
+        item = dict(zip(self.keys, row))
+        return self.finish(item, *context) if self.finish else item
+
+    def items(self, rows, *context):
+        return [self.item(row, *context) for row in rows]
+
+
+# ---- tools -------------------------------------------------------------------
+_TOOL_FIELDS = (
+    ("id", Tool.id),
+    ("name", Tool.name),
+    ("category", Category.name),
+    ("loc_row", Tool.loc_row),
+    ("loc_col", Tool.loc_col),
+    ("loc_shelf", Tool.loc_shelf),
+    ("description", Tool.description),
+    ("date_ajout", Tool.date_ajout),
+    ("purchase_date", Tool.purchase_date),
+    ("last_maintenance", Tool.last_maintenance),
+    ("last_checked_out", Tool.last_checked_out),
+    ("price", Tool.price),
+    ("status", Tool.status),
+    ("photo", Tool.photo),
+)
+
+
+def _with_category(query):
+    return query.outerjoin(Category, Category.id == Tool.category_id)
+
+
+def _finish_tool(item):
+    item["photo"] = item["photo"] or None
+    return item
+
+
+TOOL = Projection(_TOOL_FIELDS, _with_category, _finish_tool)
+
+# the materialized current movement (see loaders.py) and whoever holds it
+_current = aliased(Movement, name="current_movement")
+_holder = aliased(Employee, name="current_holder")
+
+
+def _with_current_movement(query):
+    return (
+        _with_category(query)
+        .outerjoin(_current, _current.id == Tool.current_movement_id)
+        .outerjoin(_holder, _holder.id == _current.employee_id)
+    )
+
+
+def _finish_tool_full(item):
+    status = item.pop("movement_status")
+    checked_out = status == "Checked Out"
+    photo = item["photo"]
+    item["photo"] = thumbnail_url(photo, "md")
+    item["photo_webp"] = thumbnail_url(photo, "md", "webp")
+    item["photo_original"] = photo or None
+    if not checked_out:
+        item["borrowed_by"] = item["date_emprunt"] = item["expected_return"] = None
+    if status != "Returned":
+        item["return_date"] = None
+    return item
+
+
+TOOL_FULL = Projection(
+    _TOOL_FIELDS + (
+        ("movement_status", _current.status),
+        ("borrowed_by", _holder.name),
+        ("date_emprunt", _current.date_emprunt),
+        ("expected_return", _current.expected_return),
+        ("return_date", _current.return_date),
+    ),
+    _with_current_movement,
+    _finish_tool_full,
+)
+
+
+# ---- movements ---------------------------------------------------------------
+# these read Tool and Employee columns: the query must join Movement.tool and
+# outer join Movement.employee (movements_query and overdue_query do)
+MOVEMENT = Projection((
+    ("id", Movement.id),
+    ("tool_id", Movement.tool_id),
+    ("tool_name", Tool.name),
+    ("employee_id", Movement.employee_id),
+    ("employee_name", Employee.name),
+    ("date_emprunt", Movement.date_emprunt),
+    ("return_date", Movement.return_date),
+    ("expected_return", Movement.expected_return),
+    ("status", Movement.status),
+))
+
+
+def _finish_movement_full(item):
+    photo = item["tool_photo"]
+    item["tool_photo"] = thumbnail_url(photo, "sm")
+    item["tool_photo_webp"] = thumbnail_url(photo, "sm", "webp")
+    return item
+
+
+MOVEMENT_FULL = Projection(MOVEMENT.fields + (("tool_photo", Tool.photo),), finish=_finish_movement_full)
+
+
+def _finish_overdue(item, now):
+    _finish_movement_full(item)
+    item["days_overdue"] = (now - item["expected_return"]).days
+    return item
+
+
+# also the row layout of the in-memory overdue index (overdue.py): keep the order
+OVERDUE = Projection((
+    ("id", Movement.id),
+    ("tool_id", Movement.tool_id),
+    ("tool_name", Tool.name),
+    ("tool_photo", Tool.photo),
+    ("employee_id", Movement.employee_id),
+    ("employee_name", Employee.name),
+    ("date_emprunt", Movement.date_emprunt),
+    ("expected_return", Movement.expected_return),
+), finish=_finish_overdue)
@@ -0,0 +1,143 @@
+import re
+import threading
+import time
+from collections import Counter
+from flask import current_app, g, has_request_context, jsonify, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# slowest statements kept per request and in the process-wide summary
+KEEP_SLOWEST = 5
+KEEP_SLOWEST_GLOBAL = 20
+STATEMENT_PREVIEW = 300
+
+# "IN (?, ?, ?)" and multi-row VALUES collapse to one shape whatever their length
+_PARAM_LIST = re.compile(r"\((\s*(\?|%s|%\(\w+\)s)\s*,)+\s*(\?|%s|%\(\w+\)s)\s*\)")
+_SPACES = re.compile(r"\s+")
+
+_lock = threading.Lock()
+_endpoints = {}
+_slowest = []
+
+
+def statement_shape(statement):
+    return _PARAM_LIST.sub("(?)", _SPACES.sub(" ", statement).strip())
+
+
+def _preview(statement):
+    # head and tail: the selected table and the WHERE clause are what identify a statement
+    text = _SPACES.sub(" ", statement).strip()
+    if len(text) <= STATEMENT_PREVIEW:
+        return text
+    half = STATEMENT_PREVIEW // 2
+    return text[:half] + " ... " + text[-half:]
+
+
+# ---- engine hooks ----------------------------------------------------------
+# registered on the Engine class, so every engine the app creates is covered;
+# statements outside a request (CLI, streaming generators after the response) are ignored
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("sqltrace_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("sqltrace_start")
+    if not starts:
+        return
+    elapsed = (time.perf_counter() - starts.pop()) * 1000
+    if not has_request_context():
+        return
+    trace = g.get("sqltrace")
+    if trace is None:
+        return
+    trace["count"] += 1
+    trace["time"] += elapsed
+    trace["shapes"][statement_shape(statement)] += 1
+    slowest = trace["slowest"]
+    if len(slowest) < KEEP_SLOWEST or elapsed > slowest[-1][0]:
+        slowest.append((elapsed, statement))
+        slowest.sort(key=lambda s: -s[0])
+        del slowest[KEEP_SLOWEST:]
+    slow_ms = current_app.config.get("SQL_SLOW_QUERY_MS", 0)
+    if slow_ms and elapsed >= slow_ms:
+        current_app.logger.warning("slow query %.1fms in %s: %s", elapsed, request.endpoint, _preview(statement))
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    # a failed statement never reaches after_cursor_execute
+    conn = context.connection
+    if conn is not None and conn.info.get("sqltrace_start"):
+        conn.info["sqltrace_start"].pop()
+
+
+# ---- request hooks ---------------------------------------------------------
+def _start_request():
+    g.sqltrace = {"count": 0, "time": 0.0, "shapes": Counter(), "slowest": [], "start": time.perf_counter()}
+
+
+def _finish_request(response):
+    trace = g.pop("sqltrace", None)
+    if trace is None:
+        return response
+    total = (time.perf_counter() - trace["start"]) * 1000
+    endpoint = request.endpoint or "<unmatched>"
+
+    # N+1: the same statement shape over and over in one request
+    threshold = current_app.config.get("SQL_REPEAT_WARN", 0)
+    repeated = [(shape, n) for shape, n in trace["shapes"].items() if threshold and n >= threshold]
+    for shape, n in repeated:
+        current_app.logger.warning("possible N+1 in %s: statement ran %d times: %s", endpoint, n, _preview(shape))
+
+    timing = f'db;dur={trace["time"]:.1f};desc="{trace["count"]} queries", app;dur={total:.1f}'
+    if "pool_wait" in g:
+        timing += f', pool;dur={g.pool_wait * 1000:.1f};desc="connection wait"'
+    response.headers.add("Server-Timing", timing)
+
+    with _lock:
+        stats = _endpoints.setdefault(endpoint, {
+            "requests": 0, "queries": 0, "max_queries": 0, "db_ms": 0.0, "total_ms": 0.0, "repeated": 0,
+        })
+        stats["requests"] += 1
+        stats["queries"] += trace["count"]
+        stats["max_queries"] = max(stats["max_queries"], trace["count"])
+        stats["db_ms"] += trace["time"]
+        stats["total_ms"] += total
+        stats["repeated"] += len(repeated)
+        for elapsed, statement in trace["slowest"]:
+            if len(_slowest) < KEEP_SLOWEST_GLOBAL or elapsed > _slowest[-1]["ms"]:
+                _slowest.append({"ms": round(elapsed, 2), "endpoint": endpoint, "statement": _preview(statement)})
+                _slowest.sort(key=lambda s: -s["ms"])
+                del _slowest[KEEP_SLOWEST_GLOBAL:]
+    return response
+
+
+def sql_metrics():
+    # per-endpoint totals and averages since the process started, plus the slowest statements seen
+    with _lock:
+        endpoints = {
+            name: {
+                **s,
+                "db_ms": round(s["db_ms"], 2),
+                "total_ms": round(s["total_ms"], 2),
+                "avg_queries": round(s["queries"] / s["requests"], 2),
+                "avg_db_ms": round(s["db_ms"] / s["requests"], 2),
+                "avg_total_ms": round(s["total_ms"] / s["requests"], 2),
+            }
+            for name, s in sorted(_endpoints.items())
+        }
+        slowest = list(_slowest)
+    return jsonify({"endpoints": endpoints, "slowest": slowest})
+
+
+def init_sqltrace(app):
+    if not app.config.get("SQL_TRACE", True):
+        return
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    # process-local debug view; off unless asked for since it lists raw SQL
+    if app.debug or app.config.get("SQL_METRICS_ENDPOINT"):
+        app.add_url_rule("/_metrics", "sql_metrics", sql_metrics)
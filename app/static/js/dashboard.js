@@ -1,53 +1,50 @@
-document.addEventListener('DOMContentLoaded', async function() {
-    try {
-        // Fetch data from Flask API
-        const response = await fetch("{{ url_for('view.cart') }}");
-        const data = await response.json();
+// live counters: the charts are drawn by the inline script in dashboard.html,
+// this file only refreshes them when /api/events says something changed
+document.addEventListener('DOMContentLoaded', function() {
+    if (!window.EventSource) return;
 
-        // Destructure API values
-        const { total_tools,active_tools, active_percent,maintenance_tools, out_of_service_tools  } = data;
+    let pending = null;
 
-        // ----------------- Status Chart -----------------
-        const statusCtx = document.getElementById('statusChart').getContext('2d');
-        new Chart(statusCtx, {
-            type: 'doughnut',
-            data: {
-                labels: ['Available', 'In Maintenance', 'Out of Service'],
-                datasets: [{
-                    data: [active_tools, maintenance_tools, out_of_service_tools],
-                    backgroundColor: ['#10B981', '#F59E0B', '#EF4444']
-                }]
-            },
-            options: {
-                responsive: true,
-                plugins: {
-                    legend: {
-                        position: 'bottom'
-                    }
-                }
-            }
-        });
+    async function refresh() {
+        try {
+            const response = await fetch('/cart');
+            const data = await response.json();
+            const { total_tools, active_tools, maintenance_tools, borrowed_tools, out_of_service_tools } = data;
+
+            document.getElementById('total_tools').innerText = total_tools;
+            document.getElementById('active_tools').innerText = active_tools;
+            document.getElementById('maintenance_tools').innerText = maintenance_tools;
+            document.getElementById('emprunt').innerText = borrowed_tools;
+            document.getElementById('out_of_service_tools').innerText = out_of_service_tools;
 
-        // ----------------- Inventory Chart (example) -----------------
-        const inventoryCtx = document.getElementById('inventoryChart').getContext('2d');
-    new Chart(inventoryCtx, {
-    type: 'doughnut',
-    data: {
-        labels: ['Active %', 'Total Tools'],
-        datasets: [{
-            label: 'Inventory Stats',
-            data: [active_percent, total_tools],
-            backgroundColor: ['#3B82F6', '#6366F1']
-        }]
-    },
-    options: {
-        responsive: true,
-        plugins: {
-            legend: { position: 'bottom' }
+            const statusChart = Chart.getChart('statusChart');
+            if (statusChart) {
+                statusChart.data.datasets[0].data = [active_tools, borrowed_tools, maintenance_tools, out_of_service_tools];
+                statusChart.update();
+            }
+            const inventoryChart = Chart.getChart('inventoryChart');
+            if (inventoryChart) {
+                inventoryChart.data.datasets[0].data = [active_tools, total_tools - active_tools];
+                inventoryChart.update();
+            }
+        } catch (error) {
+            console.error("Error loading dashboard data:", error);
         }
     }
-});
-    } catch (error) {
-        console.error("Error loading dashboard data:", error);
+
+    // a burst of returns at shift change becomes one refresh
+    function schedule() {
+        clearTimeout(pending);
+        pending = setTimeout(refresh, 500);
     }
+
+    const events = new EventSource('/api/events');
+    ['borrow', 'return', 'maintenance', 'maintenance-return', 'new-tool', 'reset'].forEach(function(kind) {
+        events.addEventListener(kind, schedule);
+    });
+    // the server refuses streams past EVENTS_MAX_STREAMS (503): the browser gives
+    // up on the stream for good, so poll the counters instead
+    events.onerror = function() {
+        if (events.readyState === EventSource.CLOSED) setInterval(refresh, 30000);
+    };
 });
@@ -0,0 +1,74 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import case, func
+from .models import Tool, Movement, db
+
+_cache = {"value": None, "expires": 0.0, "generation": 0}
+_lock = threading.Lock()
+
+
+def _compute():
+    last_month = datetime.utcnow() - timedelta(days=30)
+    checked_out = (
+        db.session.query(func.count(Movement.id))
+        .filter(Movement.status == 'Checked Out')
+        .scalar_subquery()
+    )
+    # one grouped scan of tools; the checked-out movement count rides along
+    rows = (
+        db.session.query(
+            Tool.status,
+            func.count(Tool.id),
+            func.sum(case((Tool.date_ajout >= last_month, 1), else_=0)),
+            checked_out
+        )
+        .group_by(Tool.status)
+        .all()
+    )
+
+    by_status = {}
+    tools_last_month = 0
+    borrowed_movements = 0
+    for status, count, recent, movements_out in rows:
+        by_status[status] = count
+        tools_last_month += recent or 0
+        borrowed_movements = movements_out or 0
+    total_tools = sum(by_status.values())
+
+    return {
+        "total_tools": total_tools,
+        "by_status": by_status,
+        "tools_last_month": tools_last_month,
+        "growth_percent": round((tools_last_month / total_tools * 100), 2) if total_tools > 0 else 0,
+        "active_tools": by_status.get('Disponible', 0),
+        "active_percent": (by_status.get('Disponible', 0) / total_tools * 100) if total_tools > 0 else 0,
+        "borrowed_tools": by_status.get('Emprunté', 0),
+        "maintenance_tools": by_status.get('En réparation', 0),
+        "out_of_service_tools": by_status.get('Cassé', 0),
+        "borrowed_movements": borrowed_movements,
+    }
+
+
+def get_stats():
+    ttl = current_app.config.get("STATS_CACHE_TTL", 0)
+    now = time.monotonic()
+    with _lock:
+        if _cache["value"] is not None and now < _cache["expires"]:
+            return _cache["value"]
+        generation = _cache["generation"]
+    stats = _compute()
+    with _lock:
+        # a write that invalidated while we were computing wins
+        if generation == _cache["generation"]:
+            _cache["value"] = stats
+            _cache["expires"] = now + ttl
+    return stats
+
+
+def invalidate_stats():
+    with _lock:
+        _cache["value"] = None
+        _cache["expires"] = 0.0
+        _cache["generation"] += 1
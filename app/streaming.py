@@ -0,0 +1,51 @@
+from flask import Response, current_app, stream_with_context
+
+STREAM_FORMATS = ("ndjson", "json-stream")
+YIELD_PER = 1000
+
+
+def unbounded(query):
+    # full exports legitimately outlive DB_STATEMENT_TIMEOUT_MS; the optimizer hint
+    # lifts MySQL's max_execution_time for this one SELECT
+    return query.prefix_with("/*+ MAX_EXECUTION_TIME(0) */", dialect="mysql")
+
+
+def stream_rows(query, serialize, fmt, batch_size=None):
+    batch_size = batch_size or current_app.config.get("STREAM_BATCH_SIZE", YIELD_PER)
+    # yield_per turns on a server-side cursor (stream_results), so rows leave the
+    # database, get serialized and are flushed to the client one batch at a time
+    rows = unbounded(query).yield_per(batch_size)
+    dumps = current_app.json.dumps
+
+    def ndjson():
+        buf = []
+        for row in rows:
+            buf.append(dumps(serialize(row)))
+            if len(buf) >= batch_size:
+                yield "\n".join(buf) + "\n"
+                buf = []
+        if buf:
+            yield "\n".join(buf) + "\n"
+
+    def json_array():
+        yield "["
+        first = True
+        buf = []
+        for row in rows:
+            buf.append(dumps(serialize(row)))
+            if len(buf) >= batch_size:
+                yield ("" if first else ",") + ",".join(buf)
+                first = False
+                buf = []
+        if buf:
+            yield ("" if first else ",") + ",".join(buf)
+        yield "]"
+
+    if fmt == "ndjson":
+        body, mimetype = ndjson(), "application/x-ndjson"
+    else:
+        body, mimetype = json_array(), "application/json"
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    # let proxies pass chunks through instead of buffering the whole export
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
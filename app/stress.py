@@ -0,0 +1,145 @@
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from .models import Employee, Movement, Tool, db
+
+OPERATIONS = ("borrow", "return", "send", "back", "scan_borrow", "scan_return")
+# tools per kiosk scan in scan_borrow / scan_return
+SCAN_SIZE = 3
+
+
+def pick_tools(count):
+    # available tools with no open loan, so the run starts from a clean state
+    open_loans = db.session.query(Movement.tool_id).filter(Movement.status == 'Checked Out')
+    return [
+        i for (i,) in db.session.query(Tool.id)
+        .filter(Tool.status == 'Disponible', Tool.id.notin_(open_loans))
+        .order_by(Tool.id)
+        .limit(count)
+    ]
+
+
+def _open_loan(app, tool_id):
+    with app.app_context():
+        try:
+            return db.session.query(Movement.id).filter(
+                Movement.tool_id == tool_id, Movement.status == 'Checked Out'
+            ).limit(1).scalar()
+        finally:
+            db.session.remove()
+
+
+def _worker(app, tool_ids, employee_id, operations, seed):
+    # one terminal: random operations on the shared tools; -> Counter of (operation, outcome)
+    client = app.test_client()
+    rng = random.Random(seed)
+    future = (datetime.utcnow() + timedelta(days=7)).strftime("%Y-%m-%d")
+    outcomes = Counter()
+    for _ in range(operations):
+        op = rng.choice(OPERATIONS)
+        tool_id = rng.choice(tool_ids)
+        if op == "borrow":
+            resp = client.post("/borrows/new", data={
+                "tool_id": tool_id, "employee_id": employee_id, "expected_return": future})
+            # the form answers with a redirect either way: the flash says which
+            with client.session_transaction() as session:
+                flashes = session.pop("_flashes", [])
+            ok = resp.status_code == 302 and any(category == "success" for category, _ in flashes)
+        elif op == "return":
+            movement_id = _open_loan(app, tool_id)
+            if movement_id is None:
+                outcomes[op, "nothing"] += 1
+                continue
+            resp = client.post(f"/tools/return/{movement_id}", json={"status": "Disponible"})
+            ok = resp.status_code == 302
+        elif op == "send":
+            resp = client.post(f"/maintenance/send/{tool_id}", json={"expected_return": future})
+            ok = resp.status_code == 200
+        elif op == "back":
+            resp = client.post(f"/maintenance/return/{tool_id}", json={
+                "status": "Disponible", "loc_row": 1, "loc_col": 1, "loc_shelf": 1})
+            ok = resp.status_code == 200
+        else:
+            # a kiosk batch: every item counts on its own
+            scanned = rng.sample(tool_ids, min(SCAN_SIZE, len(tool_ids)))
+            if op == "scan_borrow":
+                resp = client.post("/api/borrows/batch", json={
+                    "tool_ids": scanned, "employee_id": employee_id, "expected_return": future})
+            else:
+                resp = client.post("/api/returns/batch", json={"tool_ids": scanned})
+            if resp.status_code == 200:
+                for item in resp.get_json()["items"]:
+                    outcomes[op, "ok" if item["success"] else "conflict"] += 1
+                continue
+            ok = False
+        outcomes[op, "error" if resp.status_code >= 500 else "ok" if ok else "conflict"] += 1
+    return outcomes
+
+
+def check(tool_ids, first_movement, outcomes):
+    # -> list of broken invariants; empty when every claim won exactly once
+    problems = []
+    doubled = (
+        db.session.query(Movement.tool_id, func.count())
+        .filter(Movement.status == 'Checked Out', Movement.tool_id.in_(tool_ids))
+        .group_by(Movement.tool_id)
+        .having(func.count() > 1)
+        .all()
+    )
+    for tool_id, n in doubled:
+        problems.append(f"tool {tool_id} has {n} open loans")
+
+    open_loans = {
+        tool_id for (tool_id,) in db.session.query(Movement.tool_id)
+        .filter(Movement.status == 'Checked Out', Movement.tool_id.in_(tool_ids))
+    }
+    for tool_id, status in db.session.query(Tool.id, Tool.status).filter(Tool.id.in_(tool_ids)):
+        if (status == 'Emprunté') != (tool_id in open_loans):
+            problems.append(f"tool {tool_id} is '{status}' with {'an' if tool_id in open_loans else 'no'} open loan")
+
+    created = Counter(
+        "borrow" if employee_id is not None else status
+        for employee_id, status in db.session.query(Movement.employee_id, Movement.status)
+        .filter(Movement.id >= first_movement)
+    )
+    returned = db.session.query(func.count()).filter(
+        Movement.id >= first_movement, Movement.employee_id.isnot(None), Movement.status == 'Returned'
+    ).scalar()
+    written = {
+        ("borrow", "scan_borrow"): created["borrow"],
+        ("return", "scan_return"): returned,
+        ("send",): created["En réparation"],
+        ("back",): created["Returned"],
+    }
+    for ops, rows in written.items():
+        ok = sum(outcomes[op, "ok"] for op in ops)
+        if ok != rows:
+            problems.append(f"{ok} successful {'/'.join(ops)} for {rows} rows written")
+    for (op, outcome), n in outcomes.items():
+        if outcome == "error":
+            problems.append(f"{n} {op} failed with a server error")
+    return problems
+
+
+def run(app, tool_ids, employee_id, threads=16, operations=100):
+    # -> (Counter of (operation, outcome), seconds); every thread on the same few tools
+    start_gate = threading.Barrier(threads)
+
+    def job(seed):
+        start_gate.wait()
+        return _worker(app, tool_ids, employee_id, operations, seed)
+
+    outcomes = Counter()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for result in pool.map(job, range(threads)):
+            outcomes.update(result)
+    return outcomes, time.perf_counter() - start
+
+
+def first_employee():
+    return db.session.query(Employee.id).order_by(Employee.id).limit(1).scalar()
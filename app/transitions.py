@@ -0,0 +1,79 @@
+import random
+import time
+from flask import current_app
+from sqlalchemy import inspect, update
+from sqlalchemy.exc import OperationalError
+from .models import db
+
+# MySQL: lock wait timeout exceeded, deadlock found
+RETRYABLE_MYSQL_ERRORS = (1205, 1213)
+
+
+class Conflict(Exception):
+    # the row was no longer in the expected status: another terminal got there first
+    pass
+
+
+def transition(model, key, expected, **values):
+    # UPDATE <table> SET status/... WHERE id = :key AND status IN (:expected)
+    # checking and writing in one statement, so two terminals can't both pass the
+    # check: the second waits on the row lock, then matches nothing. Nothing is
+    # read FOR UPDATE beforehand; the row stays locked until the caller commits.
+    # -> the object, reloaded, with after_update replayed: a Core UPDATE fires no
+    # mapper events, and the current movement / overdue bookkeeping lives there
+    if isinstance(expected, str):
+        expected = (expected,)
+    result = db.session.execute(
+        update(model).where(model.id == key, model.status.in_(expected)).values(**values),
+        execution_options={"synchronize_session": False},
+    )
+    if result.rowcount != 1:
+        raise Conflict(f"{model.__tablename__} {key} is not {' or '.join(expected)}")
+    target = db.session.get(model, key, populate_existing=True)
+    model.__mapper__.dispatch.after_update(model.__mapper__, db.session.connection(), inspect(target))
+    return target
+
+
+def transition_all(model, keys, expected, **values):
+    # the same for many rows in one statement (kiosk batches). Mapper events are
+    # not replayed: the caller does the bookkeeping for the whole batch in bulk.
+    # A short rowcount means another terminal took one of them since they were read
+    if isinstance(expected, str):
+        expected = (expected,)
+    result = db.session.execute(
+        update(model).where(model.id.in_(keys), model.status.in_(expected)).values(**values),
+        execution_options={"synchronize_session": False},
+    )
+    if result.rowcount != len(keys):
+        raise Conflict(f"{len(keys) - result.rowcount} of {len(keys)} {model.__tablename__} no longer {' or '.join(expected)}")
+
+
+def _transient(error):
+    # worth running the transaction again: lock waits and deadlocks (MySQL),
+    # a busy database file (SQLite)
+    orig = error.orig
+    if orig is not None and orig.args and orig.args[0] in RETRYABLE_MYSQL_ERRORS:
+        return True
+    return "database is locked" in str(orig)
+
+
+def run_transition(work):
+    # work() makes the changes, commit happens here. On a transient error the
+    # transaction is rolled back (queued events and index changes with it) and
+    # work() runs again after a jittered exponential backoff; a Conflict is final
+    retries = current_app.config["TRANSITION_RETRIES"]
+    backoff = current_app.config["TRANSITION_RETRY_BACKOFF_MS"] / 1000
+    for attempt in range(retries + 1):
+        try:
+            result = work()
+            db.session.commit()
+            return result
+        except Conflict:
+            db.session.rollback()
+            raise
+        except OperationalError as e:
+            db.session.rollback()
+            if attempt == retries or not _transient(e):
+                raise
+            current_app.logger.info("transition retried after %s", e.orig)
+            time.sleep(backoff * 2 ** attempt * random.random())
@@ -1,89 +1,79 @@
-from flask import Blueprint, render_template, redirect, request, url_for, jsonify, flash
+import csv
+from flask import Blueprint, current_app, render_template, redirect, request, url_for, jsonify, flash
 from datetime import datetime, timedelta
 from .models import Tool, Movement, Category, Users, Employee, db
-from sqlalchemy import event, func
+from .stats import get_stats, invalidate_stats
+from .pagination import InvalidCursor, approximate_count, keyset_page, page_size
+from .routing import read_only
+from .events import emit
+from .overdue import get_overdue_index, overdue_rows
+from .serializers import MOVEMENT, MOVEMENT_FULL, OVERDUE, TOOL, TOOL_FULL
+from .photos import InvalidPhoto, read_upload, store_photo
+from .httpcache import conditional
+from .search import get_search
+from .streaming import STREAM_FORMATS, stream_rows
+from .export import MOVEMENT_COLUMNS, csv_response, xlsx_response
+from .importer import IMPORT_FORMATS, IMPORT_KINDS, detect_format, import_rows, read_rows, text_stream
+from .transitions import Conflict, run_transition, transition
+from .kiosk import InvalidBatch, borrow_batch, return_batch, returned_status, scanned_ids
+from sqlalchemy import event, func, or_, select
+from sqlalchemy.orm import contains_eager
 
 view = Blueprint("view", __name__)
 
 @view.route("/dashboard")
+@read_only
 def dashboard():
-    # total tools
-    total_tools = db.session.query(Tool).count()
-
-    # growth in last month
-    last_month = datetime.utcnow() - timedelta(days=30)
-    tools_last_month = db.session.query(Tool).filter(Tool.date_ajout >= last_month).count()  # Changed to date_ajout
-
-    growth_percent = round((tools_last_month / total_tools * 100), 2) if total_tools > 0 else 0
-
-    # status counts
-    active_tools = db.session.query(Tool).filter(Tool.status == 'Disponible').count()
-    active_percent = (active_tools / total_tools * 100) if total_tools > 0 else 0
-    emprunt = db.session.query(Tool).filter(Tool.status == 'Emprunté').count()
-    maintenance_tools = db.session.query(Tool).filter(Tool.status == 'En réparation').count()
-    out_of_service_tools = db.session.query(Tool).filter(Tool.status == 'Cassé').count()
+    stats = get_stats()
 
     # recent tools
     recent_tools = db.session.query(Tool).order_by(Tool.date_ajout.desc()).limit(20).all()  # Changed to date_ajout
 
     # recent borrows (last 20 movements)
     recent_borrows = (
-        db.session.query(Movement).join(Tool).filter(Tool.status == 'Emprunté')
+        db.session.query(Movement).join(Movement.tool).outerjoin(Movement.employee)
+        .options(contains_eager(Movement.tool), contains_eager(Movement.employee))
+        .filter(Tool.status == 'Emprunté')
         .order_by(Movement.date_emprunt.desc())  # Changed to date_emprunt
         .limit(20)
         .all()
     )
 
-    # Generate alerts for overdue tools
-    overdue_tools = (
-        db.session.query(Movement, Tool, Employee)
-        .join(Tool)
-        .join(Employee)
-        .filter(Movement.status == 'Checked Out')
-        .filter(Movement.expected_return < datetime.utcnow())
-        .all()
-    )
-    
+    # Generate alerts for overdue tools (rows from the overdue index)
+    now = datetime.utcnow()
     alerts = []
-    for movement, tool, employee in overdue_tools:
-        days_overdue = (datetime.utcnow() - movement.expected_return).days
+    for _, _, tool_name, _, _, employee_name, _, expected_return in overdue_rows(now):
+        if employee_name is None:
+            continue
+        days_overdue = (now - expected_return).days
         alerts.append({
-            'message': f"Tool '{tool.name}' borrowed by {employee.name} is {days_overdue} days overdue",
-            'timestamp': movement.expected_return.strftime('%Y-%m-%d')
+            'message': f"Tool '{tool_name}' borrowed by {employee_name} is {days_overdue} days overdue",
+            'timestamp': expected_return.strftime('%Y-%m-%d')
         })
     
     return render_template(
         "dashboard.html",
-        total_tools=total_tools,
-        growth=growth_percent,
-        active_tools=active_tools,
-        active_percent=active_percent,
-        maintenance_tools=maintenance_tools,
+        total_tools=stats["total_tools"],
+        growth=stats["growth_percent"],
+        active_tools=stats["active_tools"],
+        active_percent=stats["active_percent"],
+        maintenance_tools=stats["maintenance_tools"],
         recent_tools=recent_tools,
-        out_of_service_tools=out_of_service_tools,
-        emprunt=emprunt,
+        out_of_service_tools=stats["out_of_service_tools"],
+        emprunt=stats["borrowed_tools"],
         recent_borrows=recent_borrows,
         alerts=alerts  # Add alerts to template context
     )
 @view.route("/cart")
 def cart():
-    total_tools = db.session.query(Tool).count()
-
-
-    # status counts
-    active_tools = db.session.query(Tool).filter(Tool.status == 'Disponible').count()
-    active_percent = (active_tools / total_tools * 100) if total_tools > 0 else 0
-
-    maintenance_tools = db.session.query(Tool).filter(Tool.status == 'En réparation').count()
-    out_of_service_tools = db.session.query(Tool).filter(Tool.status == 'Cassé').count()
-    
-
+    stats = get_stats()
     return jsonify({
-        "total_tools": total_tools,
-        "active_tools": active_tools,
-        "active_percent": active_percent,
-        "maintenance_tools": maintenance_tools,
-        "out_of_service_tools": out_of_service_tools
+        "total_tools": stats["total_tools"],
+        "active_tools": stats["active_tools"],
+        "active_percent": stats["active_percent"],
+        "maintenance_tools": stats["maintenance_tools"],
+        "out_of_service_tools": stats["out_of_service_tools"],
+        "borrowed_tools": stats["borrowed_tools"]
     })
 
 @view.route("/tools")
@@ -99,14 +89,14 @@ def tools():
 
     # join
     if tool_q or category:
-        query = query.join(Tool)
+        query = query.join(Movement.tool)
     if emp_q:
-        query = query.join(Employee)
+        query = query.join(Movement.employee)
 
     if tool_q:
-        query = query.filter((Tool.name.ilike(f"%{tool_q}%")) | (Tool.id.ilike(f"%{tool_q}%")))
+        query = query.filter(get_search().filter("tool", tool_q))
     if emp_q:
-        query = query.filter((Employee.name.ilike(f"%{emp_q}%")) | (Employee.id.ilike(f"%{emp_q}%")))
+        query = query.filter(get_search().filter("employee", emp_q))
     if date_emprunt:
         try:
             date_obj = datetime.strptime(date_emprunt, '%Y-%m-%d')
@@ -137,24 +127,29 @@ def tools():
 
 @view.route("/tools/return/<int:movement_id>", methods=['POST'])
 def mark_returned(movement_id):
-    movement = Movement.query.get_or_404(movement_id)
-    tool = movement.tool
     # json form 
-    if request.is_json:
-        data = request.get_json()
+    data = request.get_json() if request.is_json else request.form
+    new_status = data.get('status', 'Disponible')
+
+    def give_back():
+        movement = transition(Movement, movement_id, 'Checked Out', status='Returned', return_date=datetime.utcnow())
+        tool = movement.tool
         tool.loc_shelf = data.get('loc_shelf', tool.loc_shelf)
         tool.loc_col = data.get('loc_col', tool.loc_col)
         tool.loc_row = data.get('loc_row', tool.loc_row)
-        new_status = data.get('status', 'Disponible')
-    else:
-        tool.loc_shelf = request.form.get('loc_shelf', tool.loc_shelf)
-        tool.loc_col = request.form.get('loc_col', tool.loc_col)
-        tool.loc_row = request.form.get('loc_row', tool.loc_row)
-        new_status = request.form.get('status', 'Disponible')
-    movement.status = 'Returned'
-    tool.status = new_status
-    movement.return_date = datetime.utcnow()
-    db.session.commit()
+        tool.status = new_status
+        emit("return", tool_id=tool.id, tool_name=tool.name, movement_id=movement.id, status=new_status)
+
+    try:
+        run_transition(give_back)
+    except Conflict:
+        # already returned (double scan, two terminals) or no such loan
+        Movement.query.get_or_404(movement_id)
+        if request.is_json:
+            return jsonify({"success": False, "message": "Déjà retourné"}), 409
+        flash("Échec : Outil déjà retourné.", "danger")
+        return redirect(url_for('view.tools'))
+    invalidate_stats()
     return redirect(url_for('view.tools'))
 
 @view.route("/")
@@ -167,6 +162,9 @@ def categories():
     data = [{"id": c.id, "name": c.name, "description": c.description} for c in categories]
     return jsonify(data)
 
+def _current_holder(movement):
+    return movement.employee_id if movement.status == "Checked Out" else None
+
 @event.listens_for(Movement, "after_insert")
 def update_last_checked_out(mapper, connection, target):
     if target.status == "Checked Out":
@@ -175,6 +173,22 @@ def update_last_checked_out(mapper, connection, target):
             .where(Tool.id == target.tool_id)
             .values(last_checked_out=target.date_emprunt or datetime.utcnow())
         )
+    # the new movement becomes current unless the tool already has a later one
+    current_date = (
+        select(Movement.date_emprunt)
+        .where(Movement.id == Tool.current_movement_id)
+        .scalar_subquery()
+    )
+    connection.execute(
+        Tool.__table__.update()
+        .where(Tool.id == target.tool_id)
+        .where(or_(
+            Tool.current_movement_id.is_(None),
+            current_date.is_(None),
+            current_date <= (target.date_emprunt or datetime.utcnow())
+        ))
+        .values(current_movement_id=target.id, current_employee_id=_current_holder(target))
+    )
 
 @event.listens_for(Movement, "after_update")
 def update_last_checked_out_on_return(mapper, connection, target):
@@ -191,6 +205,11 @@ def update_last_checked_out_on_return(mapper, connection, target):
             .where(Tool.id == target.tool_id)
             .values(last_checked_out=None)
         )
+    connection.execute(
+        Tool.__table__.update()
+        .where(Tool.id == target.tool_id, Tool.current_movement_id == target.id)
+        .values(current_employee_id=_current_holder(target))
+    )
 @view.route('/borrows/new', methods=['GET', 'POST'])
 def new_borrow():
     from datetime import datetime, timedelta
@@ -210,29 +229,88 @@ def new_borrow():
             return redirect(url_for('view.dashboard'))
 
         # validatio
-        tool = Tool.query.get(tool_id)
         employee = Employee.query.get(employee_id)
-        if not tool or tool.status != 'Disponible' or not employee:
+        if not employee:
             flash("Échec : Outil ou employé invalide.", "danger")
             return redirect(url_for('view.dashboard'))
 
-        # Create movement
-        movement = Movement(
-            tool_id=tool_id,
-            employee_id=employee_id,
-            date_emprunt=datetime.utcnow(),
-            expected_return=expected_return,
-            status='Checked Out'
-        )
-        db.session.add(movement)
-        tool.status = 'Emprunté'
-        db.session.commit()
+        def checkout():
+            # claim the tool first: the UPDATE ... WHERE status = 'Disponible' is the availability check
+            tool = transition(Tool, tool_id, 'Disponible', status='Emprunté')
+            db.session.add(Movement(
+                tool_id=tool.id,
+                employee_id=employee_id,
+                date_emprunt=datetime.utcnow(),
+                expected_return=expected_return,
+                status='Checked Out'
+            ))
+            emit("borrow", tool_id=tool.id, tool_name=tool.name, employee_id=employee.id, employee_name=employee.name,
+                 expected_return=expected_return.strftime('%Y-%m-%d'))
+
+        try:
+            run_transition(checkout)
+        except Conflict:
+            if Tool.query.get(tool_id) is None:
+                flash("Échec : Outil ou employé invalide.", "danger")
+            else:
+                flash("Échec : Outil déjà emprunté ou indisponible.", "danger")
+            return redirect(url_for('view.dashboard'))
+        invalidate_stats()
         flash("Créé avec succès !", "success")
         return redirect(url_for('view.dashboard'))
 
     employees = Employee.query.all()
     return render_template('borrow.html', employees=employees, datetime=datetime, timedelta=timedelta)
 
+def _batch_response(items):
+    done = sum(item["success"] for item in items)
+    if done:
+        invalidate_stats()
+    return jsonify({"success": done == len(items), "done": done, "failed": len(items) - done, "items": items})
+
+@view.route("/api/borrows/batch", methods=["POST"])
+def api_borrow_batch():
+    # kiosk: one badge, then every tool scanned; one request, one transaction
+    data = request.get_json(silent=True) or {}
+    try:
+        tool_ids = scanned_ids(data.get('tool_ids'))
+        expected_return = datetime.strptime(data.get('expected_return') or '', '%Y-%m-%d')
+    except InvalidBatch as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    except ValueError:
+        return jsonify({"success": False, "message": "Date de retour prévue invalide"}), 400
+    if expected_return <= datetime.utcnow():
+        return jsonify({"success": False, "message": "La date de retour doit être dans le futur"}), 400
+    employee = Employee.query.get(data.get('employee_id')) if data.get('employee_id') else None
+    if employee is None:
+        return jsonify({"success": False, "message": "Employé inconnu"}), 400
+    try:
+        items = borrow_batch(employee, tool_ids, expected_return)
+    except Conflict:
+        return jsonify({"success": False, "message": "Outils modifiés pendant le scan, réessayez"}), 409
+    return _batch_response(items)
+
+@view.route("/api/returns/batch", methods=["POST"])
+def api_return_batch():
+    # kiosk at shift change: everything scanned goes back in one transaction.
+    # employee_id is optional; when given, only the loans they hold are closed
+    data = request.get_json(silent=True) or {}
+    try:
+        tool_ids = scanned_ids(data.get('tool_ids'))
+        status = returned_status(data.get('status', 'Disponible'))
+    except InvalidBatch as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    employee = None
+    if data.get('employee_id'):
+        employee = Employee.query.get(data.get('employee_id'))
+        if employee is None:
+            return jsonify({"success": False, "message": "Employé inconnu"}), 400
+    try:
+        items = return_batch(tool_ids, employee, status)
+    except Conflict:
+        return jsonify({"success": False, "message": "Outils modifiés pendant le scan, réessayez"}), 409
+    return _batch_response(items)
+
 @view.route("/employees/add", methods=["POST"])
 def add_employee():
     if request.method == "POST":
@@ -263,6 +341,7 @@ def add_employee():
 
 
 @view.route("/find-tools", methods=["GET"])
+@read_only
 
 
 def find_tools():
@@ -270,10 +349,9 @@ def find_tools():
     if not query:
         return jsonify([])
 
-    # Search ID or Name
-    tools = Tool.query.filter(
-        (Tool.name.ilike(f"%{query}%")) | (Tool.id.ilike(f"%{query}%"))
-    ).all()
+    # Search ID or Name, best prefix matches first
+    ids = get_search().search("tool", query, limit=current_app.config["SEARCH_RESULT_LIMIT"])
+    tools = {t.id: t for t in Tool.query.filter(Tool.id.in_(ids))}
 
     results = [
         {
@@ -284,141 +362,52 @@ def find_tools():
             "loc_shelf": tool.loc_shelf,
             "status": tool.status,
         }
-        for tool in tools
+        for tool in (tools[i] for i in ids if i in tools)
     ]
-    print (results)
     return jsonify(results)
 
 
 
 
-# serz
-def serialize_tool(tool):
-    return {
-        "id": tool.id,
-        "name": tool.name,
-        "category": tool.category.name if getattr(tool, "category", None) else None,
-        "loc_row": tool.loc_row,
-        "loc_col": tool.loc_col,
-        "loc_shelf": tool.loc_shelf,
-        "description": tool.description,
-        "date_ajout": tool.date_ajout.isoformat() if tool.date_ajout else None,
-        "purchase_date": tool.purchase_date.isoformat() if tool.purchase_date else None,
-        "last_maintenance": tool.last_maintenance.isoformat() if tool.last_maintenance else None,
-        "last_checked_out": tool.last_checked_out.isoformat() if tool.last_checked_out else None,
-        "price": tool.price,
-        "status": tool.status,
-        "photo": tool.photo or None
-    }
-
-def serialize_movement(mov):
-    return {
-        "id": mov.id,
-        "tool_id": mov.tool_id,
-        "tool_name": mov.tool.name if mov.tool else None,
-        "employee_id": mov.employee_id,
-        "employee_name": mov.employee.name if mov.employee else None,
-        "date_emprunt": mov.date_emprunt.isoformat() if mov.date_emprunt else None,
-        "return_date": mov.return_date.isoformat() if mov.return_date else None,
-        "expected_return": mov.expected_return.isoformat() if mov.expected_return else None,
-        "status": mov.status
-    }
-
 # ---- Main page -----------------------------------------------------------
 @view.route('/inventory')
+@read_only
 def inventory():
-    # Stats
-    total_tools = db.session.query(func.count(Tool.id)).scalar() or 0
-    available_tools = db.session.query(func.count(Tool.id)).filter(Tool.status == 'Disponible').scalar() or 0
-    maintenance_tools = db.session.query(func.count(Tool.id)).filter(Tool.status == 'En réparation').scalar() or 0
-    borrowed_tools = db.session.query(func.count(Movement.id)).filter(Movement.status == 'Checked Out').scalar() or 0
-
-    # All tools (with info)
-    all_tools = db.session.query(Tool).order_by(Tool.date_ajout.desc()).all()
-
-    # For filters
-    categories = db.session.query(Category).order_by(Category.name).all()
-    employees = db.session.query(Employee).order_by(Employee.name).all()
-
-    # Recent lists
-    recent_tools = db.session.query(Tool).order_by(Tool.date_ajout.desc()).limit(20).all()
-    recent_borrows = db.session.query(Movement).order_by(Movement.date_emprunt.desc()).limit(20).all()
-
-    # Serialize all tools with extra info
-    def serialize_tool_full(tool):
-        movement = db.session.query(Movement).filter(Movement.tool_id == tool.id).order_by(Movement.date_emprunt.desc()).first()
-        return {
-            "id": tool.id,
-            "name": tool.name,
-            "category": tool.category.name if tool.category else None,
-            "loc_row": tool.loc_row,
-            "loc_col": tool.loc_col,
-            "loc_shelf": tool.loc_shelf,
-            "description": tool.description,
-            "date_ajout": tool.date_ajout.isoformat() if tool.date_ajout else None,
-            "purchase_date": tool.purchase_date.isoformat() if tool.purchase_date else None,
-            "last_maintenance": tool.last_maintenance.isoformat() if tool.last_maintenance else None,
-            "price": tool.price,
-            "status": tool.status,
-            "photo": tool.photo or None,
-            "last_checked_out": tool.last_checked_out.isoformat() if tool.last_checked_out else None,
-            "borrowed_by": movement.employee.name if movement and movement.status == "Checked Out" and movement.employee else None,
-            "date_emprunt": movement.date_emprunt.isoformat() if movement and movement.status == "Checked Out" and movement.date_emprunt else None,
-            "expected_return": movement.expected_return.isoformat() if movement and movement.status == "Checked Out" and movement.expected_return else None,
-            "return_date": movement.return_date.isoformat() if movement and movement.status == "Returned" and movement.return_date else None
-        }
-
-    all_tools_json = [serialize_tool_full(t) for t in all_tools]
-
+    # only the counters: the tools, categories and filters are fetched by the page
+    # from /api/tools and /api/categories, so the HTML is the same size at any catalogue size
+    stats = get_stats()
     return render_template(
         "inventory.html",
-        total_tools=total_tools,
-        available_tools=available_tools,
-        maintenance_tools=maintenance_tools,
-        borrowed_tools=borrowed_tools,
-        categories=categories,
-        employees=employees,
-        all_tools_json=all_tools_json,
-        recent_tools=recent_tools,
-        recent_borrows=recent_borrows
+        total_tools=stats["total_tools"],
+        available_tools=stats["active_tools"],
+        maintenance_tools=stats["maintenance_tools"],
+        borrowed_tools=stats["borrowed_movements"]
     )
 
 
-def serialize_tool_full(tool):
-        movement = db.session.query(Movement).filter(Movement.tool_id == tool.id).order_by(Movement.date_emprunt.desc()).first()
-        return {
-            "id": tool.id,
-            "name": tool.name,
-            "category": tool.category.name if tool.category else None,
-            "loc_row": tool.loc_row,
-            "loc_col": tool.loc_col,
-            "loc_shelf": tool.loc_shelf,
-            "description": tool.description,
-            "date_ajout": tool.date_ajout.isoformat() if tool.date_ajout else None,
-            "purchase_date": tool.purchase_date.isoformat() if tool.purchase_date else None,
-            "last_maintenance": tool.last_maintenance.isoformat() if tool.last_maintenance else None,
-            "price": tool.price,
-            "status": tool.status,
-            "photo": tool.photo or None,
-            "last_checked_out": tool.last_checked_out.isoformat() if tool.last_checked_out else None,
-            "borrowed_by": movement.employee.name if movement and movement.status == "Checked Out" and movement.employee else None,
-            "date_emprunt": movement.date_emprunt.isoformat() if movement and movement.status == "Checked Out" and movement.date_emprunt else None,
-            "expected_return": movement.expected_return.isoformat() if movement and movement.status == "Checked Out" and movement.expected_return else None,
-            "return_date": movement.return_date.isoformat() if movement and movement.status == "Returned" and movement.return_date else None
-        }
+# /api/tools?sort= : keyset column and whether it runs descending
+TOOL_SORTS = {
+    "recent": (Tool.date_ajout, True),
+    "oldest": (Tool.date_ajout, False),
+    "name": (Tool.name, False),
+    "name_desc": (Tool.name, True),
+}
+
 @view.route('/api/tools')
+@read_only
+@conditional("tools", "categories", "employees")
 def api_tools():
-    page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('per_page', 12))
+    per_page = page_size(request.args.get('per_page'), 12)
+    cursor = request.args.get('cursor')
     q = request.args.get('q', '').strip()
     status = request.args.get('status')
     category_id = request.args.get('category')
     employee_id = request.args.get('employee_id')
+    sort_col, descending = TOOL_SORTS.get(request.args.get('sort'), TOOL_SORTS["recent"])
 
     query = db.session.query(Tool)
     if q:
-        ilike = func.lower(Tool.name).like(f"%{q.lower()}%") | func.lower(Tool.id).like(f"%{q.lower()}%")
-        query = query.filter(ilike)
+        query = query.filter(get_search().filter("tool", q))
     if status:
         query = query.filter(Tool.status == status)
     if category_id:
@@ -427,48 +416,69 @@ def api_tools():
         except ValueError:
             pass
     if employee_id:
-        query = query.join(Movement).filter(Movement.employee_id == employee_id, Movement.status == "Checked Out")
+        query = query.filter(Tool.current_employee_id == employee_id)
 
-    total = query.count()
-    items = query.order_by(Tool.date_ajout.desc()).offset((page - 1) * per_page).limit(per_page).all()
+    try:
+        items, next_cursor = keyset_page(TOOL_FULL.apply(query), sort_col, Tool.id, cursor, per_page,
+                                         descending=descending)
+    except InvalidCursor as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    total = None
+    if request.args.get('with_total'):
+        filtered = q or status or category_id or employee_id
+        total = approximate_count(("tools", q, status, category_id, employee_id), query,
+                                  None if filtered else Tool.__tablename__)
     return jsonify({
-        "page": page,
         "per_page": per_page,
+        "next_cursor": next_cursor,
         "total": total,
-        "items": [serialize_tool_full(t) for t in items]
+        "items": TOOL_FULL.items(items)
     })
 
 @view.route('/api/categories')
+@read_only
+@conditional("categories", max_age="STATIC_LIST_MAX_AGE")
 def api_categories():
     cats = db.session.query(Category).order_by(Category.name).all()
     return jsonify([{"id": c.id, "name": c.name} for c in cats])
 
 @view.route('/api/employees')
+@read_only
+@conditional("employees", max_age="STATIC_LIST_MAX_AGE")
 def api_employees():
     emps = db.session.query(Employee).order_by(Employee.name).all()
     return jsonify([{"id": e.id, "name": e.name} for e in emps])
 
 @view.route('/api/stats')
+@read_only
 def api_stats():
-    total_tools = db.session.query(func.count(Tool.id)).scalar() or 0
-    available_tools = db.session.query(func.count(Tool.id)).filter(Tool.status == 'Disponible').scalar() or 0
-    maintenance_tools = db.session.query(func.count(Tool.id)).filter(Tool.status == 'En réparation').scalar() or 0
-    borrowed_movements_count = db.session.query(func.count(Movement.id)).filter(Movement.status == 'Checked Out').scalar() or 0
+    stats = get_stats()
     return jsonify({
-        "total_tools": total_tools,
-        "available_tools": available_tools,
-        "maintenance_tools": maintenance_tools,
-        "borrowed_tools": borrowed_movements_count
+        "total_tools": stats["total_tools"],
+        "available_tools": stats["active_tools"],
+        "maintenance_tools": stats["maintenance_tools"],
+        "borrowed_tools": stats["borrowed_movements"]
     })
 
 @view.route('/api/recent-borrows')
+@read_only
 def api_recent_borrows():
-    items = db.session.query(Movement).order_by(Movement.date_emprunt.desc()).limit(20).all()
-    return jsonify([serialize_movement(m) for m in items])
+    query = db.session.query(Movement).outerjoin(Movement.tool).outerjoin(Movement.employee)
+    items = MOVEMENT.apply(query).order_by(Movement.date_emprunt.desc()).limit(20).all()
+    return jsonify(MOVEMENT.items(items))
 
 @view.route('/add-tool', methods=['GET', 'POST'])
 def add_tool():
     if request.method == 'POST':
+        photo = request.form.get('photo', '')
+        upload = request.files.get('photo_file')
+        if upload and upload.filename:
+            try:
+                photo = store_photo(read_upload(upload))
+            except (InvalidPhoto, RuntimeError) as e:
+                flash(str(e), 'danger')
+                return redirect(url_for('view.add_tool'))
         tool = Tool(
             id=request.form['id'],
             name=request.form['name'],
@@ -478,29 +488,31 @@ def add_tool():
             loc_shelf=request.form['loc_shelf'],
             description=request.form.get('description', ''),
             status=request.form['status'],
-            photo=request.form.get('photo', '')
+            photo=photo
         )
         db.session.add(tool)
+        emit("new-tool", tool_id=tool.id, tool_name=tool.name, status=tool.status)
         db.session.commit()
+        invalidate_stats()
         return redirect(url_for('view.inventory'))
     categories = db.session.query(Category).order_by(Category.name).all()
     return render_template('add_tool.html', categories=categories)
 
 @view.route("/find-employees", methods=["GET"])
+@read_only
 def find_employees():
     query = request.args.get("q", "")
     if not query:
         return jsonify([])
-    employees = Employee.query.filter(
-        (Employee.name.ilike(f"%{query}%")) | (Employee.id.ilike(f"%{query}%"))
-    ).all()
+    ids = get_search().search("employee", query, limit=current_app.config["SEARCH_RESULT_LIMIT"])
+    employees = {e.id: e for e in Employee.query.filter(Employee.id.in_(ids))}
     results = [
         {
             "id": emp.id,
             "name": emp.name,
             "department": emp.department
         }
-        for emp in employees
+        for emp in (employees[i] for i in ids if i in employees)
     ]
     return jsonify(results)
 
@@ -510,6 +522,7 @@ def maintenance():
     return render_template("maintenance.html", categories=categories)
 
 @view.route("/api/maintenance-tools")
+@read_only
 def api_maintenance_tools():
     q = request.args.get('q', '').strip()
     status = request.args.get('status')
@@ -517,8 +530,7 @@ def api_maintenance_tools():
 
     query = db.session.query(Tool).filter(Tool.status.in_(['Disponible', 'Cassé', 'En réparation']))
     if q:
-        ilike = func.lower(Tool.name).like(f"%{q.lower()}%") | func.lower(Tool.id).like(f"%{q.lower()}%")
-        query = query.filter(ilike)
+        query = query.filter(get_search().filter("tool", q))
     if status:
         query = query.filter(Tool.status == status)
     if category_id:
@@ -526,14 +538,16 @@ def api_maintenance_tools():
             query = query.filter(Tool.category_id == int(category_id))
         except ValueError:
             pass
-    items = query.order_by(Tool.date_ajout.desc()).all()
+    items = TOOL.apply(query).order_by(Tool.date_ajout.desc()).all()
     return jsonify({
-        "items": [serialize_tool(t) for t in items]
+        "items": TOOL.items(items)
     })
 
+# statuses a tool can be sent to repair from: not while someone has it, not twice
+MAINTENANCE_FROM = ('Disponible', 'Cassé')
+
 @view.route("/maintenance/send/<tool_id>", methods=["POST"])
 def send_to_maintenance(tool_id):
-    tool = Tool.query.get_or_404(tool_id)
     data = request.get_json()
     expected_return_str = data.get('expected_return')
     try:
@@ -541,45 +555,52 @@ def send_to_maintenance(tool_id):
     except Exception:
         return jsonify({"success": False, "message": "Date invalide"}), 400
 
-    # Create a movement for maintenance
-    movement = Movement(
-        tool_id=tool.id,
-        employee_id=None,
-        date_emprunt=datetime.utcnow(),
-        expected_return=expected_return,
-        status='En réparation'
-    )
-    db.session.add(movement)
-    tool.status = 'En réparation'
-    db.session.commit()
+    def send():
+        tool = transition(Tool, tool_id, MAINTENANCE_FROM, status='En réparation')
+        # Create a movement for maintenance
+        db.session.add(Movement(
+            tool_id=tool.id,
+            employee_id=None,
+            date_emprunt=datetime.utcnow(),
+            expected_return=expected_return,
+            status='En réparation'
+        ))
+        emit("maintenance", tool_id=tool.id, tool_name=tool.name, expected_return=expected_return_str)
+
+    try:
+        run_transition(send)
+    except Conflict:
+        Tool.query.get_or_404(tool_id)
+        return jsonify({"success": False, "message": "Outil emprunté ou déjà en réparation"}), 409
+    invalidate_stats()
     return jsonify({"success": True})
 
 @view.route("/maintenance/return/<tool_id>", methods=["POST"])
 def maintenance_return(tool_id):
-    tool = Tool.query.get_or_404(tool_id)
     data = request.get_json()
     employee_id = data.get('employee_id')
     status = data.get('status', 'Disponible')
-    loc_shelf = data.get('loc_shelf')
-    loc_col = data.get('loc_col')
-    loc_row = data.get('loc_row')
-
-    # Update tool location and status
-    tool.loc_shelf = loc_shelf
-    tool.loc_col = loc_col
-    tool.loc_row = loc_row
-    tool.status = status
-
-    # Record movement for the repair
-    movement = Movement(
-        tool_id=tool.id,
-        employee_id=employee_id,
-        date_emprunt=datetime.utcnow(),
-        expected_return=datetime.utcnow(),
-        status='Returned'
-    )
-    db.session.add(movement)
-    db.session.commit()
+
+    def back():
+        # Update tool location and status
+        tool = transition(Tool, tool_id, 'En réparation', status=status, loc_shelf=data.get('loc_shelf'),
+                          loc_col=data.get('loc_col'), loc_row=data.get('loc_row'))
+        # Record movement for the repair
+        db.session.add(Movement(
+            tool_id=tool.id,
+            employee_id=employee_id,
+            date_emprunt=datetime.utcnow(),
+            expected_return=datetime.utcnow(),
+            status='Returned'
+        ))
+        emit("maintenance-return", tool_id=tool.id, tool_name=tool.name, status=status)
+
+    try:
+        run_transition(back)
+    except Conflict:
+        Tool.query.get_or_404(tool_id)
+        return jsonify({"success": False, "message": "Outil pas en réparation"}), 409
+    invalidate_stats()
     return jsonify({"success": True})
 
 @view.route('/api/categories', methods=['POST'])
@@ -601,83 +622,171 @@ def movements():
     categories = Category.query.order_by(Category.name).all()
     return render_template("movements.html", categories=categories)
 
-@view.route("/api/movements")
-def api_movements():
-    tool_q = request.args.get('tool', '').strip()
-    emp_q = request.args.get('employee', '').strip()
-    status = request.args.get('status')
-    date = request.args.get('date')
-    query = db.session.query(Movement).join(Tool).outerjoin(Employee)
+def movements_query(args):
+    # movements joined to their tool and employee, filtered like /api/movements
+    tool_q = args.get('tool', '').strip()
+    emp_q = args.get('employee', '').strip()
+    status = args.get('status')
+    date = args.get('date')
+    query = (
+        db.session.query(Movement)
+        .join(Movement.tool)
+        .outerjoin(Movement.employee)
+    )
     if tool_q:
-        query = query.filter((Tool.name.ilike(f"%{tool_q}%")) | (Tool.id.ilike(f"%{tool_q}%")))
+        query = query.filter(get_search().filter("tool", tool_q))
     if emp_q:
-        query = query.filter((Employee.name.ilike(f"%{emp_q}%")) | (Employee.id.ilike(f"%{emp_q}%")))
+        query = query.filter(get_search().filter("employee", emp_q))
     if status:
         query = query.filter(Movement.status == status)
     if date:
         try:
-            from datetime import datetime, timedelta
             date_obj = datetime.strptime(date, '%Y-%m-%d')
             next_day = date_obj + timedelta(days=1)
             query = query.filter(Movement.date_emprunt >= date_obj, Movement.date_emprunt < next_day)
         except Exception:
             pass
-    query = query.order_by(Movement.date_emprunt.desc())
-    movements = query.all()
-    def serialize_movement_full(mov):
-        return {
-            "id": mov.id,
-            "tool_id": mov.tool_id,
-            "tool_name": mov.tool.name if mov.tool else None,
-            "tool_photo": mov.tool.photo if mov.tool and mov.tool.photo else None,
-            "employee_id": mov.employee_id,
-            "employee_name": mov.employee.name if mov.employee else None,
-            "date_emprunt": mov.date_emprunt.isoformat() if mov.date_emprunt else None,
-            "return_date": mov.return_date.isoformat() if mov.return_date else None,
-            "expected_return": mov.expected_return.isoformat() if mov.expected_return else None,
-            "status": mov.status
-        }
-    return jsonify([serialize_movement_full(m) for m in movements])
-
-@view.route("/report")
-def report():
-    return render_template("report.html")
-
-@view.route("/api/overdue")
-def api_overdue():
-    tool_q = request.args.get('tool', '').strip()
-    emp_q = request.args.get('employee', '').strip()
-    date = request.args.get('date')
-    now = datetime.utcnow()
-    query = db.session.query(Movement).join(Tool).outerjoin(Employee).filter(
-        Movement.status == 'Checked Out',
-        Movement.expected_return < now
+    return query
+
+def overdue_query(args, now):
+    tool_q = args.get('tool', '').strip()
+    emp_q = args.get('employee', '').strip()
+    date = args.get('date')
+    query = (
+        db.session.query(Movement)
+        .join(Movement.tool)
+        .outerjoin(Movement.employee)
+        .filter(Movement.status == 'Checked Out', Movement.expected_return < now)
     )
     if tool_q:
-        query = query.filter((Tool.name.ilike(f"%{tool_q}%")) | (Tool.id.ilike(f"%{tool_q}%")))
+        query = query.filter(get_search().filter("tool", tool_q))
     if emp_q:
-        query = query.filter((Employee.name.ilike(f"%{emp_q}%")) | (Employee.id.ilike(f"%{emp_q}%")))
+        query = query.filter(get_search().filter("employee", emp_q))
     if date:
         try:
-            from datetime import datetime, timedelta
             date_obj = datetime.strptime(date, '%Y-%m-%d')
             next_day = date_obj + timedelta(days=1)
             query = query.filter(Movement.expected_return >= date_obj, Movement.expected_return < next_day)
         except Exception:
             pass
-    query = query.order_by(Movement.expected_return.asc())
-    overdues = query.all()
-    def serialize_overdue(mov):
-        days_overdue = (now - mov.expected_return).days
-        return {
-            "id": mov.id,
-            "tool_id": mov.tool_id,
-            "tool_name": mov.tool.name if mov.tool else None,
-            "tool_photo": mov.tool.photo if mov.tool and mov.tool.photo else None,
-            "employee_id": mov.employee_id,
-            "employee_name": mov.employee.name if mov.employee else None,
-            "date_emprunt": mov.date_emprunt.isoformat() if mov.date_emprunt else None,
-            "expected_return": mov.expected_return.isoformat() if mov.expected_return else None,
-            "days_overdue": days_overdue
-        }
-    return jsonify([serialize_overdue(m) for m in overdues])
+    return query
+
+@view.route("/api/movements")
+@read_only
+@conditional("movements", "tools", "employees")
+def api_movements():
+    sort = request.args.get('sort', 'desc')
+    fmt = request.args.get('format')
+    query = movements_query(request.args)
+
+    # full export, streamed: ?format=ndjson or ?format=json-stream
+    if fmt in STREAM_FORMATS:
+        if sort == 'asc':
+            query = query.order_by(Movement.date_emprunt.asc(), Movement.id.asc())
+        else:
+            query = query.order_by(Movement.date_emprunt.desc(), Movement.id.desc())
+        return stream_rows(MOVEMENT_FULL.apply(query), MOVEMENT_FULL.item, fmt)
+
+    per_page = page_size(request.args.get('per_page'))
+    cursor = request.args.get('cursor')
+    try:
+        movements, next_cursor = keyset_page(MOVEMENT_FULL.apply(query), Movement.date_emprunt, Movement.id, cursor,
+                                             per_page, descending=(sort != 'asc'))
+    except InvalidCursor as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    total = None
+    if request.args.get('with_total'):
+        filters = tuple(request.args.get(k, '') for k in ('tool', 'employee', 'status', 'date'))
+        total = approximate_count(("movements",) + filters, query,
+                                  None if any(filters) else Movement.__tablename__)
+
+    return jsonify({
+        "per_page": per_page,
+        "next_cursor": next_cursor,
+        "total": total,
+        "items": MOVEMENT_FULL.items(movements)
+    })
+
+@view.route("/api/movements/export")
+@read_only
+def api_movements_export():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'xlsx'):
+        return jsonify({"success": False, "message": "format must be csv or xlsx"}), 400
+    query = movements_query(request.args)
+    if request.args.get('sort') == 'asc':
+        query = query.order_by(Movement.date_emprunt.asc(), Movement.id.asc())
+    else:
+        query = query.order_by(Movement.date_emprunt.desc(), Movement.id.desc())
+    if fmt == 'xlsx':
+        return xlsx_response(query, MOVEMENT_COLUMNS, "movements")
+    return csv_response(query, MOVEMENT_COLUMNS, "movements")
+
+@view.route("/api/import/<kind>", methods=["POST"])
+def api_import(kind):
+    # body: a multipart "file" field, or the raw CSV / NDJSON as the request body
+    if kind not in IMPORT_KINDS:
+        return jsonify({"success": False, "message": f"unknown import kind {kind}"}), 404
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    default = "ndjson" if request.mimetype == "application/x-ndjson" else "csv"
+    fmt = request.args.get('format') or detect_format(upload.filename if upload else None, default)
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({"success": False, "message": f"format must be one of: {', '.join(IMPORT_FORMATS)}"}), 400
+    try:
+        report = import_rows(kind, read_rows(text_stream(stream), fmt),
+                             dry_run=bool(request.args.get('dry_run')))
+    except (UnicodeDecodeError, csv.Error) as e:
+        return jsonify({"success": False, "message": f"unreadable file: {e}"}), 400
+    return jsonify(report), 200 if report["success"] else 422
+
+@view.route("/report")
+def report():
+    return render_template("report.html")
+
+@view.route("/api/overdue")
+@read_only
+def api_overdue():
+    fmt = request.args.get('format')
+    now = datetime.utcnow()
+    query = overdue_query(request.args, now)
+
+    if fmt in STREAM_FORMATS:
+        query = query.order_by(Movement.expected_return.asc(), Movement.id.asc())
+        return stream_rows(OVERDUE.apply(query), lambda row: OVERDUE.item(row, now), fmt)
+
+    per_page = page_size(request.args.get('per_page'))
+    cursor = request.args.get('cursor')
+    # unfiltered pages (and their total) come straight from the in-memory overdue index
+    index = get_overdue_index()
+    if index is not None and not any(request.args.get(k, '').strip() for k in ('tool', 'employee', 'date')):
+        try:
+            rows, next_cursor = index.page(now, cursor, per_page)
+        except InvalidCursor as e:
+            return jsonify({"success": False, "message": str(e)}), 400
+        return jsonify({
+            "per_page": per_page,
+            "next_cursor": next_cursor,
+            "total": index.count(now) if request.args.get('with_total') else None,
+            "items": OVERDUE.items(rows, now)
+        })
+
+    try:
+        overdues, next_cursor = keyset_page(OVERDUE.apply(query), Movement.expected_return, Movement.id, cursor,
+                                            per_page, descending=False)
+    except InvalidCursor as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+
+    total = None
+    if request.args.get('with_total'):
+        # keyed by day: the overdue set moves with the clock
+        filters = tuple(request.args.get(k, '') for k in ('tool', 'employee', 'date'))
+        total = approximate_count(("overdue",) + filters + (now.date(),), query)
+
+    return jsonify({
+        "per_page": per_page,
+        "next_cursor": next_cursor,
+        "total": total,
+        "items": OVERDUE.items(overdues, now)
+    })
@@ -0,0 +1,11 @@
+import os
+
+os.environ.setdefault("APP_PROFILE", "prod")
+
+from app import create_app
+from app.asyncapi import AsyncAPI
+
+# async entry point: the autocomplete lookups run on an async engine and
+# /api/events streams on the event loop, the rest of the app is the usual
+# Flask app.  uvicorn asgi:app --workers 4
+app = AsyncAPI(create_app())
@@ -0,0 +1,53 @@
+import glob
+import multiprocessing
+import os
+
+# gunicorn reads this file from the working directory: gunicorn wsgi:app
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+
+# threads, not extra processes: the views mostly wait on MySQL. Every open
+# /api/events stream (dashboard tab) holds a thread, so a worker takes at most
+# EVENTS_MAX_STREAMS of them (half the threads) and other tabs poll. Each worker has its own
+# pool, so workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) must stay below MySQL's
+# max_connections, and DB_POOL_SIZE should not be below the thread count
+worker_class = "gthread"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() + 1))
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+
+# import the app once in the master: faster (re)starts and shared memory pages.
+# With preload a HUP restarts the workers on the code already loaded; new code
+# needs a USR2 (new master) then TERM of the old master, or a service restart
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+
+# seconds an idle client connection stays open (behind nginx a few is plenty)
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+# a worker silent for this long is killed; streamed exports keep it alive
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+# on HUP/TERM, in-flight requests get this long to finish
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", 30))
+# recycle workers now and then so a slow leak can't grow forever
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 5000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 500))
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+
+
+def on_starting(server):
+    # per-worker metric snapshots of a previous run would be summed into /metrics forever
+    directory = os.getenv("METRICS_MULTIPROC_DIR") or os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if directory and os.path.isdir(directory):
+        for path in glob.glob(os.path.join(directory, "metrics_*.json*")):
+            os.remove(path)
+
+
+def post_fork(server, worker):
+    # connections the master opened while preloading must not be shared between
+    # processes: forget them without closing (the master still owns the sockets)
+    from app.models import db
+
+    app = worker.app.wsgi()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
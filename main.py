@@ -6,4 +6,6 @@ app = create_app()
 
 
 if __name__ == "__main__":
+    if app.config["PRODUCTION"]:
+        raise SystemExit("APP_PROFILE=prod: run gunicorn wsgi:app (see gunicorn.conf.py), not the debug server")
     app.run(debug=True)
\ No newline at end of file
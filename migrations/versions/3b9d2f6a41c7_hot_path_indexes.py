@@ -0,0 +1,55 @@
+"""hot path indexes
+
+Composite indexes for the movement/tool queries in views.py, plus the MySQL
+ngram FULLTEXT indexes used by the "fulltext" search backend.
+
+Revision ID: 3b9d2f6a41c7
+Revises: 04769500975e
+Create Date: 2026-10-18 12:20:41.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b9d2f6a41c7'
+down_revision = '04769500975e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('tools', schema=None) as batch_op:
+        batch_op.create_index('ix_tools_status_date_ajout', ['status', 'date_ajout'], unique=False)
+        batch_op.create_index('ix_tools_date_ajout', ['date_ajout'], unique=False)
+
+    with op.batch_alter_table('movements', schema=None) as batch_op:
+        batch_op.create_index('ix_movements_status_expected_return', ['status', 'expected_return'], unique=False)
+        batch_op.create_index('ix_movements_status_date_emprunt', ['status', 'date_emprunt'], unique=False)
+        batch_op.create_index('ix_movements_tool_id_date_emprunt', ['tool_id', 'date_emprunt'], unique=False)
+        batch_op.create_index('ix_movements_date_emprunt', ['date_emprunt'], unique=False)
+        batch_op.create_index('ix_movements_employee_id_status', ['employee_id', 'status'], unique=False)
+
+    if op.get_bind().dialect.name == 'mysql':
+        op.create_index('ft_tools_name', 'tools', ['name'], unique=False,
+                        mysql_prefix='FULLTEXT', mysql_with_parser='ngram')
+        op.create_index('ft_employees_name', 'employees', ['name'], unique=False,
+                        mysql_prefix='FULLTEXT', mysql_with_parser='ngram')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'mysql':
+        op.drop_index('ft_employees_name', table_name='employees')
+        op.drop_index('ft_tools_name', table_name='tools')
+
+    with op.batch_alter_table('movements', schema=None) as batch_op:
+        batch_op.drop_index('ix_movements_employee_id_status')
+        batch_op.drop_index('ix_movements_date_emprunt')
+        batch_op.drop_index('ix_movements_tool_id_date_emprunt')
+        batch_op.drop_index('ix_movements_status_date_emprunt')
+        batch_op.drop_index('ix_movements_status_expected_return')
+
+    with op.batch_alter_table('tools', schema=None) as batch_op:
+        batch_op.drop_index('ix_tools_date_ajout')
+        batch_op.drop_index('ix_tools_status_date_ajout')
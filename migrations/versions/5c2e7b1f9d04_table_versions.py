@@ -0,0 +1,35 @@
+"""table versions for HTTP caching
+
+Revision ID: 5c2e7b1f9d04
+Revises: 8e41c0d9a7b5
+Create Date: 2026-10-18 12:52:10.418305
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c2e7b1f9d04'
+down_revision = '8e41c0d9a7b5'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table_versions = op.create_table('table_versions',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    now = datetime.utcnow()
+    op.bulk_insert(table_versions, [
+        {'name': name, 'version': 1, 'updated_at': now}
+        for name in ('categories', 'employees', 'movements', 'tools')
+    ])
+
+
+def downgrade():
+    op.drop_table('table_versions')
@@ -0,0 +1,44 @@
+"""materialized current movement on tools
+
+Revision ID: 8e41c0d9a7b5
+Revises: 3b9d2f6a41c7
+Create Date: 2026-10-18 12:44:02.731866
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e41c0d9a7b5'
+down_revision = '3b9d2f6a41c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('tools', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('current_movement_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('current_employee_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_tools_current_employee_id', 'employees', ['current_employee_id'], ['id'])
+        batch_op.create_index('ix_tools_current_employee_id', ['current_employee_id'], unique=False)
+
+    # backfill; same rule as "flask reconcile-current-movements"
+    op.execute(
+        "UPDATE tools SET current_movement_id = ("
+        " SELECT m.id FROM movements m WHERE m.tool_id = tools.id"
+        " ORDER BY m.date_emprunt DESC, m.id DESC LIMIT 1)"
+    )
+    op.execute(
+        "UPDATE tools SET current_employee_id = ("
+        " SELECT m.employee_id FROM movements m"
+        " WHERE m.id = tools.current_movement_id AND m.status = 'Checked Out')"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('tools', schema=None) as batch_op:
+        batch_op.drop_index('ix_tools_current_employee_id')
+        batch_op.drop_constraint('fk_tools_current_employee_id', type_='foreignkey')
+        batch_op.drop_column('current_employee_id')
+        batch_op.drop_column('current_movement_id')
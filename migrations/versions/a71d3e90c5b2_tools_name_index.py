@@ -0,0 +1,28 @@
+"""tools name index
+
+Keyset order of /api/tools?sort=name for the inventory page.
+
+Revision ID: a71d3e90c5b2
+Revises: 5c2e7b1f9d04
+Create Date: 2026-10-18 13:20:05.731942
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a71d3e90c5b2'
+down_revision = '5c2e7b1f9d04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('tools', schema=None) as batch_op:
+        batch_op.create_index('ix_tools_name_id', ['name', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('tools', schema=None) as batch_op:
+        batch_op.drop_index('ix_tools_name_id')
@@ -0,0 +1,40 @@
+"""search changes
+
+Tool/employee id and name changes, replayed by every worker into its trigram index.
+
+Revision ID: c4f8a2e61d93
+Revises: a71d3e90c5b2
+Create Date: 2026-10-18 16:02:41.118204
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f8a2e61d93'
+down_revision = 'a71d3e90c5b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('search_changes',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('kind', sa.String(length=10), nullable=False),
+    sa.Column('key', sa.String(length=100), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('search_changes', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_search_changes_created_at'), ['created_at'], unique=False)
+    op.execute(sa.text("INSERT INTO table_versions (name, version, updated_at) VALUES ('search', 1, :now)")
+               .bindparams(now=datetime.utcnow()))
+
+
+def downgrade():
+    op.execute("DELETE FROM table_versions WHERE name = 'search'")
+    with op.batch_alter_table('search_changes', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_search_changes_created_at'))
+    op.drop_table('search_changes')
@@ -0,0 +1,40 @@
+import pytest
+from app import create_app
+from app.models import Employee, Tool, db
+from app.seed import generate
+
+
+@pytest.fixture
+def app(tmp_path):
+    # a small seeded SQLite file per test; no background scanner or search refresher thread
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'magasin.db'}",
+        "TESTING": True,
+        "OVERDUE_SCAN_INTERVAL": 0,
+        "SEARCH_INDEX_MAX_AGE": 0,
+        "SQL_SLOW_QUERY_MS": 0,
+    })
+    with app.app_context():
+        db.create_all()
+        generate(tools=30, employees=5, movements=60, echo=lambda *a: None)
+        db.session.remove()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def available_tool(app):
+    with app.app_context():
+        return db.session.query(Tool.id).filter(Tool.status == 'Disponible', Tool.current_employee_id.is_(None)).first()[0]
+
+
+@pytest.fixture
+def employee_id(app):
+    with app.app_context():
+        return db.session.query(Employee.id).order_by(Employee.id).first()[0]
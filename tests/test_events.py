@@ -0,0 +1,35 @@
+import sys
+import types
+from app.events import RedisBroker
+
+
+def test_streams_past_the_cap_are_told_to_poll(app, client):
+    app.config["EVENTS_MAX_STREAMS"] = 1
+    first = client.get("/api/events", buffered=False)
+    assert first.status_code == 200
+    refused = client.get("/api/events")
+    assert refused.status_code == 503
+    assert refused.get_json()["success"] is False
+    # closing the first stream frees its slot
+    first.close()
+    again = client.get("/api/events", buffered=False)
+    assert again.status_code == 200
+    again.close()
+
+
+def test_redis_outage_does_not_fail_or_stall_writes(monkeypatch):
+    attempts = []
+
+    class Down:
+        def publish(self, channel, message):
+            attempts.append(channel)
+            raise ConnectionError("redis is down")
+
+    fake = types.ModuleType("redis")
+    fake.Redis = types.SimpleNamespace(from_url=lambda url, **options: Down())
+    monkeypatch.setitem(sys.modules, "redis", fake)
+    broker = RedisBroker("redis://localhost:6379/0", "magasin-events")
+    broker.publish("borrow", {"tool_id": "T1"})
+    broker.publish("return", {"tool_id": "T1"})
+    # the second one is dropped without waiting on Redis again
+    assert attempts == ["magasin-events"]
@@ -0,0 +1,8 @@
+from app.explain import explain_hot_queries
+
+
+def test_hot_queries_have_no_full_scan(app):
+    # the CLI check (flask explain-hot-queries) against the test database
+    with app.app_context():
+        scans = {name: scans for name, (plan, scans) in explain_hot_queries().items() if scans}
+    assert scans == {}
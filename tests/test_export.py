@@ -0,0 +1,26 @@
+import io
+import pytest
+from app import export
+from app.models import Movement, db
+
+openpyxl = pytest.importorskip("openpyxl")
+
+
+def test_xlsx_rolls_over_to_a_new_sheet(app, client, monkeypatch):
+    monkeypatch.setattr(export, "XLSX_SHEET_ROWS", 25)
+    resp = client.get("/api/movements/export?format=xlsx")
+    assert resp.status_code == 200
+    wb = openpyxl.load_workbook(io.BytesIO(resp.data), read_only=True)
+    sheets = [list(ws.iter_rows(values_only=True)) for ws in wb.worksheets]
+    assert all(len(rows) <= 25 and rows[0][0] == "id" for rows in sheets)
+    with app.app_context():
+        assert sum(len(rows) - 1 for rows in sheets) == db.session.query(Movement).count()
+    assert wb.sheetnames[:2] == ["movements", "movements 2"]
+
+
+def test_xlsx_above_the_cap_points_to_csv(app, client):
+    app.config["XLSX_MAX_ROWS"] = 10
+    resp = client.get("/api/movements/export?format=xlsx")
+    assert resp.status_code == 400
+    assert "format=csv" in resp.get_json()["message"]
+    assert client.get("/api/movements/export?format=xlsx&status=Nope").status_code == 200
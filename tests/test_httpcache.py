@@ -0,0 +1,27 @@
+from sqlalchemy.exc import OperationalError
+from app import httpcache
+
+
+def test_compressed_answers_keep_a_strong_etag_per_encoding(client):
+    plain = client.get("/api/tools", headers={"Accept-Encoding": "identity"})
+    gzipped = client.get("/api/tools", headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    etag, weak = gzipped.get_etag()
+    assert not weak and etag == plain.get_etag()[0] + "-gzip"
+
+    again = client.get("/api/tools", headers={"Accept-Encoding": "gzip", "If-None-Match": f'"{etag}"'})
+    assert again.status_code == 304
+    assert again.get_etag() == (etag, False)
+    # a weak validator no longer matches
+    weak_match = client.get("/api/tools", headers={"Accept-Encoding": "gzip", "If-None-Match": f'W/"{etag}"'})
+    assert weak_match.status_code == 200
+
+
+def test_a_failed_version_bump_fails_the_request(app, client, monkeypatch):
+    def broken(connection, tables):
+        raise OperationalError("UPDATE table_versions", {}, Exception("lock wait timeout"))
+
+    monkeypatch.setattr(httpcache, "_bump", broken)
+    app.config["PROPAGATE_EXCEPTIONS"] = False
+    resp = client.post("/api/categories", data={"name": "Never cached"})
+    assert resp.status_code == 500
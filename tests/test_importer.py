@@ -0,0 +1,69 @@
+from datetime import date
+from app.importer import import_rows
+from app.models import Movement, Tool, db
+
+
+def _lent_tool(app):
+    with app.app_context():
+        return db.session.query(Tool.id).join(Movement, Movement.id == Tool.current_movement_id).filter(
+            Movement.status == 'Checked Out').first()[0]
+
+
+def test_reimport_keeps_status_and_columns_the_file_omits(app):
+    tool_id = _lent_tool(app)
+    with app.app_context():
+        tool = db.session.get(Tool, tool_id)
+        tool.description, tool.purchase_date = "kept", date(2020, 1, 2)
+        db.session.commit()
+        before = (tool.status, tool.current_movement_id, tool.current_employee_id, tool.category_id)
+
+        report = import_rows("tools", [(2, {
+            "id": tool_id, "name": "Renamed", "category_id": str(tool.category_id),
+            "loc_row": "7", "loc_col": "8", "loc_shelf": "9", "status": "Disponible", "description": "",
+        })])
+        assert report["success"], report
+        db.session.expire_all()
+        tool = db.session.get(Tool, tool_id)
+        assert (tool.name, tool.loc_row, tool.loc_col, tool.loc_shelf) == ("Renamed", 7, 8, 9)
+        assert (tool.status, tool.current_movement_id, tool.current_employee_id, tool.category_id) == before
+        assert tool.description == "kept"
+        assert tool.purchase_date == date(2020, 1, 2)
+
+
+def test_import_of_new_tool_gets_the_defaults(app):
+    with app.app_context():
+        category_id = db.session.query(Tool.category_id).first()[0]
+        report = import_rows("tools", [(2, {
+            "id": "NEW-1", "name": "New", "category_id": str(category_id),
+            "loc_row": "1", "loc_col": "1", "loc_shelf": "1",
+        })])
+        assert report["success"], report
+        tool = db.session.get(Tool, "NEW-1")
+        assert tool.status == "Disponible"
+        assert tool.purchase_date == date.today()
+
+
+def test_reimporting_movements_without_ids_does_not_duplicate_them(app, available_tool, employee_id):
+    rows = [(2, {"tool_id": available_tool, "employee_id": str(employee_id),
+                 "date_emprunt": "2030-01-02 08:00:00", "status": "Checked Out"})]
+    with app.app_context():
+        before = db.session.query(Movement).count()
+        assert import_rows("movements", rows)["success"]
+        assert import_rows("movements", rows)["success"]
+        assert db.session.query(Movement).count() == before + 1
+
+
+def test_imported_movements_check_the_tool_out_and_back_in(app, available_tool, employee_id):
+    row = {"tool_id": available_tool, "employee_id": str(employee_id), "date_emprunt": "2030-01-02 08:00:00"}
+    with app.app_context():
+        assert import_rows("movements", [(2, dict(row, status="Checked Out"))])["success"]
+        tool = db.session.get(Tool, available_tool)
+        assert tool.status == "Emprunté"
+        assert tool.last_checked_out.year == 2030
+        assert tool.current_employee_id == employee_id
+
+        returned = dict(row, status="Returned", return_date="2030-01-03 08:00:00")
+        assert import_rows("movements", [(2, returned)])["success"]
+        db.session.expire_all()
+        tool = db.session.get(Tool, available_tool)
+        assert (tool.status, tool.last_checked_out, tool.current_employee_id) == ("Disponible", None, None)
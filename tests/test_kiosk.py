@@ -0,0 +1,21 @@
+from datetime import datetime, timedelta
+from app.models import Tool, db
+
+FUTURE = (datetime.utcnow() + timedelta(days=7)).strftime("%Y-%m-%d")
+
+
+def test_batch_return_refuses_an_unknown_status(app, client, available_tool, employee_id):
+    resp = client.post("/api/borrows/batch", json={
+        "tool_ids": [available_tool], "employee_id": employee_id, "expected_return": FUTURE})
+    assert resp.status_code == 200
+    for status in ("Perdu", "Emprunté", None):
+        resp = client.post("/api/returns/batch", json={"tool_ids": [available_tool], "status": status})
+        assert resp.status_code == 400
+        assert resp.get_json()["success"] is False
+    with app.app_context():
+        assert db.session.get(Tool, available_tool).status == 'Emprunté'
+
+    resp = client.post("/api/returns/batch", json={"tool_ids": [available_tool], "status": "Cassé"})
+    assert resp.status_code == 200
+    with app.app_context():
+        assert db.session.get(Tool, available_tool).status == 'Cassé'
@@ -0,0 +1,14 @@
+from app.config import ProdConfig
+
+
+def test_metrics_is_off_in_the_prod_profile():
+    assert not ProdConfig.METRICS_ENABLED
+
+
+def test_metrics_token_is_required_when_set(app, client):
+    app.config["METRICS_TOKEN"] = "s3cret"
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer nope"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200
+    assert b"magasin_http_requests_total" in response.data
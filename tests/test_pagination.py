@@ -0,0 +1,20 @@
+import pytest
+from sqlalchemy import update
+from app.models import Tool, db
+
+
+@pytest.mark.parametrize("sort", ["recent", "oldest"])
+def test_tool_pages_cross_null_sort_values(app, client, sort):
+    with app.app_context():
+        ids = [i for (i,) in db.session.query(Tool.id)]
+        db.session.execute(update(Tool).where(Tool.id.in_(ids[::3])).values(date_ajout=None))
+        db.session.commit()
+
+    seen, cursor = [], None
+    while True:
+        data = client.get("/api/tools", query_string={"sort": sort, "per_page": 4, **({"cursor": cursor} if cursor else {})}).get_json()
+        seen += [item["id"] for item in data["items"]]
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(ids)
@@ -0,0 +1,66 @@
+import pytest
+from app.importer import import_rows
+from app.models import Employee, Tool, db
+from app.search import KINDS, TrigramSearch, _search_version
+
+
+def test_trigram_search_survives_a_concurrent_delete(app, monkeypatch):
+    with app.app_context():
+        index = TrigramSearch()
+        index.build()
+        tool_id, name = db.session.query(Tool.id, Tool.name).first()
+        matches = index._matches
+
+        def then_deleted(kind, q):
+            # the entry disappears between the lookup and the ranking
+            found = matches(kind, q)
+            index.apply([("delete", "tool", tool_id, name)])
+            return found
+
+        monkeypatch.setattr(index, "_matches", then_deleted)
+        assert tool_id in index.search("tool", tool_id)
+
+
+def _other_worker(app, monkeypatch):
+    # a second index over the same database, built once like another process's
+    index = TrigramSearch()
+    index.build()
+    monkeypatch.setattr(index, "build", lambda: pytest.fail("full rebuild"))
+    return index
+
+
+def test_status_changes_leave_the_search_index_alone(app, client, available_tool, employee_id, monkeypatch):
+    with app.app_context():
+        other = _other_worker(app, monkeypatch)
+        version = _search_version()
+    client.post("/borrows/new", data={"tool_id": available_tool, "employee_id": employee_id, "expected_return": "2999-01-01"})
+    with app.app_context():
+        assert db.session.get(Tool, available_tool).status == 'Emprunté'
+        assert _search_version() == version
+        assert other.refresh() == 0
+
+
+def test_renames_reach_other_workers_as_a_delta(app, monkeypatch):
+    with app.app_context():
+        other = _other_worker(app, monkeypatch)
+        tool, employee = db.session.query(Tool).first(), db.session.query(Employee).first()
+        tool.name = "Zebra clamp"
+        db.session.commit()
+        report = import_rows("employees", [(2, {"id": str(employee.id), "name": "Yak Keeper"})])
+        assert report["success"], report
+
+        assert other.refresh() == 2
+        assert other.search("tool", "zebra") == [tool.id]
+        assert other.search("employee", "yak keep") == [employee.id]
+
+
+def test_employee_id_prefix_matches_on_the_integer_column(app):
+    with app.app_context():
+        db.session.add_all([Employee(id=n, name=f"Prefix {n}") for n in (12, 123, 1299, 13)])
+        db.session.commit()
+        match = lambda q: sorted(
+            i for (i,) in db.session.query(Employee.id).filter(KINDS["employee"].id_prefix(q)) if i >= 10)
+        assert match("12") == [12, 123, 1299]
+        assert match("129") == [1299]
+        assert match("x") == []
+        assert "CAST" not in str(KINDS["employee"].id_prefix("12"))
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app.models import Movement, Tool, db
+from app.transitions import Conflict, run_transition, transition
+
+FUTURE = (datetime.utcnow() + timedelta(days=7)).strftime("%Y-%m-%d")
+
+
+def _borrow(client, tool_id, employee_id):
+    client.post("/borrows/new", data={"tool_id": tool_id, "employee_id": employee_id, "expected_return": FUTURE})
+    with client.session_transaction() as session:
+        return session.pop("_flashes", [])
+
+
+def _open_loans(app, tool_id):
+    with app.app_context():
+        return [m for (m,) in db.session.query(Movement.id).filter(
+            Movement.tool_id == tool_id, Movement.status == 'Checked Out')]
+
+
+def test_transition_raises_conflict_when_status_changed(app, available_tool):
+    with app.app_context():
+        run_transition(lambda: transition(Tool, available_tool, 'Disponible', status='Emprunté'))
+        with pytest.raises(Conflict):
+            run_transition(lambda: transition(Tool, available_tool, 'Disponible', status='Emprunté'))
+        assert db.session.get(Tool, available_tool).status == 'Emprunté'
+
+
+def test_second_borrow_of_same_tool_is_refused(app, client, available_tool, employee_id):
+    assert _borrow(client, available_tool, employee_id)[0][0] == "success"
+    category, message = _borrow(client, available_tool, employee_id)[0]
+    assert category == "danger" and "indisponible" in message
+    assert len(_open_loans(app, available_tool)) == 1
+
+
+def test_second_return_is_409(app, client, available_tool, employee_id):
+    _borrow(client, available_tool, employee_id)
+    (movement_id,) = _open_loans(app, available_tool)
+    assert client.post(f"/tools/return/{movement_id}", json={"status": "Disponible"}).status_code == 302
+    resp = client.post(f"/tools/return/{movement_id}", json={"status": "Disponible"})
+    assert resp.status_code == 409
+    assert resp.get_json()["success"] is False
+    assert client.post("/tools/return/999999", json={}).status_code == 404
+
+
+def test_maintenance_send_and_return_conflicts_are_409(client, available_tool):
+    send = lambda: client.post(f"/maintenance/send/{available_tool}", json={"expected_return": FUTURE})
+    back = lambda: client.post(f"/maintenance/return/{available_tool}", json={
+        "status": "Disponible", "loc_row": 1, "loc_col": 1, "loc_shelf": 1})
+    assert send().status_code == 200
+    assert send().status_code == 409
+    assert back().status_code == 200
+    assert back().status_code == 409
+    assert client.post("/maintenance/send/NOPE", json={"expected_return": FUTURE}).status_code == 404
+
+
+def test_concurrent_borrows_hand_the_tool_out_once(app, available_tool, employee_id):
+    # one test client per thread, all on the same tool at once
+    def attempt(_):
+        return _borrow(app.test_client(), available_tool, employee_id)[0][0]
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(attempt, range(8)))
+    assert results.count("success") == 1
+    assert len(_open_loans(app, available_tool)) == 1
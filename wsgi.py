@@ -0,0 +1,8 @@
+import os
+
+os.environ.setdefault("APP_PROFILE", "prod")
+
+from app import create_app
+
+# production entry point: gunicorn wsgi:app (settings in gunicorn.conf.py)
+app = create_app()